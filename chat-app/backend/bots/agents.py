@@ -5,19 +5,25 @@ Uso: via Agent Panels (ex.: advogado, vendedor, guru). Inline @agent usages are
 """
 
 import os
-from typing import Optional, List, Dict, Any
-from collections import defaultdict, deque
+from typing import Optional, List, Dict, Any, Awaitable, Callable
 from datetime import datetime, timezone
 import httpx
 from dotenv import load_dotenv
 
 from database import custom_bots_collection
+from metrics import post_llm
+from bots.llm_cache import cache_enabled_for, cache_key, get_cached_response, store_response
+from bots.context_budget import AGENT_CONTEXT_TOKEN_BUDGET, build_prompt, log_prompt
+from bots.memory import AGENT_MEMORY_MESSAGES, agent_memory, turn_docs
+from llm_client import get_llm_client, stream_chat_completion
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# Base da API compatível com OpenAI (ex.: servidor local em testes de carga)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_API_URL = f"{OPENAI_BASE_URL}/chat/completions"
 
 
 class Agent:
@@ -45,23 +51,53 @@ class Agent:
         self.allow_calendar_creation: bool = False
         # Se True, este agente pode criar eventos automaticamente sem confirmação do atendente
         self.allow_calendar_auto_create: bool = False
-        # Histórico de conversa por usuário (máximo 10 mensagens)
-        self.conversation_history: dict[str, deque] = defaultdict(lambda: deque(maxlen=10))
+        # Respostas repetidas (mesma pergunta e contexto) vêm do cache (bots/llm_cache.py)
+        self.cache_responses: bool = True
+        # Tamanho máximo do prompt em tokens (bots/context_budget.py)
+        self.context_token_budget: int = AGENT_CONTEXT_TOKEN_BUDGET
+        # Chave no registry/painel (AGENTS_REGISTRY e bots customizados a definem)
+        # e da memória de conversa por (usuário, agente, contato) em bots/memory.py
+        self.key = name.lower().replace(" ", "")
+        # Rótulo `agent` nas métricas: a chave nos agentes do registry e "custom"
+        # nos bots dos usuários (um rótulo por bot não teria limite)
+        self.metric_label = "custom"
     
     def get_display_name(self) -> str:
         """Retorna nome com emoji para exibição."""
         return f"{self.name} {self.emoji}"
     
-    def clear_history(self, user_id: str) -> None:
+    async def clear_history(self, user_id: str, contact_id: Optional[str] = None) -> None:
         """Limpa histórico de conversa do usuário."""
-        if user_id in self.conversation_history:
-            self.conversation_history[user_id].clear()
+        await agent_memory.clear(user_id, self.key, contact_id)
     
-    def get_history_count(self, user_id: str) -> int:
+    async def get_history_count(self, user_id: str, contact_id: Optional[str] = None) -> int:
         """Retorna número de mensagens no histórico."""
-        return len(self.conversation_history[user_id])
+        return len(await agent_memory.get(user_id, self.key, contact_id))
     
-    async def ask(self, message: str, user_id: str, user_name: str) -> str:
+    async def _save_turn(self, user_id: str, user_name: str, contact_id: Optional[str], message: str,
+                         answer: str, asked_at: datetime) -> None:
+        """Grava pergunta e resposta na memória do agente (coleção agent_messages)."""
+        await agent_memory.append(user_id, self.key, contact_id, turn_docs(
+            user_id, self.key, contact_id, user_name, message, self.get_display_name(), answer, asked_at
+        ))
+    
+    def _response_cache_key(self, message: str, user_name: str, messages: list) -> Optional[str]:
+        """Chave do cache de respostas (None se o agente não usa cache)."""
+        # Pela chave (registry ou bot customizado), não pelo nome de exibição
+        if not cache_enabled_for(self.key, self.cache_responses):
+            return None
+        # Contexto: nome do usuário (vai no prompt) + tudo entre o system prompt e a pergunta
+        return cache_key(self.key, OPENAI_MODEL, self.system_prompt, message, [user_name, *messages[1:-1]])
+    
+    async def ask(
+        self,
+        message: str,
+        user_id: str,
+        user_name: str,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        contact_id: Optional[str] = None,
+        save_history: bool = True
+    ) -> str:
         """
         Envia pergunta ao agente e retorna resposta.
         
@@ -69,23 +105,30 @@ class Agent:
             message: Mensagem do usuário
             user_id: ID do usuário
             user_name: Nome do usuário
+            on_delta: Se informado, a resposta vem em streaming e cada trecho
+                é repassado a este callback
+            contact_id: Contato do atendimento (a memória é por conversa)
+            save_history: False quando quem chama grava a conversa (painel)
             
         Returns:
             Resposta do agente
         """
         if not self.openai_api_key:
             return f"❌ {self.name} não configurado. Configure OPENAI_API_KEY."
+        asked_at = datetime.utcnow()
         
-        # Prepara mensagens
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # Adiciona histórico
-        user_history = self.conversation_history[user_id]
-        messages.extend(list(user_history))
-        
-        # Adiciona contexto do usuário
+        # Prepara mensagens: system prompt, histórico e pergunta, dentro do
+        # orçamento de tokens do agente (histórico mais recente primeiro)
         contextualized_message = f"[Usuário: {user_name}] {message}"
-        messages.append({"role": "user", "content": contextualized_message})
+        messages, prompt_stats = build_prompt(
+            system=[{"role": "system", "content": self.system_prompt}],
+            question={"role": "user", "content": contextualized_message},
+            history=await agent_memory.get(user_id, self.key, contact_id),
+            budget=self.context_token_budget,
+            model=OPENAI_MODEL
+        )
+        log_prompt(self.name, OPENAI_MODEL, prompt_stats, self.metric_label)
+        response_key = self._response_cache_key(message, user_name, messages)
         
         try:
             headers = {
@@ -97,16 +140,28 @@ class Agent:
             if self.openai_account:
                 headers["OpenAI-Organization"] = self.openai_account
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    OPENAI_API_URL,
+            payload = {
+                "model": OPENAI_MODEL,
+                "messages": messages,
+                "temperature": 0.7,
+                "max_tokens": 600
+            }
+            cached = await get_cached_response(self.metric_label, response_key) if response_key else None
+            if cached is not None:
+                ai_response = cached
+                if on_delta:
+                    await on_delta(cached)
+            elif on_delta:
+                ai_response = (await stream_chat_completion(
+                    OPENAI_API_URL, headers, payload, on_delta, timeout=30.0
+                )).strip()
+            else:
+                client = get_llm_client()
+                response = await post_llm(
+                    client, "chat", OPENAI_MODEL, OPENAI_API_URL,
+                    timeout=30.0,
                     headers=headers,
-                    json={
-                        "model": OPENAI_MODEL,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 600
-                    }
+                    json=payload
                 )
                 
                 if response.status_code != 200:
@@ -115,13 +170,15 @@ class Agent:
                 
                 data = response.json()
                 ai_response = data["choices"][0]["message"]["content"].strip()
-                
-                # Armazena no histórico
-                user_history.append({"role": "user", "content": message})
-                user_history.append({"role": "assistant", "content": ai_response})
-                
-                return ai_response
-                
+            if response_key and cached is None and ai_response:
+                await store_response(response_key, ai_response)
+            
+            # Armazena no histórico
+            if save_history:
+                await self._save_turn(user_id, user_name, contact_id, message, ai_response, asked_at)
+            
+            return ai_response
+            
         except httpx.TimeoutException:
             return f"⏱️ {self.name} demorou para responder. Tente novamente."
         except Exception as e:
@@ -133,7 +190,9 @@ class Agent:
         user_id: str,
         user_name: str,
         contact_id: Optional[str] = None,
-        conversation_context: Optional[List[Dict[str, str]]] = None
+        conversation_context: Optional[List[Dict[str, str]]] = None,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        save_history: bool = True
     ) -> str:
         """
         Envia pergunta ao agente COM contexto da conversa principal.
@@ -149,17 +208,21 @@ class Agent:
             user_name: Nome do usuário
             contact_id: ID do contato/cliente
             conversation_context: Histórico já carregado
+            on_delta: Se informado, a resposta vem em streaming e cada trecho
+                é repassado a este callback
+            save_history: False para chamadas internas (ex.: sugestões) que
+                não devem entrar no histórico do agente, ou quando quem chama
+                grava a conversa (painel)
             
         Returns:
             Resposta contextualizada do agente
         """
         if not self.openai_api_key:
             return f"❌ {self.name} não configurado. Configure OPENAI_API_KEY."
-        
-        # Prepara mensagens base
-        messages = [{"role": "system", "content": self.system_prompt}]
+        asked_at = datetime.utcnow()
         
         # 🎯 AQUI ESTÁ A MÁGICA: Injetar contexto antes da pergunta
+        context_intro = context_outro = None
         if conversation_context and len(conversation_context) > 0:
             # Por que adicionar instrução específica?
             # - GPT precisa entender QUE existe contexto
@@ -183,29 +246,29 @@ class Agent:
                     "HISTÓRICO DA CONVERSA:"
                 )
             }
-            messages.append(context_intro)
-            
-            # Por que extend() e não append()?
-            # - conversation_context é uma LISTA de mensagens
-            # - Cada mensagem já está formatada {"role": ..., "content": ...}
-            messages.extend(conversation_context)
             
             # Separador visual (ajuda GPT a distinguir contexto de pergunta)
-            messages.append({
+            context_outro = {
                 "role": "system",
                 "content": "--- FIM DO CONTEXTO DA CONVERSA ---\n\n"
-            })
-        
-        # Adiciona histórico do PRÓPRIO agente (conversa interna user↔agente)
-        # Por que manter histórico do agente?
-        # - Continuidade na conversa com o agente
-        # - Agente lembra o que JÁ sugeriu
-        user_history = self.conversation_history[user_id]
-        messages.extend(list(user_history))
+            }
         
-        # Adiciona pergunta atual
+        # Monta o prompt dentro do orçamento de tokens do agente:
+        # system prompt, contexto da conversa (mais recentes primeiro), histórico
+        # do PRÓPRIO agente (continuidade: ele lembra o que JÁ sugeriu) e a pergunta
         contextualized_message = f"[Usuário: {user_name}] {message}"
-        messages.append({"role": "user", "content": contextualized_message})
+        messages, prompt_stats = build_prompt(
+            system=[{"role": "system", "content": self.system_prompt}],
+            question={"role": "user", "content": contextualized_message},
+            history=await agent_memory.get(user_id, self.key, contact_id),
+            context=conversation_context,
+            context_intro=context_intro,
+            context_outro=context_outro,
+            budget=self.context_token_budget,
+            model=OPENAI_MODEL
+        )
+        log_prompt(self.name, OPENAI_MODEL, prompt_stats, self.metric_label)
+        response_key = self._response_cache_key(message, user_name, messages)
         
         try:
             headers = {
@@ -216,31 +279,46 @@ class Agent:
             if self.openai_account:
                 headers["OpenAI-Organization"] = self.openai_account
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    OPENAI_API_URL,
+            payload = {
+                "model": OPENAI_MODEL,
+                "messages": messages,
+                "temperature": 0.7,  # Criatividade moderada
+                "max_tokens": 600  # Limite de resposta (controle de custo)
+            }
+            cached = await get_cached_response(self.metric_label, response_key) if response_key else None
+            if cached is not None:
+                assistant_message = cached
+                if on_delta:
+                    await on_delta(cached)
+            elif on_delta:
+                assistant_message = await stream_chat_completion(
+                    OPENAI_API_URL, headers, payload, on_delta, timeout=30.0
+                )
+            else:
+                client = get_llm_client()
+                response = await post_llm(
+                    client, "chat", OPENAI_MODEL, OPENAI_API_URL,
+                    timeout=30.0,
                     headers=headers,
-                    json={
-                        "model": OPENAI_MODEL,
-                        "messages": messages,
-                        "temperature": 0.7,  # Criatividade moderada
-                        "max_tokens": 600  # Limite de resposta (controle de custo)
-                    }
+                    json=payload
                 )
                 
                 response.raise_for_status()
                 data = response.json()
+                choices = data.get("choices") or []
+                assistant_message = choices[0]["message"]["content"] if choices else None
+            
+            if assistant_message:
+                if response_key and cached is None:
+                    await store_response(response_key, assistant_message.strip())
+                # Salva no histórico do agente (próxima pergunta terá continuidade)
+                if save_history:
+                    await self._save_turn(user_id, user_name, contact_id, message, assistant_message.strip(),
+                                          asked_at)
                 
-                if "choices" in data and len(data["choices"]) > 0:
-                    assistant_message = data["choices"][0]["message"]["content"]
-                    
-                    # Salva no histórico do agente (próxima pergunta terá continuidade)
-                    user_history.append({"role": "user", "content": contextualized_message})
-                    user_history.append({"role": "assistant", "content": assistant_message})
-                    
-                    return assistant_message.strip()
-                
-                return f"❌ {self.name}: Resposta inesperada da API."
+                return assistant_message.strip()
+            
+            return f"❌ {self.name}: Resposta inesperada da API."
         
         except httpx.HTTPStatusError as e:
             return f"❌ {self.name}: Erro API ({e.response.status_code})"
@@ -530,6 +608,9 @@ AGENTS_REGISTRY: dict[str, Agent] = {
     "psicologo": AGENT_PSICOLOGO,
     "sdr": AGENT_SDR,
 }
+for _key, _agent in AGENTS_REGISTRY.items():
+    _agent.key = _key
+    _agent.metric_label = _key
 
 
 # =====================================================
@@ -568,9 +649,12 @@ async def load_custom_agents_from_db() -> None:
             agent.allow_calendar_creation = True
         if doc.get("allow_calendar_auto_create"):
             agent.allow_calendar_auto_create = True
+        agent.cache_responses = doc.get("cache_responses", True)
+        agent.context_token_budget = doc.get("context_token_budget") or AGENT_CONTEXT_TOKEN_BUDGET
 
         if user_id not in custom_bots_registry:
             custom_bots_registry[user_id] = {}
+        agent.key = bot_key
         custom_bots_registry[user_id][bot_key] = agent
     if docs:
         print(f"✅ Bots customizados carregados: {len(docs)}")
@@ -603,6 +687,9 @@ async def ensure_user_custom_bots(user_id: str) -> None:
             agent.allow_calendar_creation = True
         if doc.get("allow_calendar_auto_create"):
             agent.allow_calendar_auto_create = True
+        agent.cache_responses = doc.get("cache_responses", True)
+        agent.context_token_budget = doc.get("context_token_budget") or AGENT_CONTEXT_TOKEN_BUDGET
+        agent.key = bot_key
         custom_bots_registry.setdefault(user_id, {})[bot_key] = agent
 
 
@@ -613,7 +700,9 @@ async def create_custom_agent(
     system_prompt: str,
     specialties: list[str],
     openai_api_key: str,
-    openai_account: Optional[str] = None
+    openai_account: Optional[str] = None,
+    cache_responses: bool = True,
+    context_token_budget: Optional[int] = None
 ) -> Agent:
     """
     Cria um agente personalizado para o usuário.
@@ -626,6 +715,9 @@ async def create_custom_agent(
         specialties: Lista de especialidades
         openai_api_key: Chave de API da OpenAI
         openai_account: ID da organização OpenAI (opcional)
+        cache_responses: Se False, o bot nunca responde do cache
+        context_token_budget: Tamanho máximo do prompt em tokens (padrão
+            AGENT_CONTEXT_TOKEN_BUDGET)
         
     Returns:
         Instância do agente customizado
@@ -647,6 +739,8 @@ async def create_custom_agent(
         openai_api_key=openai_api_key,
         openai_account=openai_account
     )
+    agent.cache_responses = cache_responses
+    agent.context_token_budget = context_token_budget or AGENT_CONTEXT_TOKEN_BUDGET
     
     # Armazena no registro do usuário
     if user_id not in custom_bots_registry:
@@ -669,6 +763,8 @@ async def create_custom_agent(
                 "openai_account": openai_account,
                 "allow_calendar_creation": agent.allow_calendar_creation,
                 "allow_calendar_auto_create": agent.allow_calendar_auto_create,
+                "cache_responses": agent.cache_responses,
+                "context_token_budget": agent.context_token_budget,
                 "updated_at": datetime.now(timezone.utc)
             },
             "$setOnInsert": {"created_at": datetime.now(timezone.utc)}
@@ -866,13 +962,13 @@ async def handle_agent_command(
     
     # Comando universal: /limpar
     if command_lower == "/limpar":
-        agent.clear_history(user_id)
+        await agent.clear_history(user_id)
         return f"🗑️ Histórico limpo! Começando conversa do zero com {agent.get_display_name()}"
     
     # Comando universal: /contexto
     if command_lower == "/contexto":
-        count = agent.get_history_count(user_id)
-        return f"📊 **Contexto {agent.get_display_name()}:**\n\n💬 Mensagens no histórico: {count}/10\n🎯 Especialidades: {', '.join(agent.specialties)}"
+        count = await agent.get_history_count(user_id)
+        return f"📊 **Contexto {agent.get_display_name()}:**\n\n💬 Mensagens no histórico: {count}/{AGENT_MEMORY_MESSAGES}\n🎯 Especialidades: {', '.join(agent.specialties)}"
     
     # Comandos específicos: delega para o agente
     if command_lower in agent.commands:
@@ -1080,6 +1176,9 @@ async def generate_agent_suggestions(
     """
     Gera N sugestões de resposta curtas usando o agente com contexto.
 
+    Não grava no histórico do agente: roda em paralelo com a resposta
+    principal em `process_agent_message`.
+
     Args:
         agent: Instância do agente a usar para gerar sugestões
         conversation_context: Histórico da conversa (lista de mensagens)
@@ -1104,7 +1203,8 @@ async def generate_agent_suggestions(
             user_id=user_id,
             user_name=user_name,
             contact_id=None,
-            conversation_context=conversation_context
+            conversation_context=conversation_context,
+            save_history=False
         )
 
         # Tenta extrair JSON simples (fallback para linhas separadas)
@@ -1149,7 +1249,8 @@ async def generate_conversation_summary(
             user_id=user_id,
             user_name=user_name,
             contact_id=None,
-            conversation_context=conversation_context
+            conversation_context=conversation_context,
+            save_history=False
         )
 
         return summary
@@ -1,16 +1,25 @@
 """Módulo de integração com ChatGPT/OpenAI."""
 
 import os
-from typing import Optional
-from collections import defaultdict, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
 import httpx
 from dotenv import load_dotenv
 
+from state_store import state_store
+from bots.memory import agent_memory, turn_docs
+from metrics import post_llm
+from bots.llm_cache import cache_enabled_for, cache_key, get_cached_response, store_response
+from bots.context_budget import build_prompt, log_prompt
+from llm_client import get_llm_client, stream_chat_completion
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# Base da API compatível com OpenAI (ex.: servidor local em testes de carga)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_API_URL = f"{OPENAI_BASE_URL}/chat/completions"
 
 # Contexto do Guru
 SYSTEM_PROMPT = """Você é o Guru 🧠, um assistente de chat muito amigável e sábio, conversando em um grupo de mensagens.
@@ -46,9 +55,10 @@ Para códigos inline de 1 linha, use backticks simples: `variavel = valor`
 NUNCA envie código em uma única linha corrida sem formatação.
 SEMPRE mantenha a indentação e quebras de linha do código."""
 
-# Armazena histórico de conversa por usuário (máximo 10 mensagens)
-# user_id -> deque de {"role": "user"/"assistant", "content": "texto"}
-conversation_history: dict[str, deque] = defaultdict(lambda: deque(maxlen=10))
+# Memória do Guru do chat: agent_messages com agentKey "guru-chat", por
+# (usuário, contato) — separada do Guru do painel de agentes (bots/memory.py)
+MEMORY_AGENT_KEY = "guru-chat"
+GURU_AUTHOR = "Guru 🧠"
 
 # Modos de personalidade do Guru
 GURU_MODES = {
@@ -62,12 +72,23 @@ Evite gírias excessivas. Mantenha tom respeitoso e corporativo, mas não roboti
 Use exemplos de código quando útil. Foque em precisão e completude das respostas."""
 }
 
-# Preferências do usuário: modo, idioma, etc
-# user_id -> {"mode": "casual", "language": "pt"}
-user_preferences: dict[str, dict] = defaultdict(lambda: {"mode": "casual", "language": "pt"})
+# Preferências do usuário (modo, idioma, etc) ficam no state store em guru:prefs:{user_id}
+DEFAULT_PREFERENCES = {"mode": "casual", "language": "pt"}
+
+
+async def get_user_preferences(user_id: str) -> dict:
+    """Preferências do usuário com os valores padrão preenchidos."""
+    stored = await state_store.get(f"guru:prefs:{user_id}") or {}
+    return {**DEFAULT_PREFERENCES, **stored}
 
 
-async def ask_chatgpt(message: str, user_id: str = "anonymous", user_name: str = "Amigo") -> str:
+async def ask_chatgpt(
+    message: str,
+    user_id: str = "anonymous",
+    user_name: str = "Amigo",
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    contact_id: Optional[str] = None
+) -> str:
     """
     Envia uma mensagem para o ChatGPT e retorna a resposta.
     Mantém histórico de conversa por usuário.
@@ -76,6 +97,9 @@ async def ask_chatgpt(message: str, user_id: str = "anonymous", user_name: str =
         message: Mensagem do usuário
         user_id: ID do usuário (para manter contexto separado)
         user_name: Nome do usuário (para personalizar resposta)
+        on_delta: Se informado, a resposta vem em streaming e cada trecho é
+            repassado a este callback
+        contact_id: Conversa em que o Guru foi chamado (memória por conversa)
         
     Returns:
         Resposta do ChatGPT
@@ -83,36 +107,55 @@ async def ask_chatgpt(message: str, user_id: str = "anonymous", user_name: str =
     if not OPENAI_API_KEY:
         return "❌ Bot de IA não configurado. Configure OPENAI_API_KEY nas variáveis de ambiente."
     
+    asked_at = datetime.utcnow()
     # Obtém preferências do usuário
-    prefs = user_preferences[user_id]
+    prefs = await get_user_preferences(user_id)
     mode_instruction = GURU_MODES.get(prefs["mode"], GURU_MODES["casual"])
     
     # Prepara as mensagens com modo personalizado
     system_prompt = f"{SYSTEM_PROMPT}\n\nMODO ATUAL: {prefs['mode'].upper()}\n{mode_instruction}"
-    messages = [{"role": "system", "content": system_prompt}]
     
-    # Adiciona histórico do usuário (últimas mensagens)
-    user_history = conversation_history[user_id]
-    messages.extend(list(user_history))
-    
-    # Adiciona contexto do nome do usuário na mensagem
+    # Histórico do usuário (mais recente primeiro) dentro do orçamento de tokens,
+    # com o nome do usuário na mensagem
     contextualized_message = f"[Usuário: {user_name}] {message}"
-    messages.append({"role": "user", "content": contextualized_message})
+    messages, prompt_stats = build_prompt(
+        system=[{"role": "system", "content": system_prompt}],
+        question={"role": "user", "content": contextualized_message},
+        history=await agent_memory.get(user_id, MEMORY_AGENT_KEY, contact_id),
+        model=OPENAI_MODEL
+    )
+    log_prompt("guru", OPENAI_MODEL, prompt_stats)
+    response_key = None
+    if cache_enabled_for("guru"):
+        response_key = cache_key("guru", OPENAI_MODEL, system_prompt, message, [user_name, *messages[1:-1]])
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                OPENAI_API_URL,
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 500
-                }
+        headers = {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": OPENAI_MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 500
+        }
+        cached = await get_cached_response("guru", response_key) if response_key else None
+        if cached is not None:
+            ai_response = cached
+            if on_delta:
+                await on_delta(cached)
+        elif on_delta:
+            ai_response = (await stream_chat_completion(
+                OPENAI_API_URL, headers, payload, on_delta, timeout=30.0
+            )).strip()
+        else:
+            client = get_llm_client()
+            response = await post_llm(
+                client, "chat", OPENAI_MODEL, OPENAI_API_URL,
+                timeout=30.0,
+                headers=headers,
+                json=payload
             )
             
             if response.status_code != 200:
@@ -121,41 +164,45 @@ async def ask_chatgpt(message: str, user_id: str = "anonymous", user_name: str =
             
             data = response.json()
             ai_response = data["choices"][0]["message"]["content"].strip()
-            
-            # Armazena no histórico do usuário
-            user_history.append({"role": "user", "content": message})
-            user_history.append({"role": "assistant", "content": ai_response})
-            
-            return ai_response
-            
+        if response_key and cached is None and ai_response:
+            await store_response(response_key, ai_response)
+        
+        # Armazena no histórico do usuário
+        await agent_memory.append(user_id, MEMORY_AGENT_KEY, contact_id, turn_docs(
+            user_id, MEMORY_AGENT_KEY, contact_id, user_name, message, GURU_AUTHOR, ai_response, asked_at
+        ))
+        
+        return ai_response
+        
     except httpx.TimeoutException:
         return "⏱️ Timeout ao conectar com ChatGPT. Tente novamente."
     except Exception as e:
         return f"❌ Erro ao processar resposta: {str(e)}"
 
 
-def clear_conversation(user_id: str) -> None:
+async def clear_conversation(user_id: str, contact_id: Optional[str] = None) -> None:
     """
     Limpa o histórico de conversa de um usuário.
     
     Args:
         user_id: ID do usuário
+        contact_id: Conversa (None = Guru fora de uma conversa)
     """
-    if user_id in conversation_history:
-        conversation_history[user_id].clear()
+    await agent_memory.clear(user_id, MEMORY_AGENT_KEY, contact_id)
 
 
-def get_conversation_count(user_id: str) -> int:
+async def get_conversation_count(user_id: str, contact_id: Optional[str] = None) -> int:
     """
     Retorna o número de mensagens no histórico do usuário.
     
     Args:
         user_id: ID do usuário
+        contact_id: Conversa (None = Guru fora de uma conversa)
         
     Returns:
         Número de mensagens no histórico
     """
-    return len(conversation_history[user_id])
+    return len(await agent_memory.get(user_id, MEMORY_AGENT_KEY, contact_id))
 
 
 def is_ai_question(text: str) -> bool:
@@ -223,7 +270,7 @@ def clean_bot_mention(text: str) -> str:
     return text
 
 
-def set_user_mode(user_id: str, mode: str) -> str:
+async def set_user_mode(user_id: str, mode: str) -> str:
     """
     Define o modo de personalidade do Guru para um usuário.
     
@@ -238,12 +285,13 @@ def set_user_mode(user_id: str, mode: str) -> str:
     if mode not in GURU_MODES:
         return f"❌ Modo inválido. Escolha: {', '.join(GURU_MODES.keys())}"
     
-    user_preferences[user_id]["mode"] = mode
+    prefs = await get_user_preferences(user_id)
+    await state_store.put(f"guru:prefs:{user_id}", {**prefs, "mode": mode})
     mode_names = {"casual": "Casual 😎", "profissional": "Profissional 💼", "tecnico": "Técnico 🔧"}
     return f"✅ Modo alterado para: {mode_names[mode]}"
 
 
-def get_user_mode(user_id: str) -> str:
+async def get_user_mode(user_id: str) -> str:
     """
     Retorna o modo atual do usuário.
     
@@ -253,20 +301,21 @@ def get_user_mode(user_id: str) -> str:
     Returns:
         Nome do modo atual
     """
-    return user_preferences[user_id]["mode"]
+    return (await get_user_preferences(user_id))["mode"]
 
 
-def generate_conversation_summary(user_id: str) -> str:
+async def generate_conversation_summary(user_id: str, contact_id: Optional[str] = None) -> str:
     """
     Gera um resumo da conversa do usuário.
     
     Args:
         user_id: ID do usuário
+        contact_id: Conversa (None = Guru fora de uma conversa)
         
     Returns:
         Resumo da conversa
     """
-    history = conversation_history[user_id]
+    history = await agent_memory.get(user_id, MEMORY_AGENT_KEY, contact_id)
     if not history:
         return "📭 Não há histórico de conversa ainda."
     
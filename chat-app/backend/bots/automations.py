@@ -5,6 +5,7 @@ from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timezone
 from typing import Callable, Any
 from database import db
+from conversations import stamp_conversation_key, record_message
 
 scheduler = AsyncIOScheduler()
 automations_col = db.automations
@@ -20,7 +21,8 @@ async def publish_message(
     type_: str = "text",
     user_id: str = None,  # 🆕 ID do usuário que chamou o bot
     contact_id: str = None,  # 🆕 ID do contato (para conversas 1:1)
-    target_sid: str = None  # 🆕 SID específico para enviar (ao invés de broadcast)
+    target_sid: str = None,  # 🆕 SID específico para enviar (ao invés de broadcast)
+    stream_id: str = None  # Resposta já enviada em deltas (ver streaming.py)
 ) -> None:
     """
     Publica uma mensagem no chat e persiste no banco.
@@ -32,7 +34,8 @@ async def publish_message(
         type_: Tipo da mensagem (padrão: "text")
         user_id: ID do usuário (para mensagens do bot = None, broadcast)
         contact_id: ID do contato na conversa individual
-        target_sid: SID específico do usuário (para mensagens direcionadas)
+        target_sid: SID ou sala do usuário (ex.: `user_room(id)`) para mensagens direcionadas
+        stream_id: Id do `chat:message-delta` que esta mensagem finaliza
     """
     now = datetime.now(timezone.utc)
     doc = {
@@ -47,8 +50,10 @@ async def publish_message(
         doc["userId"] = user_id
     if contact_id:
         doc["contactId"] = contact_id
-        
+    stamp_conversation_key(doc)
+
     result = await messages_col.insert_one(doc)
+    await record_message(doc)
     
     response = {
         "id": str(result.inserted_id),
@@ -63,6 +68,8 @@ async def publish_message(
         response["userId"] = user_id
     if contact_id:
         response["contactId"] = contact_id
+    if stream_id:
+        response["streamId"] = stream_id
     
     # Envia diretamente para o usuário específico ou faz broadcast
     if target_sid:
@@ -72,11 +79,8 @@ async def publish_message(
 
     # Se a mensagem foi direcionada a um contato específico, emite unread counts via Socket.IO
     if contact_id:
-        try:
-            from socket_handlers import emit_unread_counts_for_user
-            await emit_unread_counts_for_user(contact_id)
-        except Exception as _e:
-            print("⚠️ Falha ao emitir unread counts (automations):", _e)
+        from socket_handlers import schedule_unread_counts_push
+        schedule_unread_counts_push(contact_id)
 
 
 async def _create_cron_job(
@@ -0,0 +1,231 @@
+"""Orçamento de tokens dos prompts dos agentes e do Guru.
+
+O prompt era montado sem medir tamanho: system prompt, introdução do
+contexto, as mensagens da conversa, até 10 turnos de histórico com o agente
+e a pergunta. Aqui ele é montado dentro de um orçamento de tokens por agente
+(`Agent.context_token_budget`, padrão `AGENT_CONTEXT_TOKEN_BUDGET`):
+
+- system prompt e pergunta entram sempre (a pergunta é cortada só se
+  sozinha estourar o orçamento);
+- o resto é preenchido do mais recente para o mais antigo; o histórico com o
+  agente fica com no máximo `AGENT_HISTORY_BUDGET_SHARE` do espaço quando há
+  contexto da conversa, e o que o contexto não usar volta para o histórico;
+- a mensagem mais recente que não cabe inteira é cortada; as mais antigas
+  viram uma linha "N mensagens anteriores omitidas (HH:MM–HH:MM)".
+
+O corte é determinístico: mesmo histórico e mesma pergunta geram o mesmo
+prompt (o cache de respostas depende disso).
+
+Tokens são contados com o `tiktoken` quando instalado; sem ele, uma
+estimativa conservadora (~4 caracteres por token, pontuação conta 1). As
+contagens ficam em cache, já que as mesmas mensagens voltam a cada pergunta.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from logging_setup import get_logger, log_event
+from metrics import llm_prompt_tokens
+
+AGENT_CONTEXT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "3000"))
+AGENT_HISTORY_BUDGET_SHARE = float(os.getenv("AGENT_HISTORY_BUDGET_SHARE", "0.4"))
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "20000"))
+
+# Cada mensagem do chat custa alguns tokens além do conteúdo (role, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+# Mínimo preservado da pergunta quando o orçamento já foi todo para o system prompt
+QUESTION_MIN_TOKENS = 256
+TRUNCATION_MARK = " […]"
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_TIME_PREFIX = re.compile(r"^\[(\d{2}:\d{2})\]")
+
+log = get_logger("llm")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _piece_tokens(piece: str) -> int:
+    return max(1, -(-len(piece) // 4))
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str, model: str = "") -> int:
+    """Tokens de um texto (tiktoken ou estimativa)."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+
+def message_tokens(message: dict, model: str = "") -> int:
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "", model)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "") -> str:
+    """Mantém o começo do texto (autor e horário) dentro de `max_tokens`."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    available = max(0, max_tokens - count_tokens(TRUNCATION_MARK, model))
+    encoding = _encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:available]).rstrip() + TRUNCATION_MARK
+    used = 0
+    cut = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > available:
+            break
+        cut = match.end()
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+@dataclass
+class PromptStats:
+    """Tamanho do prompt montado e o que ficou de fora."""
+    tokens: int = 0
+    budget: int = 0
+    context_kept: int = 0
+    context_dropped: int = 0
+    history_kept: int = 0
+    history_dropped: int = 0
+    truncated: bool = False
+
+
+def _fill_recent(messages: list[dict], budget: int, model: str, allow_truncate: bool) -> tuple[list[dict], int, bool]:
+    """Do fim para o começo enquanto couber; devolve (mantidas, tokens, cortou)."""
+    kept: list[dict] = []
+    used = 0
+    truncated = False
+    for message in reversed(messages):
+        cost = message_tokens(message, model)
+        if used + cost <= budget:
+            kept.append(message)
+            used += cost
+            continue
+        room = budget - used - MESSAGE_OVERHEAD_TOKENS
+        if allow_truncate and not kept and room > count_tokens(TRUNCATION_MARK, model):
+            content = truncate_to_tokens(message.get("content") or "", room, model)
+            kept.append({**message, "content": content})
+            used += MESSAGE_OVERHEAD_TOKENS + count_tokens(content, model)
+            truncated = True
+        break
+    kept.reverse()
+    return kept, used, truncated
+
+
+def _omitted_note(dropped: list[dict]) -> dict:
+    times = [m.group(1) for m in (_TIME_PREFIX.match(d.get("content") or "") for d in dropped) if m]
+    span = f" ({times[0]}–{times[-1]})" if times else ""
+    return {"role": "system", "content": f"[{len(dropped)} mensagens anteriores omitidas{span}]"}
+
+
+def build_prompt(
+    system: list[dict],
+    question: dict,
+    history: Optional[list[dict]] = None,
+    context: Optional[list[dict]] = None,
+    context_intro: Optional[dict] = None,
+    context_outro: Optional[dict] = None,
+    budget: int = AGENT_CONTEXT_TOKEN_BUDGET,
+    model: str = "",
+) -> tuple[list[dict], PromptStats]:
+    """
+    Monta as mensagens do chat dentro do orçamento de tokens.
+
+    Ordem: system, [introdução, contexto, fechamento], histórico, pergunta.
+    A introdução e o fechamento só entram se sobrar alguma mensagem do
+    contexto.
+
+    Args:
+        system: Mensagens fixas do início (system prompt)
+        question: Pergunta atual
+        history: Histórico com o agente (mais antigo primeiro)
+        context: Mensagens da conversa principal (mais antiga primeiro)
+        context_intro: Mensagem antes do contexto
+        context_outro: Mensagem depois do contexto
+        budget: Orçamento total do prompt em tokens
+        model: Modelo (escolhe o tokenizer)
+
+    Returns:
+        (mensagens, PromptStats)
+    """
+    history = history or []
+    context = context or []
+    stats = PromptStats(budget=budget)
+
+    fixed = REPLY_PRIMING_TOKENS + sum(message_tokens(m, model) for m in system)
+    question_tokens = message_tokens(question, model)
+    if fixed + question_tokens > budget:
+        room = max(QUESTION_MIN_TOKENS, budget - fixed - MESSAGE_OVERHEAD_TOKENS)
+        question = {**question, "content": truncate_to_tokens(question.get("content") or "", room, model)}
+        question_tokens = message_tokens(question, model)
+        stats.truncated = True
+    remaining = max(0, budget - fixed - question_tokens)
+
+    kept_context: list[dict] = []
+    context_used = 0
+    if context:
+        wrapper = [m for m in (context_intro, context_outro) if m]
+        wrapper_tokens = sum(message_tokens(m, model) for m in wrapper)
+        # Espaço da linha de omitidas (contagem e horários têm tamanho quase fixo)
+        note_tokens = message_tokens(_omitted_note(context), model)
+        history_total = sum(message_tokens(m, model) for m in history)
+        history_reserved = min(history_total, int(remaining * AGENT_HISTORY_BUDGET_SHARE))
+        context_room = remaining - history_reserved - wrapper_tokens - note_tokens
+        if context_room > 0:
+            kept_context, context_used, truncated = _fill_recent(context, context_room, model, allow_truncate=True)
+            stats.truncated = stats.truncated or truncated
+        if kept_context:
+            dropped = context[:len(context) - len(kept_context)]
+            if dropped:
+                note = _omitted_note(dropped)
+                kept_context.insert(0, note)
+                context_used += message_tokens(note, model)
+            kept_context = [*([context_intro] if context_intro else []), *kept_context,
+                            *([context_outro] if context_outro else [])]
+            context_used += wrapper_tokens
+            stats.context_dropped = len(dropped)
+        else:
+            stats.context_dropped = len(context)
+        stats.context_kept = len(context) - stats.context_dropped
+
+    kept_history, history_used, _ = _fill_recent(history, remaining - context_used, model, allow_truncate=False)
+    # Não começa o histórico por uma resposta sem a pergunta que a originou
+    if kept_history and kept_history[0].get("role") == "assistant":
+        history_used -= message_tokens(kept_history.pop(0), model)
+    stats.history_kept = len(kept_history)
+    stats.history_dropped = len(history) - len(kept_history)
+
+    messages = [*system, *kept_context, *kept_history, question]
+    stats.tokens = fixed + context_used + history_used + question_tokens
+    return messages, stats
+
+
+def log_prompt(agent_key: str, model: str, stats: PromptStats, metric_label: Optional[str] = None) -> None:
+    """
+    Registra o tamanho do prompt de uma chamada (métrica + log).
+
+    `metric_label` é o rótulo `agent` da métrica (`Agent.metric_label`: chave do
+    agente do registry ou "custom"); sem ele, usa `agent_key` (chamadas internas
+    com nome fixo, como "guru" e "summary").
+    """
+    llm_prompt_tokens.observe(stats.tokens, metric_label or agent_key.lower())
+    log_event(log, "llm.prompt", agent=agent_key.lower(), model=model, tokens=stats.tokens,
+              budget=stats.budget, context=stats.context_kept, context_dropped=stats.context_dropped,
+              history=stats.history_kept, history_dropped=stats.history_dropped,
+              truncated=stats.truncated)
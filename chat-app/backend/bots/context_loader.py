@@ -1,14 +1,44 @@
 """Carrega contexto de conversas para agentes IA."""
 
+import os
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta, timezone
 from database import messages_collection
+from conversations import conversation_key
+
+# Teto de mensagens lidas; o que cabe no prompt é decidido pelo orçamento de
+# tokens do agente (bots/context_budget.py)
+AGENT_CONTEXT_MAX_MESSAGES = int(os.getenv("AGENT_CONTEXT_MAX_MESSAGES", "50"))
+
+
+def format_context_message(doc: dict, user_id: str) -> Dict[str, str]:
+    """
+    Mensagem da conversa no formato do GPT, do ponto de vista de `user_id`.
+
+    Por que formatar para GPT?
+    - GPT usa formato específico: role + content
+    - "role": "user" = cliente falando
+    - "role": "assistant" = você falando
+    """
+    # Determina quem falou
+    is_user_message = doc.get("userId") == user_id
+    role = "assistant" if is_user_message else "user"
+
+    # Formata com timestamp (contexto temporal)
+    author_name = doc.get("author", "Desconhecido")
+    text = doc.get("text", "")
+    timestamp = doc.get("createdAt", datetime.now(timezone.utc))
+
+    return {
+        "role": role,
+        "content": f"[{timestamp.strftime('%H:%M')}] {author_name}: {text}"
+    }
 
 
 async def get_conversation_context(
     user_id: str,
     contact_id: str,
-    limit: int = 20,
+    limit: int = AGENT_CONTEXT_MAX_MESSAGES,
     hours_back: int = 24
 ) -> List[Dict[str, str]]:
     """
@@ -21,7 +51,7 @@ async def get_conversation_context(
     Args:
         user_id: ID do usuário logado
         contact_id: ID do contato/cliente
-        limit: Número máximo de mensagens (evita custo alto API)
+        limit: Número máximo de mensagens (as mais recentes da janela)
         hours_back: Janela de tempo (evita contexto antigo/irrelevante)
         
     Returns:
@@ -37,41 +67,17 @@ async def get_conversation_context(
     # Usa timezone UTC para compatibilidade com createdAt armazenado com tzinfo
     time_threshold = datetime.now(timezone.utc) - timedelta(hours=hours_back)
     
-    # Query: mensagens entre user_id e contact_id (ambas direções)
+    # Query: mensagens entre user_id e contact_id (ambas direções) pela chave canônica
     query = {
-        "$or": [
-            {"userId": user_id, "contactId": contact_id},
-            {"userId": contact_id, "contactId": user_id}
-        ],
+        "conversationKey": conversation_key(user_id, contact_id),
         "createdAt": {"$gte": time_threshold}
     }
     
-    cursor = messages_collection.find(query).sort("createdAt", 1).limit(limit)
-    docs = await cursor.to_list(length=limit)
-    
-    # Por que formatar para GPT?
-    # - GPT usa formato específico: role + content
-    # - "role": "user" = cliente falando
-    # - "role": "assistant" = você falando
-    context_messages = []
-    for doc in docs:
-        # Determina quem falou
-        is_user_message = doc.get("userId") == user_id
-        role = "assistant" if is_user_message else "user"
-        
-        # Formata com timestamp (contexto temporal)
-        author_name = doc.get("author", "Desconhecido")
-        text = doc.get("text", "")
-        timestamp = doc.get("createdAt", datetime.now(timezone.utc))
-        
-        content = f"[{timestamp.strftime('%H:%M')}] {author_name}: {text}"
-        
-        context_messages.append({
-            "role": role,
-            "content": content
-        })
+    # Mais recentes primeiro (o limite corta as antigas), depois ordem cronológica
+    cursor = messages_collection.find(query).sort([("createdAt", -1), ("_id", -1)]).limit(limit)
+    docs = list(reversed(await cursor.to_list(length=limit)))
     
-    return context_messages
+    return [format_context_message(doc, user_id) for doc in docs]
 
 
 async def format_context_summary(
@@ -0,0 +1,132 @@
+"""Cache de respostas dos agentes e do Guru.
+
+Clientes fazem as mesmas perguntas o dia todo, e cada uma gerava uma nova
+chamada à OpenAI (nos bots customizados, na API key do próprio dono). Aqui a
+resposta fica guardada pela chave:
+
+    agente : modelo : hash(system prompt) : hash(pergunta normalizada) : hash(contexto)
+
+em que o contexto é tudo o que vai antes da pergunta (conversa principal e
+histórico com o agente). Mesma pergunta com outro histórico não reaproveita
+resposta.
+
+Dois níveis: LRU em memória com TTL (`LLM_CACHE_MAX`, `LLM_CACHE_TTL_SECONDS`)
+e, com `REDIS_URL`, o Redis compartilhado entre instâncias. Agentes saem do
+cache com `Agent.cache_responses = False` (bots customizados: campo
+`cacheResponses`) ou listados em `LLM_CACHE_DISABLED_AGENTS`; `LLM_CACHE_ENABLED=false`
+desliga tudo. Só respostas bem-sucedidas entram no cache.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import llm_cache_lookups
+from socket_manager import REDIS_URL
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_MAX = int(os.getenv("LLM_CACHE_MAX", "5000"))
+LLM_CACHE_DISABLED_AGENTS = {
+    key.strip().lower() for key in os.getenv("LLM_CACHE_DISABLED_AGENTS", "").split(",") if key.strip()
+}
+
+
+def _digest(value) -> str:
+    raw = value if isinstance(value, str) else json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas, espaços colapsados e sem pontuação nas pontas."""
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    return text.strip(" ?!.,;:")
+
+
+def cache_key(agent_key: str, model: str, system_prompt: str, question: str, context: list) -> str:
+    return ":".join([
+        agent_key.lower(),
+        model,
+        _digest(system_prompt),
+        _digest(normalize_question(question)),
+        _digest(context),
+    ])
+
+
+class ResponseCache:
+    """LRU com TTL em memória e, opcionalmente, o Redis como segundo nível."""
+
+    def __init__(self, max_size: int = LLM_CACHE_MAX, ttl: int = LLM_CACHE_TTL_SECONDS,
+                 redis_url: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(redis_url, decode_responses=True)
+
+    async def get(self, key: str) -> tuple[Optional[str], str]:
+        """Retorna `(resposta ou None, nível)` com nível "memory", "redis" ou "miss"."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[1], "memory"
+            del self._entries[key]
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(f"llmcache:{key}")
+            except Exception as e:
+                print(f"⚠️  [LLMCache] Redis indisponível: {e}")
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                return value, "redis"
+        return None, "miss"
+
+    async def put(self, key: str, value: str) -> None:
+        self._remember(key, value)
+        if self._redis is not None:
+            try:
+                await self._redis.set(f"llmcache:{key}", value, ex=self.ttl)
+            except Exception as e:
+                print(f"⚠️  [LLMCache] Redis indisponível: {e}")
+
+    def _remember(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxSize": self.max_size}
+
+
+response_cache = ResponseCache(redis_url=REDIS_URL)
+
+
+def cache_enabled_for(agent_key: str, opt_in: bool = True) -> bool:
+    return LLM_CACHE_ENABLED and opt_in and agent_key.lower() not in LLM_CACHE_DISABLED_AGENTS
+
+
+async def get_cached_response(metric_label: str, key: str) -> Optional[str]:
+    """`metric_label`: `Agent.metric_label` (chave do agente do registry ou "custom")."""
+    value, level = await response_cache.get(key)
+    llm_cache_lookups.inc(1, metric_label, level)
+    return value
+
+
+async def store_response(key: str, value: str) -> None:
+    await response_cache.put(key, value)
+
+
+def llm_cache_stats() -> dict:
+    return response_cache.stats()
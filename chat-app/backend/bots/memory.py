@@ -0,0 +1,142 @@
+"""Memória de conversa dos agentes e do Guru.
+
+A fonte é a coleção `agent_messages` (a mesma que o painel de agentes lista),
+por conversa `(usuário, agente, contato)`: o agente lembra do que falou
+naquele atendimento, sobrevive a restart e é igual em todas as instâncias.
+
+Na frente fica um cache LRU pequeno só com as conversas em uso
+(`AGENT_MEMORY_CACHE_MAX` entradas com as últimas `AGENT_MEMORY_MESSAGES`
+mensagens). Cada entrada vale `AGENT_MEMORY_TTL_SECONDS` a partir de quando
+foi carregada do Mongo, por mais que seja usada; depois disso a conversa é
+relida. Com `REDIS_URL` (várias instâncias) o prazo padrão cai para poucos
+segundos: respostas dadas por outro nó aparecem depois dele, como no cache
+local do state_store. A memória do processo não cresce com o número de
+usuários. Uma conversa fora do cache volta com uma consulta no índice
+`agent_thread_created`.
+
+`remember` atualiza o cache na hora (a próxima pergunta já vê a resposta) e
+a gravação no Mongo pode ficar para depois, como no `process_agent_message`.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from socket_manager import REDIS_URL
+
+AGENT_MEMORY_MESSAGES = int(os.getenv("AGENT_MEMORY_MESSAGES", "10"))
+AGENT_MEMORY_CACHE_MAX = int(os.getenv("AGENT_MEMORY_CACHE_MAX", "1000"))
+AGENT_MEMORY_TTL_SECONDS = float(os.getenv("AGENT_MEMORY_TTL_SECONDS", "5" if REDIS_URL else "900"))
+
+ThreadKey = tuple[str, str, Optional[str]]
+
+
+def _thread_key(user_id: str, agent_key: str, contact_id: Optional[str]) -> ThreadKey:
+    return user_id, agent_key, contact_id
+
+
+def _as_message(doc: dict) -> dict:
+    return {"role": doc["role"], "content": doc.get("text", "")}
+
+
+class AgentMemory:
+    """Cache LRU com validade contada da carga, sobre a coleção `agent_messages`."""
+
+    def __init__(self, max_entries: int = AGENT_MEMORY_CACHE_MAX, ttl: float = AGENT_MEMORY_TTL_SECONDS,
+                 max_messages: int = AGENT_MEMORY_MESSAGES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_messages = max_messages
+        # chave -> (carregada em, mensagens mais antigas primeiro)
+        self._entries: OrderedDict[ThreadKey, tuple[float, list[dict]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, now: float) -> None:
+        # Ordem do OrderedDict = último acesso: as paradas ficam na frente
+        while self._entries:
+            key, (loaded_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - loaded_at < self.ttl:
+                break
+            del self._entries[key]
+
+    def _store(self, key: ThreadKey, messages: list[dict], loaded_at: Optional[float] = None) -> None:
+        now = time.monotonic()
+        self._entries[key] = (now if loaded_at is None else loaded_at, messages[-self.max_messages:])
+        self._entries.move_to_end(key)
+        self._evict(now)
+
+    async def get(self, user_id: str, agent_key: str, contact_id: Optional[str] = None) -> list[dict]:
+        """Últimas mensagens (`{"role", "content"}`) da conversa, mais antigas primeiro."""
+        from database import agent_messages_collection
+
+        key = _thread_key(user_id, agent_key, contact_id)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(entry[1])
+        self.misses += 1
+        docs = await agent_messages_collection.find(
+            {"userId": user_id, "agentKey": key[1], "contactId": contact_id},
+            {"role": 1, "text": 1}
+        ).sort("createdAt", -1).limit(self.max_messages).to_list(self.max_messages)
+        messages = [_as_message(d) for d in reversed(docs) if d.get("role") in ("user", "assistant")]
+        self._store(key, messages)
+        return list(messages)
+
+    def remember(self, user_id: str, agent_key: str, contact_id: Optional[str], docs: list[dict]) -> None:
+        """Acrescenta mensagens (docs de `agent_messages`) à conversa em cache, se houver."""
+        key = _thread_key(user_id, agent_key, contact_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            # Mantém o horário da carga: escrever não adia a releitura
+            self._store(key, [*entry[1], *(_as_message(d) for d in docs)], loaded_at=entry[0])
+
+    async def append(self, user_id: str, agent_key: str, contact_id: Optional[str], docs: list[dict]) -> None:
+        """Grava as mensagens em `agent_messages` e atualiza o cache."""
+        from database import agent_messages_collection
+
+        self.remember(user_id, agent_key, contact_id, docs)
+        await agent_messages_collection.insert_many(docs, ordered=True)
+
+    async def clear(self, user_id: str, agent_key: str, contact_id: Optional[str] = None) -> None:
+        """Apaga a conversa (banco e cache)."""
+        from database import agent_messages_collection
+
+        key = _thread_key(user_id, agent_key, contact_id)
+        self._entries.pop(key, None)
+        await agent_messages_collection.delete_many({"userId": user_id, "agentKey": key[1], "contactId": contact_id})
+
+    def reset(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxSize": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+agent_memory = AgentMemory()
+
+
+def answered_at(asked_at: datetime) -> datetime:
+    """Horário da resposta, sempre depois da pergunta (o Mongo guarda milissegundos)."""
+    return max(datetime.utcnow(), asked_at + timedelta(milliseconds=1))
+
+
+def turn_docs(user_id: str, agent_key: str, contact_id: Optional[str], user_name: str, question: str,
+              author: str, answer: str, asked_at: Optional[datetime] = None) -> list[dict]:
+    """Pergunta e resposta no formato de `agent_messages`."""
+    asked_at = asked_at or datetime.utcnow()
+    base = {"agentKey": agent_key, "userId": user_id, "contactId": contact_id}
+    return [
+        {**base, "author": user_name, "text": question, "role": "user", "createdAt": asked_at},
+        {**base, "author": author, "text": answer, "role": "assistant", "createdAt": answered_at(asked_at)},
+    ]
+
+
+def agent_memory_stats() -> dict:
+    return agent_memory.stats()
@@ -11,16 +11,21 @@ Suporta dois modos:
 import os
 import re
 import json
-import httpx
 from typing import Optional
 from dataclasses import dataclass, asdict
 from dotenv import load_dotenv
 
+from metrics import post_llm
+from llm_client import get_llm_client
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_NLU_MODEL", "gpt-4o-mini")  # Modelo mais barato para NLU
 USE_GPT_NLU = os.getenv("USE_GPT_NLU", "false").lower() == "true"
+# Base da API compatível com OpenAI (ex.: servidor local em testes de carga)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_API_URL = f"{OPENAI_BASE_URL}/chat/completions"
 
 
 @dataclass
@@ -157,55 +162,56 @@ Retorne APENAS um JSON válido no formato:
 Se a mensagem não se encaixar em nenhuma intenção, use "general" com confidence baixa."""
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,  # Mais determinístico
-                    "max_tokens": 150
-                }
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ GPT NLU error: {response.status_code} - {response.text}")
-                return None
-            
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
-            
-            # Remove markdown se houver
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            
-            data = json.loads(content)
-            intent_name = data.get("intent", "general")
-            confidence = float(data.get("confidence", 0.5))
-            reasoning = data.get("reasoning", "")
-            
-            # Valida se a intenção existe
-            if intent_name not in intents and intent_name != "general":
-                intent_name = "general"
-                confidence = 0.3
-            
-            intent_data = intents.get(intent_name, {})
-            
-            return Intent(
-                name=intent_name,
-                confidence=round(confidence, 2),
-                keywords_matched=[reasoning] if reasoning else [],
-                suggested_agent=intent_data.get("agent"),
-                suggested_action=intent_data.get("action"),
-                method="gpt"
-            )
-            
+        client = get_llm_client()
+        response = await post_llm(
+            client, "chat", OPENAI_MODEL, OPENAI_API_URL,
+            timeout=10.0,
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": OPENAI_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.3,  # Mais determinístico
+                "max_tokens": 150
+            }
+        )
+        
+        if response.status_code != 200:
+            print(f"❌ GPT NLU error: {response.status_code} - {response.text}")
+            return None
+        
+        result = response.json()
+        content = result["choices"][0]["message"]["content"].strip()
+        
+        # Remove markdown se houver
+        if content.startswith("```"):
+            content = content.split("```")[1]
+            if content.startswith("json"):
+                content = content[4:]
+        
+        data = json.loads(content)
+        intent_name = data.get("intent", "general")
+        confidence = float(data.get("confidence", 0.5))
+        reasoning = data.get("reasoning", "")
+        
+        # Valida se a intenção existe
+        if intent_name not in intents and intent_name != "general":
+            intent_name = "general"
+            confidence = 0.3
+        
+        intent_data = intents.get(intent_name, {})
+        
+        return Intent(
+            name=intent_name,
+            confidence=round(confidence, 2),
+            keywords_matched=[reasoning] if reasoning else [],
+            suggested_agent=intent_data.get("agent"),
+            suggested_action=intent_data.get("action"),
+            method="gpt"
+        )
+        
     except json.JSONDecodeError as e:
         print(f"❌ GPT NLU JSON parse error: {e} - Content: {content}")
         return None
@@ -0,0 +1,215 @@
+"""Pool de workers para respostas de bots fora dos handlers do Socket.IO.
+
+O `chat:send` e o upload de anexos só persistem, confirmam e entregam a
+mensagem; automações por palavra-chave, transcrição de áudio e respostas do
+Guru entram aqui como jobs. O pool tem um número fixo de workers e uma fila
+limitada (`BOT_REPLY_QUEUE_MAX`): com a fila cheia o job é recusado e o
+chamador avisa o usuário, em vez de acumular corrotinas sem limite.
+
+Os jobs de um mesmo usuário rodam em ordem, um de cada vez; usuários
+diferentes rodam em paralelo e se revezam nos workers.
+
+A "digitação humanizada" (`BOT_HUMANIZED_TYPING`) é só apresentação: a espera
+proporcional ao tamanho da resposta acontece numa tarefa à parte, encadeada
+por usuário, e não ocupa um worker.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from bots.ai_bot import GURU_AUTHOR, ask_chatgpt, clean_bot_mention, is_ai_question
+from bots.automations import handle_keyword_if_matches, publish_message
+from socket_manager import sio, user_room
+from streaming import open_stream
+from transcription import transcribe_from_s3
+
+BOT_REPLY_WORKERS = int(os.getenv("BOT_REPLY_WORKERS", "8"))
+BOT_REPLY_QUEUE_MAX = int(os.getenv("BOT_REPLY_QUEUE_MAX", "1000"))
+HUMANIZED_TYPING = os.getenv("BOT_HUMANIZED_TYPING", "false").lower() in ("1", "true", "yes")
+
+Job = Callable[[], Awaitable[None]]
+
+
+class ReplyWorkerPool:
+    """Workers assíncronos com fila limitada e ordem por usuário."""
+
+    def __init__(self, workers: int = BOT_REPLY_WORKERS, max_queue: int = BOT_REPLY_QUEUE_MAX):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._jobs: dict[str, deque] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._queued = 0
+        self._running = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._idle: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._jobs.clear()
+        self._queued = 0
+
+    def submit(self, user_id: str, job: Job, label: str = "job") -> bool:
+        """
+        Enfileira um job para o usuário.
+
+        Returns:
+            False quando a fila está cheia (o job não foi aceito)
+        """
+        self.start()
+        if self._queued >= self.max_queue:
+            self._rejected += 1
+            print(f"⚠️  [ReplyPool] Fila cheia ({self._queued}) - {label} de {user_id} recusado")
+            return False
+        pending = self._jobs.get(user_id)
+        if pending is None:
+            # Usuário sem jobs pendentes nem em execução: entra na fila de prontos
+            pending = self._jobs[user_id] = deque()
+            self._ready.put_nowait(user_id)
+        pending.append((job, label, time.monotonic()))
+        self._queued += 1
+        self._idle.clear()
+        return True
+
+    async def join(self) -> None:
+        """Aguarda a fila esvaziar (usado em testes e no desligamento)."""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queued,
+            "running": self._running,
+            "users": len(self._jobs),
+            "maxQueue": self.max_queue,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "avgWaitMs": round(self._wait_seconds / self._processed * 1000, 1) if self._processed else 0.0,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._ready.get()
+            pending = self._jobs[user_id]
+            job, label, queued_at = pending.popleft()
+            self._queued -= 1
+            self._running += 1
+            self._wait_seconds += time.monotonic() - queued_at
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                print(f"❌ [ReplyPool] Erro em {label} de {user_id}: {e}")
+            finally:
+                self._running -= 1
+                self._processed += 1
+                # Próximo job do mesmo usuário vai para o fim da fila (revezamento)
+                if pending:
+                    self._ready.put_nowait(user_id)
+                else:
+                    del self._jobs[user_id]
+                if not self._jobs:
+                    self._idle.set()
+
+
+reply_pool = ReplyWorkerPool()
+
+# Última apresentação com digitação de cada usuário (mantém a ordem das respostas)
+_presentations: dict[str, asyncio.Task] = {}
+
+
+def typing_delay(text: str) -> float:
+    """Tempo de "digitação" proporcional ao tamanho da resposta (1,5s a 5s)."""
+    return max(1.5, min(len(text) / 50, 5.0))
+
+
+async def _emit_typing(user_id: str, is_typing: bool) -> None:
+    await sio.emit("chat:typing", {"author": "Guru", "isTyping": is_typing}, room=user_room(user_id))
+
+
+async def publish_guru_reply(user_id: str, text: str, stream_id: Optional[str] = None) -> None:
+    """Publica a resposta do Guru; com digitação humanizada, sem ocupar o worker."""
+    async def publish():
+        await _emit_typing(user_id, False)
+        await publish_message(sio.emit, author=GURU_AUTHOR, text=text, user_id=user_id,
+                              target_sid=user_room(user_id), stream_id=stream_id)
+
+    # Resposta em streaming já apareceu para o usuário: não simula digitação
+    if not HUMANIZED_TYPING or stream_id:
+        await publish()
+        return
+
+    previous = _presentations.get(user_id)
+
+    async def present():
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        await _emit_typing(user_id, True)
+        await asyncio.sleep(typing_delay(text))
+        await publish()
+
+    def forget(task: asyncio.Task) -> None:
+        if _presentations.get(user_id) is task:
+            del _presentations[user_id]
+
+    task = asyncio.create_task(present())
+    _presentations[user_id] = task
+    task.add_done_callback(forget)
+
+
+async def _ask_guru(user_id: str, author: str, question: str, prefix: str = "",
+                    contact_id: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """Pergunta ao Guru; com streaming, os trechos vão como `chat:message-delta`."""
+    await _emit_typing(user_id, True)
+    stream = open_stream("chat:message-delta", user_room(user_id), author=GURU_AUTHOR)
+    try:
+        if stream is None:
+            return await ask_chatgpt(question, user_id, author, contact_id=contact_id), None
+        if prefix:
+            await stream.push(prefix)
+        ai_response = await ask_chatgpt(question, user_id, author, on_delta=stream.push, contact_id=contact_id)
+        await stream.flush()
+        return ai_response, stream.id
+    except Exception:
+        await _emit_typing(user_id, False)
+        raise
+
+
+async def guru_reply(user_id: str, author: str, text: str, contact_id: Optional[str] = None) -> None:
+    """Job: automação por palavra-chave e resposta do Guru para uma mensagem."""
+    await handle_keyword_if_matches(sio.emit, text)
+    ai_response, stream_id = await _ask_guru(user_id, author, clean_bot_mention(text), contact_id=contact_id)
+    await publish_guru_reply(user_id, ai_response, stream_id)
+
+
+async def transcribe_and_reply(user_id: str, author: str, key: str, bucket: str,
+                               contact_id: Optional[str] = None) -> None:
+    """Job: transcreve um áudio e, se for pergunta para o Guru, responde."""
+    transcription = await transcribe_from_s3(key, bucket)
+    if not transcription or transcription.startswith("[") or not is_ai_question(transcription):
+        return
+    prefix = f'🎤 _Áudio transcrito:_ "{transcription}"\n\n'
+    ai_response, stream_id = await _ask_guru(user_id, author, clean_bot_mention(transcription), prefix,
+                                             contact_id=contact_id)
+    await publish_guru_reply(user_id, prefix + ai_response, stream_id)
@@ -0,0 +1,258 @@
+"""Resumo incremental das conversas (painel de agentes).
+
+Antes, `agent:request-summary` recarregava até 40 mensagens das últimas 72h e
+mandava tudo para o LLM a cada pedido, e toda pergunta ao agente (e as
+sugestões) reenviava a mesma cauda crua da conversa. Agora cada conversa
+(dono, contato) tem um documento em `conversation_summaries`:
+
+    {userId, contactId, summary, cursor: {createdAt, id}, messageCount, updatedAt}
+
+`refresh_summary` dobra no resumo só as mensagens depois do cursor, em lotes
+de `SUMMARY_BATCH_MAX`, e avança o cursor. A atualização roda em background
+depois de `SUMMARY_EVERY_MESSAGES` mensagens novas ou quando a conversa fica
+`SUMMARY_IDLE_SECONDS` parada, para as conversas acompanhadas nesta instância
+(alguém pediu resumo ou falou com um agente sobre o contato; no máximo
+`SUMMARY_TRACKED_MAX`). O que ficar para trás entra no próximo refresh.
+
+- pedido de resumo: o resumo gravado sai na hora (`stale: true` se já há
+  mensagens novas; a versão atualizada vem em seguida com `stale: false`);
+- prompts dos agentes: resumo + mensagens ainda não resumidas (pelo menos as
+  `SUMMARY_KEEP_RECENT` últimas), no lugar da cauda crua.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bots import context_loader
+from bots.agents import OPENAI_API_KEY, OPENAI_API_URL, OPENAI_MODEL
+from bots.context_budget import build_prompt, log_prompt
+from conversations import conversation_key
+from llm_client import get_llm_client
+from logging_setup import get_logger, log_event
+from metrics import post_llm
+from pagination import DIRECTION_AFTER, combine_filters, keyset_filter
+
+SUMMARY_EVERY_MESSAGES = int(os.getenv("SUMMARY_EVERY_MESSAGES", "10"))
+SUMMARY_IDLE_SECONDS = float(os.getenv("SUMMARY_IDLE_SECONDS", "120"))
+SUMMARY_BATCH_MAX = int(os.getenv("SUMMARY_BATCH_MAX", "50"))
+SUMMARY_INITIAL_HOURS = int(os.getenv("SUMMARY_INITIAL_HOURS", "72"))
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "4"))
+SUMMARY_TAIL_MAX = int(os.getenv("SUMMARY_TAIL_MAX", "20"))
+SUMMARY_TRACKED_MAX = int(os.getenv("SUMMARY_TRACKED_MAX", "5000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "4000"))
+# Lotes por refresh (conversa muito atrasada termina no próximo)
+SUMMARY_MAX_ROUNDS = 10
+
+SUMMARY_INSTRUCTIONS = (
+    "Você mantém o resumo de uma conversa de atendimento. Resuma em poucos pontos (3 a 5), listando: "
+    "1) problema/assunto, 2) ações pendentes, 3) próximos passos. Linguagem direta, em português. "
+    "Responda apenas com o resumo atualizado."
+)
+
+log = get_logger("summary")
+
+
+@dataclass
+class _Thread:
+    """Conversa acompanhada: mensagens ainda não resumidas e timer de inatividade."""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: int = 0
+    last_activity: float = 0.0
+    timer: Optional[asyncio.Task] = None
+
+
+_threads: OrderedDict[tuple[str, str], _Thread] = OrderedDict()
+_background: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+def track(user_id: str, contact_id: str) -> _Thread:
+    """Passa a acompanhar a conversa (mensagens novas disparam o refresh)."""
+    key = (user_id, contact_id)
+    thread = _threads.get(key)
+    if thread is None:
+        thread = _threads[key] = _Thread()
+        while len(_threads) > SUMMARY_TRACKED_MAX:
+            _, oldest = _threads.popitem(last=False)
+            if oldest.timer is not None:
+                oldest.timer.cancel()
+    _threads.move_to_end(key)
+    return thread
+
+
+def note_message(doc: dict) -> None:
+    """Conta uma mensagem nova nas conversas acompanhadas (chamado por `record_message`)."""
+    sender_id = doc.get("userId")
+    recipient_id = doc.get("contactId")
+    if not sender_id or not recipient_id:
+        return
+    for key in ((sender_id, recipient_id), (recipient_id, sender_id)):
+        thread = _threads.get(key)
+        if thread is None:
+            continue
+        thread.pending += 1
+        thread.last_activity = time.monotonic()
+        if thread.pending >= SUMMARY_EVERY_MESSAGES:
+            thread.pending = 0
+            if thread.timer is not None:
+                thread.timer.cancel()
+            _spawn(_refresh_quietly(*key))
+        elif thread.timer is None:
+            thread.timer = _spawn(_refresh_when_idle(key, thread))
+
+
+async def _refresh_when_idle(key: tuple[str, str], thread: _Thread) -> None:
+    try:
+        while True:
+            wait = thread.last_activity + SUMMARY_IDLE_SECONDS - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+    finally:
+        thread.timer = None
+    if thread.pending:
+        await _refresh_quietly(*key)
+
+
+async def _refresh_quietly(user_id: str, contact_id: str) -> None:
+    try:
+        await refresh_summary(user_id, contact_id)
+    except Exception as e:
+        print(f"⚠️  [Summary] Falha ao atualizar resumo {user_id}/{contact_id}: {e}")
+
+
+async def get_summary(user_id: str, contact_id: str) -> Optional[dict]:
+    from database import conversation_summaries_collection
+    return await conversation_summaries_collection.find_one({"userId": user_id, "contactId": contact_id})
+
+
+def _after_cursor(user_id: str, contact_id: str, cursor: Optional[dict]) -> dict:
+    query = {"conversationKey": conversation_key(user_id, contact_id)}
+    if cursor:
+        return combine_filters(query, keyset_filter(cursor["createdAt"], cursor["id"], DIRECTION_AFTER))
+    # Primeiro resumo: só a janela recente, como o pedido de resumo fazia
+    return {**query, "createdAt": {"$gte": datetime.utcnow() - timedelta(hours=SUMMARY_INITIAL_HOURS)}}
+
+
+async def has_new_messages(user_id: str, contact_id: str, cursor: Optional[dict]) -> bool:
+    from database import messages_collection
+    docs = await messages_collection.find(_after_cursor(user_id, contact_id, cursor), {"_id": 1}).limit(1).to_list(1)
+    return bool(docs)
+
+
+async def _fold(previous: str, docs: list[dict], user_id: str) -> str:
+    """Resumo anterior + mensagens novas -> resumo atualizado (uma chamada ao LLM)."""
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY não configurada")
+    system = SUMMARY_INSTRUCTIONS + (f"\n\nRESUMO ATÉ AGORA:\n{previous}" if previous else "")
+    messages, stats = build_prompt(
+        system=[{"role": "system", "content": system}],
+        question={"role": "user", "content": "Atualize o resumo com as novas mensagens."},
+        context=[context_loader.format_context_message(d, user_id) for d in docs],
+        context_intro={"role": "system", "content": "NOVAS MENSAGENS:"},
+        budget=SUMMARY_TOKEN_BUDGET,
+        model=OPENAI_MODEL
+    )
+    log_prompt("summary", OPENAI_MODEL, stats)
+    response = await post_llm(
+        get_llm_client(), "chat", OPENAI_MODEL, OPENAI_API_URL,
+        timeout=30.0,
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
+        json={"model": OPENAI_MODEL, "messages": messages, "temperature": 0.3, "max_tokens": 400}
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"].strip()
+
+
+async def refresh_summary(user_id: str, contact_id: str) -> Optional[dict]:
+    """
+    Dobra no resumo as mensagens posteriores ao cursor.
+
+    Returns:
+        Documento do resumo (None se a conversa ainda não tem mensagens)
+    """
+    from database import conversation_summaries_collection, messages_collection
+
+    thread = track(user_id, contact_id)
+    async with thread.lock:
+        thread.pending = 0
+        started = time.perf_counter()
+        doc = await get_summary(user_id, contact_id)
+        folded = 0
+        for _ in range(SUMMARY_MAX_ROUNDS):
+            batch = await messages_collection.find(
+                _after_cursor(user_id, contact_id, (doc or {}).get("cursor"))
+            ).sort([("createdAt", 1), ("_id", 1)]).limit(SUMMARY_BATCH_MAX).to_list(SUMMARY_BATCH_MAX)
+            if not batch:
+                break
+            summary = await _fold((doc or {}).get("summary", ""), batch, user_id)
+            cursor = {"createdAt": batch[-1]["createdAt"], "id": batch[-1]["_id"]}
+            now = datetime.utcnow()
+            await conversation_summaries_collection.update_one(
+                {"userId": user_id, "contactId": contact_id},
+                {"$set": {"summary": summary, "cursor": cursor, "updatedAt": now},
+                 "$inc": {"messageCount": len(batch)}},
+                upsert=True
+            )
+            doc = {**(doc or {}), "userId": user_id, "contactId": contact_id, "summary": summary,
+                   "cursor": cursor, "updatedAt": now,
+                   "messageCount": (doc or {}).get("messageCount", 0) + len(batch)}
+            folded += len(batch)
+            if len(batch) < SUMMARY_BATCH_MAX:
+                break
+        if folded:
+            log_event(log, "summary.refresh", user=user_id, contact=contact_id, folded=folded,
+                      ms=round((time.perf_counter() - started) * 1000, 1))
+        return doc
+
+
+async def summary_context(user_id: str, contact_id: str) -> list[dict]:
+    """
+    Contexto da conversa para o prompt dos agentes.
+
+    Com resumo: o resumo e as mensagens ainda não resumidas (pelo menos as
+    `SUMMARY_KEEP_RECENT` últimas). Sem resumo ainda: a cauda crua das
+    últimas 24h, e o primeiro resumo é gerado em background.
+    """
+    from database import messages_collection
+
+    track(user_id, contact_id)
+    doc = await get_summary(user_id, contact_id)
+    if not doc or not doc.get("summary"):
+        _spawn(_refresh_quietly(user_id, contact_id))
+        return await context_loader.get_conversation_context(user_id=user_id, contact_id=contact_id, hours_back=24)
+
+    recent = await messages_collection.find(
+        {"conversationKey": conversation_key(user_id, contact_id)}
+    ).sort([("createdAt", -1), ("_id", -1)]).limit(SUMMARY_TAIL_MAX).to_list(SUMMARY_TAIL_MAX)
+    recent.reverse()
+    position = (doc["cursor"]["createdAt"], str(doc["cursor"]["id"]))
+    unsummarized = [d for d in recent if (d["createdAt"], str(d["_id"])) > position]
+    tail = unsummarized if len(unsummarized) >= SUMMARY_KEEP_RECENT else recent[-SUMMARY_KEEP_RECENT:]
+    return [
+        {"role": "system", "content": f"RESUMO DA CONVERSA ATÉ AQUI:\n{doc['summary']}"},
+        *(context_loader.format_context_message(d, user_id) for d in tail),
+    ]
+
+
+def reset() -> None:
+    """Esquece as conversas acompanhadas (testes)."""
+    for thread in _threads.values():
+        if thread.timer is not None:
+            thread.timer.cancel()
+    _threads.clear()
+
+
+def summaries_stats() -> dict:
+    return {"tracked": len(_threads), "pending": sum(t.pending for t in _threads.values())}
@@ -3,15 +3,25 @@ Gerenciamento de contatos e conversas
 """
 from typing import List, Optional
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from bson import ObjectId
 from bson.errors import InvalidId
 from database import db
 from deps import get_current_user_id
-from datetime import datetime
+from conversations import conversation_key, get_unread_totals, list_conversations, list_peer_ids, reset_unread
+from pagination import DIRECTION_BEFORE, before_millis_filter, combine_filters, decode_cursor, encode_cursor, fetch_page
+from exports import EXPORT_FORMATS, export_response, iter_export
+from serializers import MESSAGE_PROJECTION, ORJSONResponse, message_to_dict
+from presence import online_among
+from profile_cache import get_profile, get_profiles, invalidate_profile
+import os
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
+# Máximo de usuários sem conversa acrescentados na última página da lista
+CONTACTS_DIRECTORY_LIMIT = int(os.getenv("CONTACTS_DIRECTORY_LIMIT", "200"))
+
 
 # ============================================================================
 # MODELS
@@ -46,6 +56,8 @@ async def create_contact(data: ContactCreate, current_user_id: str = Depends(get
         "createdAt": datetime.utcnow()
     }
     result = await db.contacts.insert_one(doc)
+    # Descarta um eventual "não encontrado" em cache para o novo id
+    invalidate_profile(result.inserted_id)
     return {"id": str(result.inserted_id)}
 
 class ConversationMessage(BaseModel):
@@ -64,11 +76,73 @@ class ConversationMessage(BaseModel):
 # ROUTES
 # ============================================================================
 
+def _contact_dict(contact_id: str, name: str, profile: dict, last_message: str = "",
+                  last_message_time: int = 0, unread_count: int = 0) -> dict:
+    """Item da lista de contatos no formato de `Contact`."""
+    return {
+        "id": contact_id,
+        "name": name,
+        "email": profile.get("email"),
+        "avatar": profile.get("avatar"),
+        "lastMessage": last_message,
+        "lastMessageTime": last_message_time,
+        "unreadCount": unread_count,
+        "online": False,
+    }
+
+
+def _is_seed_profile(profile: dict) -> bool:
+    """Heurística para identificar usuários/contatos de seed/teste.
+    Exclui e-mails com 'test' ou 'example.com', e nomes com 'Test' ou que começam com 'New'.
+    """
+    email = (profile.get("email") or "").lower()
+    name = (profile.get("name") or "").lower()
+    if not name and not email:
+        return True
+    if "test" in email or "example.com" in email or "+ci" in email:
+        return True
+    if name.startswith("new") or "test" in name:
+        return True
+    return False
+
+
+def _object_ids(ids) -> list:
+    result = []
+    for value in ids:
+        try:
+            result.append(ObjectId(value))
+        except (InvalidId, TypeError):
+            continue
+    return result
+
+
+async def _with_presence(contacts: list[dict]) -> list[dict]:
+    """Preenche `online` com o store de presença (uma consulta para a página)."""
+    online = await online_among([c["id"] for c in contacts])
+    for contact in contacts:
+        contact["online"] = contact["id"] in online
+    return contacts
+
+
 @router.get("/", response_model=List[Contact])
-async def list_contacts(current_user_id: str = Depends(get_current_user_id), request: Request = None):
+async def list_contacts(
+    current_user_id: str = Depends(get_current_user_id),
+    request: Request = None,
+    limit: int = 100,
+    before: Optional[int] = None,
+    cursor: Optional[str] = None
+):
     """
-    Lista todos os usuários cadastrados como contatos
-    (compatibilidade com mensagens antigas sem contactId)
+    Lista as conversas do usuário ordenadas pela última atividade.
+
+    Lê o read model `conversations` (uma query indexada por página) e resolve os
+    perfis em lote. Quando a última página é alcançada, acrescenta os usuários
+    (no máximo `CONTACTS_DIRECTORY_LIMIT`) e contatos externos com quem ainda
+    não há conversa, para que continuem acessíveis na UI.
+
+    - limit: tamanho da página (máx. 500)
+    - cursor: valor do header `X-Next-Cursor` da página anterior
+    - before: legado; timestamp em ms (UTC) da última atividade do último item
     """
     # Se chamada via HTTP, 'request' estará presente e devemos exigir header Authorization
     exclude_seeds = False
@@ -77,92 +151,72 @@ async def list_contacts(current_user_id: str = Depends(get_current_user_id), req
             raise HTTPException(status_code=401, detail="Token ausente")
         exclude_seeds = True
 
-    # Retorna usuários do sistema (exceto o próprio)
-    try:
-        id_filter = {"_id": {"$ne": ObjectId(current_user_id)}}
-    except InvalidId:
-        id_filter = {"_id": {"$ne": current_user_id}}
-
-    users = await db.users.find(id_filter, {"password": 0}).to_list(None)
-    
-    contacts = []
+    limit = max(1, min(limit, 500))
+    # lastMessageAt é gravado em UTC
+    before_dt = datetime.fromtimestamp(before / 1000.0, tz=timezone.utc) if before else None
+    page_cursor = decode_cursor(cursor) if cursor else None
 
-    def is_seed_user(u: dict) -> bool:
-        """Heurística para identificar usuários de seed/teste.
-        Exclui e-mails com 'test' ou 'example.com', e nomes com 'Test' ou que começam com 'New'.
-        """
-        email = (u.get("email") or "").lower()
-        name = (u.get("name") or "").lower()
-        if not name and not email:
-            return True
-        if "test" in email or "example.com" in email or "+ci" in email:
-            return True
-        if name.startswith("new") or "test" in name:
-            return True
-        return False
+    rows = await list_conversations(current_user_id, limit=limit, before=before_dt, cursor=page_cursor)
+    profiles = await get_profiles(db, [r["peerId"] for r in rows])
 
-    for user in users:
+    contacts = []
+    for row in rows:
+        peer_id = row["peerId"]
+        profile = profiles.get(peer_id, {"name": peer_id})
         # Ignora contatos de teste/seed para não poluir a UI (apenas para chamadas HTTP)
-        if exclude_seeds and is_seed_user(user):
+        if exclude_seeds and peer_id in profiles and _is_seed_profile(profile):
             continue
+        last_msg = row.get("lastMessage") or {}
+        last_at = row.get("lastMessageAt")
+        contacts.append(_contact_dict(
+            peer_id,
+            profile.get("name") or peer_id,
+            profile,
+            last_message=last_msg.get("text", ""),
+            last_message_time=int(last_at.timestamp() * 1000) if last_at else 0,
+            unread_count=row.get("unreadCount", 0)
+        ))
+
+    # Ainda há conversas mais antigas: o cliente pede a próxima página
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1], field_name="lastMessageAt")
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return ORJSONResponse(await _with_presence(contacts), headers=headers)
+
+    # Última página: inclui usuários e contatos externos sem conversa
+    known = await list_peer_ids(current_user_id)
+    known.add(current_user_id)
+
+    users = await db.users.find(
+        {"_id": {"$nin": _object_ids(known)}}, {"password": 0}
+    ).to_list(CONTACTS_DIRECTORY_LIMIT)
+    for user in users:
         user_id = str(user["_id"])
-
-        user_id = str(user["_id"])
-        
-        # Busca última mensagem (com ou sem contactId)
-        last_msg = await db.messages.find_one(
-            {"$or": [{"contactId": user_id}, {"userId": user_id}]},
-            sort=[("createdAt", -1)]
-        )
-        
-        contact = Contact(
-            id=user_id,
-            name=user.get("name", user["email"]),
-            email=user.get("email"),
-            avatar=user.get("avatar"),
-            lastMessage=last_msg.get("text", "") if last_msg else "",
-            lastMessageTime=int(last_msg["createdAt"].timestamp() * 1000) if last_msg else 0,
-            unreadCount=0,
-            online=False
-        )
-        contacts.append(contact)
+        if user_id in known or (exclude_seeds and _is_seed_profile(user)):
+            continue
+        contacts.append(_contact_dict(user_id, user.get("name", user["email"]), user))
 
     # Inclui contatos externos criados pelo usuário
     try:
         external_contacts = await db.contacts.find({"createdBy": current_user_id}).to_list(None)
         for ec in external_contacts:
+            ec_id = str(ec.get("_id"))
             # Aplica mesma heurística para evitar contatos de teste externos (apenas para chamadas HTTP)
-            ec_name = (ec.get("name") or "").lower()
-            ec_email = (ec.get("email") or "").lower()
-            if exclude_seeds and ("test" in ec_email or "example.com" in ec_email or ec_name.startswith("new") or "test" in ec_name):
+            if ec_id in known or (exclude_seeds and _is_seed_profile(ec)):
                 continue
-
-            ec_id = str(ec.get("_id"))
-            last_msg = await db.messages.find_one({"contactId": ec_id}, sort=[("createdAt", -1)])
-            contact = Contact(
-                id=ec_id,
-                name=ec.get("name", ec.get("phone") or ec.get("email") or "Contato"),
-                email=ec.get("email"),
-                avatar=ec.get("avatar"),
-                lastMessage=last_msg.get("text", "") if last_msg else "",
-                lastMessageTime=int(last_msg["createdAt"].timestamp() * 1000) if last_msg else 0,
-                unreadCount=0,
-                online=False
-            )
-            contacts.append(contact)
+            contacts.append(_contact_dict(ec_id, ec.get("name", ec.get("phone") or ec.get("email") or "Contato"), ec))
     except Exception:
         # Se a coleção não existir ainda, ignora
         pass
-    
-    # Ordena por última mensagem
-    contacts.sort(key=lambda c: c.lastMessageTime or 0, reverse=True)
-    
-    return contacts
+
+    return ORJSONResponse(await _with_presence(contacts))
 
 
 class ConversationResponse(BaseModel):
     messages: List[ConversationMessage]
     hasMore: bool
+    nextCursor: Optional[str] = None
+    prevCursor: Optional[str] = None
 
 @router.get("/{contact_id}/messages", response_model=ConversationResponse)
 async def get_conversation(
@@ -170,7 +224,9 @@ async def get_conversation(
     limit: int = 50,
     before: Optional[int] = None,
     current_user_id: str = Depends(get_current_user_id),
-    request: Request = None
+    request: Request = None,
+    cursor: Optional[str] = None,
+    direction: str = DIRECTION_BEFORE
 ):
     # Se chamada via HTTP, 'request' estará presente e devemos exigir header Authorization
     if request is not None:
@@ -180,106 +236,23 @@ async def get_conversation(
     Retorna mensagens de uma conversa específica com um contato
     """
     try:
-        # Primeiro tenta buscar em usuários com ObjectId; se não for um ObjectId válido, tenta string
-        contact = None
-        try:
-            contact = await db.users.find_one({"_id": ObjectId(contact_id)})
-        except (InvalidId, Exception):
-            # tenta buscando por string id (em testes a collection fake pode usar strings)
-            try:
-                contact = await db.users.find_one({"_id": contact_id})
-            except Exception:
-                contact = None
-
-        contact_name = None
-        # Se não houver usuário com esse id, tenta na coleção de contatos externos (se existir)
-        if not contact:
-            contact_name = None
-            contacts_coll = getattr(db, "contacts", None)
-            if contacts_coll is not None:
-                try:
-                    try:
-                        contact_doc = await contacts_coll.find_one({"_id": ObjectId(contact_id)})
-                    except InvalidId:
-                        contact_doc = await contacts_coll.find_one({"_id": contact_id})
-                    if contact_doc:
-                        contact_name = contact_doc.get("name", contact_doc.get("email") or contact_doc.get("phone"))
-                except Exception:
-                    contact_name = None
-
-            # Se não encontrou em nenhum lugar, usa o próprio contact_id como fallback (compatibilidade)
-            if not contact_name:
-                contact_name = contact_id
-        else:
-            contact_name = contact.get("name", contact.get("email"))
-        
-        # Filtro: conversa entre usuário autenticado e contato
-        query = {
-            "$or": [
-                {"userId": current_user_id, "contactId": contact_id},
-                {"userId": contact_id, "contactId": current_user_id},
-                # Compatibilidade legado: usa author pelo nome do contato, mas limita ao usuário atual
-                {"author": contact_name, "userId": current_user_id}
-            ]
-        }
+        # Filtro: conversa entre usuário autenticado e contato (range scan pela chave canônica)
+        query = {"conversationKey": conversation_key(current_user_id, contact_id)}
         
-        # Paginação
-        if before:
-            # 'before' é timestamp em ms
-            query["createdAt"] = {"$lt": datetime.fromtimestamp(before / 1000.0)}
-            # Alguns registros usam campo 'timestamp' em ms em vez de createdAt
-            query["timestamp"] = {"$lt": before}
+        # Paginação: cursor keyset; 'before' (ms) mantido para clientes antigos
+        if before and not cursor:
+            # Alguns registros antigos usam campo 'timestamp' em ms em vez de createdAt
+            legacy = before_millis_filter(before)
+            query = combine_filters(query, {"$or": [legacy, {"timestamp": {"$lt": before}}]})
         
-        # Busca mensagens
-        cursor = db.messages.find(query).sort("createdAt", -1).limit(limit)
-        messages = await cursor.to_list(None)
-        messages.reverse()  # Ordem cronológica
-        
-        # Converte para response model
-        result = []
-        for msg in messages:
-            from storage import presign_get
-            
-            # Algumas mensagens antigas podem ter 'timestamp' em vez de 'createdAt'
-            ts = None
-            if "createdAt" in msg and hasattr(msg["createdAt"], "timestamp"):
-                ts = int(msg["createdAt"].timestamp() * 1000)
-            else:
-                ts = int(msg.get("timestamp", 0))
-
-            message_dict = {
-                "id": str(msg["_id"]),
-                "author": msg.get("author", ""),
-                "text": msg.get("text", ""),
-                "timestamp": ts,
-                "type": msg.get("type", "text"),
-                "status": msg.get("status", "sent"),
-                "userId": msg.get("userId"),  # 🆕 ID do remetente
-                "contactId": msg.get("contactId")  # 🆕 ID do destinatário
-            }
-            
-            # Adiciona attachment se existir
-            if "attachment" in msg:
-                message_dict["attachment"] = msg["attachment"]
-                # Pode ser uma referência por 'key' (para presign) ou já ter 'url'
-                if isinstance(msg["attachment"], dict):
-                    if "key" in msg["attachment"]:
-                        try:
-                            message_dict["url"] = presign_get(msg["attachment"]["key"])
-                        except Exception:
-                            message_dict["url"] = msg["attachment"].get("url")
-                    else:
-                        message_dict["url"] = msg["attachment"].get("url")
-                else:
-                    # Caso inesperado, ignora a url
-                    message_dict["url"] = None
-            
-            result.append(ConversationMessage(**message_dict))
-        
-        return ConversationResponse(
-            messages=result,
-            hasMore=len(messages) == limit
-        )
+        page = await fetch_page(db.messages, query, limit, cursor=cursor, direction=direction,
+                                projection=MESSAGE_PROJECTION)
+
+        # Dicts montados direto do documento (sem modelo pydantic por mensagem)
+        return ORJSONResponse({
+            "messages": [message_to_dict(msg) for msg in page.docs],
+            **page.meta()
+        })
         
     except HTTPException:
         raise
@@ -288,6 +261,31 @@ async def get_conversation(
         raise HTTPException(500, f"Erro ao buscar conversa: {str(e)}")
 
 
+@router.get("/{contact_id}/messages/export")
+async def export_conversation(
+    contact_id: str,
+    fmt: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user_id: str = Depends(get_current_user_id),
+    request: Request = None
+):
+    """
+    Exporta a conversa inteira com um contato em NDJSON ou CSV (streaming, ordem cronológica)
+    """
+    # Se chamada via HTTP, exige header Authorization
+    if request is not None:
+        if not request.headers.get("Authorization") and not request.headers.get("authorization"):
+            raise HTTPException(status_code=401, detail="Token ausente")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido")
+
+    query = {"conversationKey": conversation_key(current_user_id, contact_id)}
+    return export_response(
+        iter_export(db.messages, query, fmt, sort=[("createdAt", 1), ("_id", 1)]),
+        fmt,
+        f"conversa-{contact_id}"
+    )
+
+
 @router.post("/{contact_id}/mark-read")
 @router.put("/{contact_id}/read")
 async def mark_conversation_read_put(contact_id: str, current_user_id: str = Depends(get_current_user_id), request: Request = None):
@@ -308,31 +306,16 @@ async def unread_counts(current_user_id: str = Depends(get_current_user_id), req
         if not request.headers.get("Authorization") and not request.headers.get("authorization"):
             raise HTTPException(status_code=401, detail="Token ausente")
     try:
-        # Filtra mensagens dirigidas ao usuário que não estão marcadas como 'read'
-        filter_query = {"contactId": current_user_id, "status": {"$ne": "read"}}
-
-        # Conta total de mensagens não-lidas
-        unread_messages = await db.messages.count_documents(filter_query)
-
-        # Conta conversas únicas (distinct userId) que têm mensagens não-lidas
-        try:
-            distinct_senders = await db.messages.distinct("userId", filter_query)
-            # Remove null/None e o id do próprio usuário se presente
-            distinct_senders = [s for s in distinct_senders if s]
-            unread_conversations = len(distinct_senders)
-        except Exception:
-            # Fallback: tenta agregar manualmente (mais custoso)
-            cursor = db.messages.find(filter_query, {"userId": 1})
-            rows = await cursor.to_list(None)
-            senders = set(r.get("userId") for r in rows if r.get("userId"))
-            unread_conversations = len(senders)
-
-        return {"unreadConversations": unread_conversations, "unreadMessages": unread_messages}
+        # Totais mantidos incrementalmente (sem varrer mensagens)
+        return await get_unread_totals(current_user_id)
     except HTTPException:
         raise
     except Exception as e:
         print(f"❌ Erro ao calcular unread counts: {e}")
-        raise HTTPException(500, f"Erro ao calcular unread counts: {str(e)}")async def mark_conversation_read(contact_id: str, current_user_id: str = Depends(get_current_user_id), request: Request = None):
+        raise HTTPException(500, f"Erro ao calcular unread counts: {str(e)}")
+
+
+async def mark_conversation_read(contact_id: str, current_user_id: str = Depends(get_current_user_id), request: Request = None):
     """
     Marca todas as mensagens de um contato como lidas
     """
@@ -341,32 +324,12 @@ async def unread_counts(current_user_id: str = Depends(get_current_user_id), req
         if not request.headers.get("Authorization") and not request.headers.get("authorization"):
             raise HTTPException(status_code=401, detail="Token ausente")
     try:
-        # Tenta buscar em users (ObjectId ou string)
-        contact = None
-        contact_name = None
+        # Nome do contato (usuário ou contato externo) pelo cache de perfis
         try:
-            contact = await db.users.find_one({"_id": ObjectId(contact_id)})
-            contact_name = contact.get("name", contact.get("email")) if contact else None
-        except (InvalidId, Exception):
-            try:
-                contact = await db.users.find_one({"_id": contact_id})
-                contact_name = contact.get("name", contact.get("email")) if contact else None
-            except Exception:
-                contact = None
-                contact_name = None
-
-        if not contact_name:
-            contacts_coll = getattr(db, "contacts", None)
-            if contacts_coll is not None:
-                try:
-                    try:
-                        contact_doc = await contacts_coll.find_one({"_id": ObjectId(contact_id)})
-                    except InvalidId:
-                        contact_doc = await contacts_coll.find_one({"_id": contact_id})
-                    if contact_doc:
-                        contact_name = contact_doc.get("name", contact_doc.get("email") or contact_doc.get("phone"))
-                except Exception:
-                    contact_name = None
+            profile = await get_profile(db, contact_id)
+        except Exception:
+            profile = None
+        contact_name = profile["name"] if profile else None
 
         # Se não houve contato encontrado, usa contato como string (compatibilidade)
         if not contact_name:
@@ -384,18 +347,11 @@ async def unread_counts(current_user_id: str = Depends(get_current_user_id), req
             },
             {"$set": {"status": "read"}}
         )
+        await reset_unread(current_user_id, contact_id)
         
         # Emite atualização de unread counts via Socket.IO para o usuário que marcou como lido
-        try:
-            from socket_handlers import emit_unread_counts_for_user
-            await emit_unread_counts_for_user(current_user_id)
-            # opcional: também notifica o outro participante
-            try:
-                await emit_unread_counts_for_user(contact_id)
-            except Exception:
-                pass
-        except Exception:
-            pass
+        from socket_handlers import schedule_unread_counts_push
+        schedule_unread_counts_push(current_user_id)
 
         return {"updated": result.modified_count}
         
@@ -0,0 +1,442 @@
+"""Conversas: chave canônica e read model da lista de conversas.
+
+Toda mensagem 1:1 recebe um campo `conversationKey` que identifica o par de
+participantes independente da direção (A→B e B→A geram a mesma chave). Com o
+índice `(conversationKey, createdAt, _id)` o histórico de uma conversa vira um
+único range scan, em vez de um `$or` em userId/contactId.
+
+A collection `conversations` é um read model atualizado a cada mensagem
+inserida: um documento por (dono, contato) com preview da última mensagem,
+horário e contador de não-lidas do dono. A lista de contatos vira uma única
+query indexada por `(ownerId, lastMessageAt)`.
+
+Os totais de não-lidas de cada usuário ficam em `unread_counters` e são
+ajustados pelas mesmas escritas: cada atualização do `unreadCount` de uma
+conversa devolve o valor anterior, e a diferença vai para o total com `$inc`.
+Assim o badge de não-lidas é uma leitura por `_id`, sem varrer mensagens.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from database import db, messages_collection, conversations_collection, unread_counters_collection
+from pagination import DIRECTION_BEFORE, keyset_filter
+from search import index_messages
+
+# Separador entre os dois participantes na chave
+KEY_SEPARATOR = "|"
+
+# Nome do documento de progresso do backfill (collection `migrations`)
+BACKFILL_MIGRATION_ID = "messages_conversation_key"
+
+# Documento de controle da construção inicial do read model
+READ_MODEL_MIGRATION_ID = "conversations_read_model"
+
+# Tamanho máximo do preview da última mensagem na lista de conversas
+PREVIEW_MAX_CHARS = 200
+
+
+def conversation_key(user_id: Optional[str], contact_id: Optional[str]) -> Optional[str]:
+    """
+    Retorna a chave normalizada da conversa entre dois participantes.
+
+    A chave é o par de ids ordenado, então a direção da mensagem não importa.
+    Mensagens sem par definido (broadcast do bot, respostas do Guru sem contato)
+    não pertencem a uma conversa e retornam None.
+
+    Args:
+        user_id: ID do remetente
+        contact_id: ID do destinatário
+
+    Returns:
+        Chave da conversa ou None
+    """
+    if not user_id or not contact_id:
+        return None
+    first, second = sorted((str(user_id), str(contact_id)))
+    return f"{first}{KEY_SEPARATOR}{second}"
+
+
+def stamp_conversation_key(doc: dict) -> dict:
+    """Adiciona `conversationKey` ao documento de mensagem (in-place) e o retorna."""
+    doc["conversationKey"] = conversation_key(doc.get("userId"), doc.get("contactId"))
+    return doc
+
+
+async def backfill_conversation_keys(batch_size: int = 1000) -> int:
+    """
+    Migra mensagens antigas preenchendo `conversationKey`.
+
+    Percorre a collection em ordem de `_id` e grava o último `_id` processado em
+    `migrations`, então uma execução interrompida continua de onde parou. Cada
+    lote é gravado com um único `bulk_write`.
+
+    Args:
+        batch_size: Quantidade de documentos por lote
+
+    Returns:
+        Número de documentos atualizados nesta execução
+    """
+    migrations = db.migrations
+    state = await migrations.find_one({"_id": BACKFILL_MIGRATION_ID}) or {}
+    last_id = state.get("lastId")
+    updated = 0
+    while True:
+        query = {"conversationKey": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        cursor = messages_collection.find(query, {"userId": 1, "contactId": 1}).sort("_id", 1).limit(batch_size)
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            break
+
+        ops = [
+            UpdateOne(
+                {"_id": d["_id"]},
+                {"$set": {"conversationKey": conversation_key(d.get("userId"), d.get("contactId"))}}
+            )
+            for d in docs
+        ]
+        result = await messages_collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        last_id = docs[-1]["_id"]
+        await migrations.update_one(
+            {"_id": BACKFILL_MIGRATION_ID},
+            {"$set": {"lastId": last_id}},
+            upsert=True
+        )
+
+    if updated:
+        print(f"✅ Backfill conversationKey: {updated} mensagens migradas")
+    return updated
+
+
+# ============================================================================
+# READ MODEL: lista de conversas por usuário
+# ============================================================================
+
+def _last_message_preview(doc: dict) -> dict:
+    text = doc.get("text") or ""
+    return {
+        "id": str(doc.get("_id")) if doc.get("_id") is not None else None,
+        "author": doc.get("author"),
+        "text": text[:PREVIEW_MAX_CHARS],
+        "type": doc.get("type", "text"),
+        "userId": doc.get("userId"),
+    }
+
+
+async def record_message(doc: dict) -> None:
+    """
+    Atualiza o read model de conversas após inserir uma mensagem.
+
+    Os dois lados da conversa recebem o preview e o horário da última mensagem.
+    Se a mensagem ainda não foi lida, o `unreadCount` do destinatário é
+    incrementado e os totais dele em `unread_counters` acompanham (a conversa
+    só conta como nova não-lida quando o contador estava em zero). Mensagens
+    sem conversa (broadcast) são ignoradas.
+
+    Args:
+        doc: Documento de mensagem já persistido (com `_id` e `conversationKey`)
+    """
+    key = doc.get("conversationKey")
+    sender_id = doc.get("userId")
+    recipient_id = doc.get("contactId")
+    if not key or not sender_id or not recipient_id:
+        return
+
+    # Resumos incrementais das conversas acompanhadas pelos agentes
+    from bots.summaries import note_message
+    note_message(doc)
+    # Busca textual por usuário (search.py)
+    await index_messages([doc])
+
+    created_at = doc.get("createdAt") or datetime.utcnow()
+    preview = _last_message_preview(doc)
+    last_fields = {"conversationKey": key, "lastMessage": preview, "lastMessageAt": created_at}
+
+    sender_op = UpdateOne(
+        {"ownerId": sender_id, "peerId": recipient_id},
+        {"$set": last_fields, "$setOnInsert": {"unreadCount": 0}},
+        upsert=True
+    )
+    if doc.get("status") == "read":
+        await conversations_collection.bulk_write([
+            sender_op,
+            UpdateOne(
+                {"ownerId": recipient_id, "peerId": sender_id},
+                {"$set": last_fields, "$setOnInsert": {"unreadCount": 0}},
+                upsert=True
+            ),
+        ], ordered=False)
+        return
+
+    # Valor anterior do contador diz se a conversa passou de lida para não-lida
+    _, previous = await asyncio.gather(
+        conversations_collection.bulk_write([sender_op], ordered=False),
+        conversations_collection.find_one_and_update(
+            {"ownerId": recipient_id, "peerId": sender_id},
+            {"$set": last_fields, "$inc": {"unreadCount": 1}},
+            projection={"unreadCount": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    )
+    was_unread = bool((previous or {}).get("unreadCount"))
+    await _inc_unread_totals(recipient_id, 1, 0 if was_unread else 1)
+
+
+async def record_messages(docs: list[dict]) -> None:
+    """
+    Atualiza o read model para um lote de mensagens (importação em massa).
+
+    Agrupa por lado da conversa e grava tudo em um único `bulk_write`: um
+    upsert com o `$inc` das não-lidas e um `$set` da última mensagem que só
+    vale se ela for mais nova que a registrada. Os totais dos destinatários
+    afetados são descartados e recalculados na próxima leitura.
+
+    Args:
+        docs: Documentos de mensagem já persistidos
+    """
+    sides: dict[tuple[str, str], dict] = {}
+    for doc in docs:
+        key = doc.get("conversationKey")
+        sender_id = doc.get("userId")
+        recipient_id = doc.get("contactId")
+        if not key or not sender_id or not recipient_id:
+            continue
+        for owner, peer in ((sender_id, recipient_id), (recipient_id, sender_id)):
+            side = sides.setdefault((owner, peer), {"key": key, "last": doc, "unread": 0})
+            if (doc["createdAt"], str(doc["_id"])) > (side["last"]["createdAt"], str(side["last"]["_id"])):
+                side["last"] = doc
+        if doc.get("status") != "read":
+            sides[(recipient_id, sender_id)]["unread"] += 1
+
+    await index_messages(docs)
+    if not sides:
+        return
+
+    ops = []
+    for (owner, peer), side in sides.items():
+        last = side["last"]
+        ops.append(UpdateOne(
+            {"ownerId": owner, "peerId": peer},
+            {"$inc": {"unreadCount": side["unread"]}, "$setOnInsert": {"conversationKey": side["key"]}},
+            upsert=True
+        ))
+        ops.append(UpdateOne(
+            {
+                "ownerId": owner,
+                "peerId": peer,
+                "$or": [{"lastMessageAt": {"$lt": last["createdAt"]}}, {"lastMessageAt": None}],
+            },
+            {"$set": {"lastMessage": _last_message_preview(last), "lastMessageAt": last["createdAt"]}}
+        ))
+    # Ordenado: o upsert de cada conversa precisa vir antes do $set condicional
+    await conversations_collection.bulk_write(ops, ordered=True)
+
+    owners = sorted({owner for (owner, _), side in sides.items() if side["unread"]})
+    if owners:
+        await unread_counters_collection.delete_many({"_id": {"$in": owners}})
+
+
+async def _inc_unread_totals(user_id: str, messages: int, conversations: int) -> None:
+    # Sem upsert: se o documento não existe ele é recalculado na próxima leitura
+    if not messages and not conversations:
+        return
+    await unread_counters_collection.update_one(
+        {"_id": user_id},
+        {"$inc": {"unreadMessages": messages, "unreadConversations": conversations}}
+    )
+
+
+async def decrement_unread(owner_id: str, peer_id: str, amount: Optional[int] = None) -> None:
+    """
+    Desconta mensagens lidas do contador da conversa e dos totais do dono.
+
+    Args:
+        owner_id: ID do usuário que leu
+        peer_id: ID do contato da conversa
+        amount: Quantidade de mensagens lidas (None zera a conversa)
+    """
+    if amount is None:
+        update = {"$set": {"unreadCount": 0}}
+    else:
+        # Pipeline de update: nunca deixa o contador negativo
+        update = [{"$set": {"unreadCount": {
+            "$max": [0, {"$subtract": [{"$ifNull": ["$unreadCount", 0]}, amount]}]
+        }}}]
+    previous = await conversations_collection.find_one_and_update(
+        {"ownerId": owner_id, "peerId": peer_id},
+        update,
+        projection={"unreadCount": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    before = (previous or {}).get("unreadCount") or 0
+    after = 0 if amount is None else max(0, before - amount)
+    if before > after:
+        await _inc_unread_totals(owner_id, after - before, -1 if after == 0 else 0)
+
+
+async def reset_unread(owner_id: str, peer_id: str) -> None:
+    """Zera o contador de não-lidas da conversa do dono com o contato."""
+    await decrement_unread(owner_id, peer_id)
+
+
+async def rebuild_unread_totals(user_id: str) -> dict:
+    """Recalcula os totais de não-lidas do usuário a partir do read model de conversas."""
+    cursor = conversations_collection.find(
+        {"ownerId": user_id, "unreadCount": {"$gt": 0}},
+        {"unreadCount": 1}
+    )
+    rows = await cursor.to_list(None)
+    totals = {
+        "unreadMessages": sum(r.get("unreadCount", 0) for r in rows),
+        "unreadConversations": len(rows),
+    }
+    await unread_counters_collection.update_one(
+        {"_id": user_id},
+        {"$setOnInsert": totals},
+        upsert=True
+    )
+    return totals
+
+
+async def get_unread_totals(user_id: str) -> dict:
+    """
+    Retorna `{unreadConversations, unreadMessages}` do usuário.
+
+    Leitura por `_id` em `unread_counters`; na primeira chamada (ou após a
+    reconstrução do read model) os totais são calculados a partir das conversas.
+    """
+    doc = await unread_counters_collection.find_one({"_id": user_id})
+    if doc is None:
+        doc = await rebuild_unread_totals(user_id)
+    return {
+        "unreadConversations": max(0, doc.get("unreadConversations", 0)),
+        "unreadMessages": max(0, doc.get("unreadMessages", 0)),
+    }
+
+
+async def list_conversations(
+    owner_id: str,
+    limit: int = 50,
+    before: Optional[datetime] = None,
+    cursor: Optional[tuple[datetime, Any]] = None
+) -> list[dict]:
+    """
+    Retorna uma página da lista de conversas do usuário, mais recentes primeiro.
+
+    Args:
+        owner_id: ID do usuário dono da lista
+        limit: Tamanho da página
+        before: Legado: apenas conversas com atividade anterior a este horário
+        cursor: `(lastMessageAt, _id)` do último item da página anterior
+            (keyset: conversas com o mesmo horário não são puladas)
+
+    Returns:
+        Documentos do read model (ownerId, peerId, lastMessage, lastMessageAt, unreadCount)
+    """
+    query = {"ownerId": owner_id}
+    if cursor is not None:
+        query.update(keyset_filter(cursor[0], cursor[1], DIRECTION_BEFORE, field_name="lastMessageAt"))
+    elif before is not None:
+        query["lastMessageAt"] = {"$lt": before}
+    rows = conversations_collection.find(query).sort([("lastMessageAt", -1), ("_id", -1)]).limit(limit)
+    return await rows.to_list(length=limit)
+
+
+async def list_peer_ids(owner_id: str) -> set[str]:
+    """Retorna os ids de todos os contatos com quem o usuário já conversou."""
+    peers = await conversations_collection.distinct("peerId", {"ownerId": owner_id})
+    return {p for p in peers if p}
+
+
+async def list_watcher_ids(peer_id: str) -> list[str]:
+    """Retorna os ids dos usuários que têm `peer_id` na lista de conversas."""
+    owners = await conversations_collection.distinct("ownerId", {"peerId": peer_id})
+    return [o for o in owners if o and o != peer_id]
+
+
+async def build_conversations_read_model(batch_size: int = 500) -> int:
+    """
+    Constrói o read model a partir das mensagens existentes (execução única).
+
+    Usa duas agregações sobre o índice de conversationKey: a última mensagem de
+    cada conversa e as não-lidas por destinatário. Só insere documentos que
+    ainda não existem (`$setOnInsert`), então nunca sobrescreve o que as
+    escritas ao vivo já registraram.
+
+    Returns:
+        Número de documentos de conversa criados
+    """
+    migrations = db.migrations
+    state = await migrations.find_one({"_id": READ_MODEL_MIGRATION_ID}) or {}
+    if state.get("done"):
+        return 0
+
+    unread: dict[tuple[str, str], int] = {}
+    unread_pipeline = [
+        {"$match": {"conversationKey": {"$ne": None}, "status": {"$ne": "read"}}},
+        {"$group": {"_id": {"key": "$conversationKey", "to": "$contactId"}, "count": {"$sum": 1}}},
+    ]
+    async for row in messages_collection.aggregate(unread_pipeline, allowDiskUse=True):
+        unread[(row["_id"]["key"], row["_id"]["to"])] = row["count"]
+
+    last_pipeline = [
+        {"$match": {"conversationKey": {"$ne": None}}},
+        {"$sort": {"conversationKey": -1, "createdAt": -1, "_id": -1}},
+        {"$group": {"_id": "$conversationKey", "last": {"$first": "$$ROOT"}}},
+    ]
+    created = 0
+    ops = []
+    async for row in messages_collection.aggregate(last_pipeline, allowDiskUse=True):
+        last = row["last"]
+        key = row["_id"]
+        preview = _last_message_preview(last)
+        for owner, peer in ((last.get("userId"), last.get("contactId")), (last.get("contactId"), last.get("userId"))):
+            if not owner or not peer:
+                continue
+            ops.append(UpdateOne(
+                {"ownerId": owner, "peerId": peer},
+                {"$setOnInsert": {
+                    "conversationKey": key,
+                    "lastMessage": preview,
+                    "lastMessageAt": last.get("createdAt"),
+                    "unreadCount": unread.get((key, owner), 0),
+                }},
+                upsert=True
+            ))
+        if len(ops) >= batch_size:
+            result = await conversations_collection.bulk_write(ops, ordered=False)
+            created += result.upserted_count
+            ops = []
+    if ops:
+        result = await conversations_collection.bulk_write(ops, ordered=False)
+        created += result.upserted_count
+
+    # Totais antigos são descartados e recalculados sob demanda a partir do read model
+    await unread_counters_collection.delete_many({})
+
+    await migrations.update_one(
+        {"_id": READ_MODEL_MIGRATION_ID},
+        {"$set": {"done": True, "finishedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    if created:
+        print(f"✅ Read model de conversas: {created} conversas criadas")
+    return created
+
+
+async def run_conversation_migrations() -> None:
+    """Executa em sequência o backfill de conversationKey, o read model e o índice de busca."""
+    from search import backfill_search_index
+    try:
+        await backfill_conversation_keys()
+        await build_conversations_read_model()
+        await backfill_search_index()
+    except Exception as e:
+        print(f"⚠️ Falha na migração de conversas (será retomada no próximo start): {e}")
@@ -1,11 +1,14 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from os import getenv
 
+from metrics import MongoCommandListener
+
 DATABASE_URL = getenv("DATABASE_URL", "mongodb://mongo:27017/chatdb?replicaSet=rs0")
 
-# Cliente MongoDB assíncrono
-client = AsyncIOMotorClient(DATABASE_URL)
-db = client.chatdb
+# Cliente MongoDB assíncrono (latência dos comandos vai para /metrics)
+client = AsyncIOMotorClient(DATABASE_URL, event_listeners=[MongoCommandListener()])
+# Banco do caminho da URL (ex.: .../chatdb_loadtest); sem caminho, chatdb
+db = client.get_default_database("chatdb")
 messages_collection = db.messages
 
 # 🤖 Collection separada para mensagens dos agentes
@@ -23,9 +26,74 @@ calendar_events_collection = db.calendar_events
 # 🤖 Collection para bots customizados por usuário
 custom_bots_collection = db.custom_bots
 
+# 💬 Read model da lista de conversas (um documento por dono/contato)
+conversations_collection = db.conversations
+
+# 🔔 Totais de não-lidas por usuário (_id = userId), mantidos com $inc
+unread_counters_collection = db.unread_counters
+
+# 🔎 Entradas de busca textual, uma por participante de cada mensagem (ver search.py)
+message_search_collection = db.message_search
+
+# 📝 Resumo incremental por conversa (dono/contato), ver bots/summaries.py
+conversation_summaries_collection = db.conversation_summaries
+
 # Criar índices para otimizar consultas
 async def create_indexes():
     """Cria índices nas collections para melhor performance"""
+    # Histórico de conversa: range scan por conversationKey ordenado por createdAt/_id
+    await messages_collection.create_index(
+        [("conversationKey", 1), ("createdAt", 1), ("_id", 1)],
+        name="conversation_created"
+    )
+    # Histórico geral do usuário (GET /messages sem contato): $or em userId/contactId
+    await messages_collection.create_index([("userId", 1), ("createdAt", -1)])
+    await messages_collection.create_index([("contactId", 1), ("createdAt", -1)])
+    # Busca textual (GET /messages/search): índice de texto composto por dono, para
+    # a consulta percorrer só as entradas do usuário (stemming em português)
+    await message_search_collection.create_index(
+        [("ownerId", 1), ("text", "text")],
+        default_language="portuguese",
+        name="search_owner_text"
+    )
+    await message_search_collection.create_index(
+        [("ownerId", 1), ("messageId", 1)],
+        unique=True,
+        name="search_owner_message"
+    )
+    # O índice de texto global antigo só custava escrita
+    try:
+        await messages_collection.drop_index("messages_text")
+    except Exception:
+        pass
+
+    # Histórico com agentes: por usuário/agente/contato ordenado por data
+    await agent_messages_collection.create_index(
+        [("userId", 1), ("agentKey", 1), ("contactId", 1), ("createdAt", -1)],
+        name="agent_thread_created"
+    )
+
+    # Lista de conversas: uma por dono/contato, ordenada por última atividade
+    await conversations_collection.create_index(
+        [("ownerId", 1), ("peerId", 1)],
+        unique=True,
+        name="owner_peer_unique"
+    )
+    # Página keyset (lastMessageAt, _id): empates no horário não saltam conversas
+    await conversations_collection.create_index(
+        [("ownerId", 1), ("lastMessageAt", -1), ("_id", -1)],
+        name="owner_last_message"
+    )
+    # Quem tem o usuário como contato (destinatários das notificações de presença)
+    await conversations_collection.create_index([("peerId", 1), ("ownerId", 1)], name="peer_owner")
+
+    # Um resumo por dono/contato
+    await conversation_summaries_collection.create_index(
+        [("userId", 1), ("contactId", 1)],
+        unique=True,
+        name="summary_owner_contact"
+    )
+
     # Índice para buscar interações por usuário e timestamp
     await interactions_collection.create_index([("user_id", 1), ("timestamp", -1)])
     await interactions_collection.create_index([("agent", 1)])
@@ -0,0 +1,131 @@
+"""Exportação de histórico de mensagens em streaming (NDJSON ou CSV).
+
+O cursor do Motor é consumido em lotes de tamanho fixo e cada lote é
+serializado e enviado antes de buscar o próximo, então a memória usada não
+depende do tamanho do histórico. URLs assinadas de anexos são geradas por lote,
+no momento em que o lote é escrito.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+from storage import presign_get
+
+# Documentos por lote lido do Mongo / escrito na resposta
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Campos lidos do Mongo (evita trazer campos que não vão para o arquivo)
+EXPORT_PROJECTION = {
+    "author": 1,
+    "text": 1,
+    "createdAt": 1,
+    "status": 1,
+    "type": 1,
+    "userId": 1,
+    "contactId": 1,
+    "attachment": 1,
+}
+
+CSV_COLUMNS = [
+    "id", "timestamp", "createdAt", "author", "userId", "contactId",
+    "type", "status", "text", "attachmentName", "attachmentUrl",
+]
+
+
+def _export_row(doc: dict) -> dict:
+    created_at = doc.get("createdAt")
+    row = {
+        "id": str(doc["_id"]),
+        "timestamp": int(created_at.timestamp() * 1000) if created_at else None,
+        "createdAt": created_at.isoformat() if created_at else None,
+        "author": doc.get("author", ""),
+        "userId": doc.get("userId"),
+        "contactId": doc.get("contactId"),
+        "type": doc.get("type", "text"),
+        "status": doc.get("status", "sent"),
+        "text": doc.get("text", ""),
+    }
+    attachment = doc.get("attachment")
+    if isinstance(attachment, dict):
+        row["attachment"] = attachment
+        if "key" in attachment:
+            try:
+                row["url"] = presign_get(attachment["key"])
+            except Exception:
+                row["url"] = attachment.get("url")
+        else:
+            row["url"] = attachment.get("url")
+    return row
+
+
+def _render_batch(docs: list[dict], fmt: str) -> bytes:
+    rows = [_export_row(d) for d in docs]
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            attachment = row.get("attachment") or {}
+            writer.writerow([
+                row["id"], row["timestamp"], row["createdAt"], row["author"],
+                row["userId"] or "", row["contactId"] or "", row["type"],
+                row["status"], row["text"], attachment.get("filename", ""), row.get("url", ""),
+            ])
+        return buffer.getvalue().encode("utf-8")
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+async def iter_export(
+    collection,
+    query: dict,
+    fmt: str = "ndjson",
+    sort: Optional[list] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Gera o arquivo de exportação em blocos, um por lote do cursor.
+
+    Args:
+        collection: Collection Motor de mensagens
+        query: Filtro das mensagens exportadas
+        fmt: "ndjson" ou "csv"
+        sort: Ordenação (padrão: createdAt crescente)
+        batch_size: Documentos por lote
+
+    Yields:
+        Bytes de cada lote serializado
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_COLUMNS)
+        yield buffer.getvalue().encode("utf-8")
+
+    cursor = collection.find(query, EXPORT_PROJECTION).sort(sort or [("createdAt", 1)]).batch_size(batch_size)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield _render_batch(batch, fmt)
+            batch = []
+    if batch:
+        yield _render_batch(batch, fmt)
+
+
+def export_response(chunks: AsyncIterator[bytes], fmt: str, filename: str) -> StreamingResponse:
+    """Resposta HTTP em streaming com o arquivo de exportação como anexo."""
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
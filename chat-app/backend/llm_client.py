@@ -0,0 +1,146 @@
+"""Cliente HTTP compartilhado para as chamadas à OpenAI (chat e Whisper).
+
+Antes cada pergunta ao Guru/agentes, cada NLU e cada transcrição abria um
+`httpx.AsyncClient` próprio e pagava TCP + TLS de novo. Aqui um único
+cliente com keep-alive fica aberto durante a vida da aplicação (criado e
+fechado no lifespan do `main`). O pool do httpx já separa as conexões por
+origem, então bases diferentes (`OPENAI_BASE_URL`, servidor fake de carga)
+e chaves diferentes (bots customizados com a própria API key, enviada no
+header de cada chamada) compartilham o mesmo cliente sem misturar conexões.
+
+Timeouts continuam por chamada (`timeout=` no `post`).
+
+`stream_chat_completion` faz a mesma chamada de chat com `stream=true` e
+repassa cada trecho do texto para um callback assim que chega (SSE da
+OpenAI), medindo o tempo até o primeiro token.
+
+Variáveis:
+    LLM_HTTP_MAX_CONNECTIONS   conexões simultâneas no pool (padrão 100)
+    LLM_HTTP_MAX_KEEPALIVE     conexões ociosas mantidas abertas (padrão 20)
+    LLM_HTTP_KEEPALIVE_SECONDS tempo máximo de uma conexão ociosa (padrão 60)
+    LLM_HTTP2                  "true" para HTTP/2 (requer o pacote `h2`)
+"""
+
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from metrics import llm_ttft, observe_llm_call
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = LLM_HTTP2 and _http2_available()
+    if LLM_HTTP2 and not http2:
+        print("⚠️  LLM_HTTP2=true mas o pacote h2 não está instalado - usando HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def get_llm_client() -> httpx.AsyncClient:
+    """
+    Cliente compartilhado para chamadas à OpenAI.
+
+    Criado sob demanda se o lifespan ainda não o abriu (scripts, testes).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def start_llm_client() -> None:
+    """Abre o cliente compartilhado (lifespan)."""
+    get_llm_client()
+
+
+async def close_llm_client() -> None:
+    """Fecha o cliente e as conexões mantidas (lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def stream_chat_completion(
+    url: str,
+    headers: dict,
+    payload: dict,
+    on_delta: Callable[[str], Awaitable[None]],
+    timeout: float = 30.0,
+) -> str:
+    """
+    Chat completion em streaming.
+
+    Args:
+        url: Endpoint `/chat/completions`
+        headers: Headers da chamada (Authorization etc.)
+        payload: Corpo da requisição (sem `stream`)
+        on_delta: Chamado com cada trecho de texto recebido
+        timeout: Timeout da chamada
+
+    Returns:
+        Texto completo da resposta
+
+    Raises:
+        httpx.HTTPStatusError: Resposta diferente de 200
+    """
+    model = payload.get("model", "")
+    body = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    started = time.perf_counter()
+    status = "error"
+    usage = None
+    parts: list[str] = []
+    try:
+        client = get_llm_client()
+        async with client.stream("POST", url, headers=headers, json=body, timeout=timeout) as response:
+            status = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if not delta:
+                        continue
+                    if not parts:
+                        llm_ttft.observe(time.perf_counter() - started, "chat", model)
+                    parts.append(delta)
+                    await on_delta(delta)
+    except httpx.TimeoutException:
+        status = "timeout"
+        raise
+    finally:
+        observe_llm_call("chat", model, time.perf_counter() - started, status, usage)
+    return "".join(parts)
@@ -0,0 +1,84 @@
+"""Logging estruturado (chave=valor) com amostragem para os caminhos quentes.
+
+Os handlers de socket faziam `print()` de cada evento, às vezes com o payload
+inteiro. Eles passam a usar `log_event`, que escreve uma linha por evento no
+formato `level=info logger=chat.socket event=chat.send user=... size=...`.
+
+Variáveis:
+    LOG_LEVEL          nível dos loggers `chat.*` (padrão INFO)
+    LOG_SAMPLE_RATE    fração dos eventos amostrados que é escrita (padrão 0.01)
+    SOCKETIO_LOGGER    liga o logger interno do python-socketio (padrão false)
+    ENGINEIO_LOGGER    liga o logger interno do python-engineio (padrão false)
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+SOCKETIO_LOGGER = os.getenv("SOCKETIO_LOGGER", "false").lower() == "true"
+ENGINEIO_LOGGER = os.getenv("ENGINEIO_LOGGER", "false").lower() == "true"
+
+ROOT_LOGGER = "chat"
+
+
+def _format_value(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' "='):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Uma linha `chave=valor` por registro (campos extras em `record.fields`)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            f"level={record.levelname.lower()}",
+            f"logger={record.name}",
+            f"event={_format_value(record.getMessage())}",
+        ]
+        for key, value in getattr(record, "fields", {}).items():
+            parts.append(f"{key}={_format_value(value)}")
+        if record.exc_info:
+            parts.append(f"exc={_format_value(self.formatException(record.exc_info))}")
+        return " ".join(parts)
+
+
+def configure_logging() -> None:
+    """Configura o logger `chat` (idempotente)."""
+    root = logging.getLogger(ROOT_LOGGER)
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(KeyValueFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO,
+              sampled: bool = False, **fields) -> None:
+    """
+    Registra um evento com campos estruturados.
+
+    Args:
+        logger: Logger de `get_logger`
+        event: Nome curto do evento (ex.: "chat.send")
+        level: Nível do registro
+        sampled: Se True, só uma fração `LOG_SAMPLE_RATE` dos eventos é escrita
+        **fields: Campos extras (evite payloads inteiros)
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.log(level, event, extra={"fields": fields})
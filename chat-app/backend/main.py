@@ -1,4 +1,5 @@
 import os
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,6 +8,7 @@ from socket_manager import sio, create_socket_app
 from socket_handlers import register_socket_handlers
 from bots.automations import start_scheduler, load_and_schedule_all
 from middleware.security import add_security_headers
+from middleware.metrics import add_metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -14,6 +16,9 @@ async def lifespan(app: FastAPI):
     from database import create_indexes
     await create_indexes()
     print("✅ Índices do MongoDB criados")
+    # Migra mensagens antigas (conversationKey + read model de conversas) em background
+    from conversations import run_conversation_migrations
+    migrations_task = asyncio.create_task(run_conversation_migrations())
     # Carrega bots customizados salvos
     from bots.agents import load_custom_agents_from_db
     await load_custom_agents_from_db()
@@ -23,7 +28,25 @@ async def lifespan(app: FastAPI):
     start_scheduler()
     await load_and_schedule_all(sio.emit)
     print("✅ Scheduler iniciado e automações carregadas")
+    # Heartbeat/varredura de presença (sockets desta instância)
+    from presence import run_presence_heartbeat
+    presence_task = asyncio.create_task(run_presence_heartbeat())
+    # Workers das respostas de bots (Guru, transcrições, automações)
+    from bots.reply_worker import reply_pool
+    reply_pool.start()
+    # Cliente HTTP compartilhado (keep-alive) para a OpenAI
+    from llm_client import start_llm_client, close_llm_client
+    await start_llm_client()
+    # Atraso do event loop (/metrics)
+    from metrics import run_loop_lag_monitor
+    loop_lag_task = asyncio.create_task(run_loop_lag_monitor())
     yield
+    loop_lag_task.cancel()
+    presence_task.cancel()
+    await reply_pool.stop()
+    await close_llm_client()
+    if not migrations_task.done():
+        migrations_task.cancel()
 
 # FastAPI app
 app = FastAPI(title="Chat API", lifespan=lifespan)
@@ -45,12 +68,17 @@ app.add_middleware(
     allow_credentials=allow_credentials,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor da próxima página em GET /contacts/
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Security Headers
 add_security_headers(app)
 print("✅ Security headers configurados")
 
+# Métricas HTTP (latência por rota)
+add_metrics(app)
+
 # Routers
 try:
     from users import router as auth_router
@@ -97,6 +125,9 @@ app.include_router(handovers_router)
 from routers.calendar import router as calendar_router
 app.include_router(calendar_router)
 
+from routers.metrics import router as metrics_router
+app.include_router(metrics_router)
+
 
 @app.get("/")
 async def health_check():
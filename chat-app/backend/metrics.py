@@ -0,0 +1,230 @@
+"""Métricas no formato texto do Prometheus (`GET /metrics`).
+
+Sem dependência extra: contadores e histogramas simples, com rótulos, e
+coletores chamados na hora do scrape para as filas e caches que já expõem
+`stats()` (pool de respostas, fila de saída, digitação, perfis, presença,
+state store).
+
+Medido aqui:
+- requisições HTTP por rota (template, não o path com ids) e status;
+- eventos do Socket.IO por nome;
+- comandos do Motor/pymongo (via `MongoCommandListener`);
+- chamadas à OpenAI (chat e Whisper): latência, status, tokens e tempo até
+  o primeiro token nas respostas em streaming;
+- tamanho dos prompts montados (bots/context_budget.py);
+- acertos/erros do cache de respostas (bots/llm_cache.py);
+- etapas do pipeline dos agentes (leitura, resposta, sugestões, gravação, total);
+- atraso do event loop (`run_loop_lag_monitor`).
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+from pymongo import monitoring
+
+METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+PROMPT_TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 8000, 16000)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # rótulos -> [contagem por bucket..., soma, total]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), series):
+                cumulative += hits
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+http_requests = Counter("chat_http_requests_total", "Requisições HTTP", ("method", "route", "status"))
+http_duration = Histogram("chat_http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route"))
+socket_events = Counter("chat_socketio_events_total", "Eventos Socket.IO recebidos", ("event", "status"))
+socket_duration = Histogram("chat_socketio_event_duration_seconds", "Duração dos handlers Socket.IO", ("event",))
+mongo_commands = Counter("chat_mongo_commands_total", "Comandos enviados ao MongoDB", ("command", "status"))
+mongo_duration = Histogram("chat_mongo_command_duration_seconds", "Latência dos comandos MongoDB", ("command",))
+llm_requests = Counter("chat_llm_requests_total", "Chamadas à API da OpenAI", ("api", "model", "status"))
+llm_duration = Histogram("chat_llm_request_duration_seconds", "Latência das chamadas à OpenAI",
+                         ("api", "model"), buckets=LLM_BUCKETS)
+llm_ttft = Histogram("chat_llm_time_to_first_token_seconds", "Tempo até o primeiro token (streaming)",
+                     ("api", "model"), buckets=LLM_BUCKETS)
+llm_tokens = Counter("chat_llm_tokens_total", "Tokens consumidos na OpenAI", ("api", "model", "kind"))
+llm_prompt_tokens = Histogram("chat_llm_prompt_tokens", "Tamanho dos prompts enviados (tokens)",
+                              ("agent",), buckets=PROMPT_TOKEN_BUCKETS)
+llm_cache_lookups = Counter("chat_llm_cache_lookups_total", "Consultas ao cache de respostas",
+                            ("agent", "result"))
+agent_stage_duration = Histogram("chat_agent_stage_duration_seconds", "Etapas do pipeline dos agentes",
+                                 ("stage",), buckets=LLM_BUCKETS)
+loop_lag = Histogram("chat_event_loop_lag_seconds", "Atraso do event loop", buckets=LOOP_LAG_BUCKETS)
+
+REGISTRY = [http_requests, http_duration, socket_events, socket_duration, mongo_commands,
+            mongo_duration, llm_requests, llm_duration, llm_ttft, llm_tokens, llm_prompt_tokens,
+            llm_cache_lookups, agent_stage_duration, loop_lag]
+
+# Coletores de gauges: função -> [(nome, ajuda, {rótulo: valor} ou None, valor)]
+_collectors: list[Callable[[], Iterable[tuple]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[tuple]]) -> None:
+    """Registra uma função chamada em cada scrape que devolve gauges."""
+    _collectors.append(collector)
+
+
+def _render_gauges() -> list[str]:
+    lines = []
+    seen = set()
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            print(f"⚠️  [Metrics] Coletor {getattr(collector, '__name__', collector)} falhou: {e}")
+            continue
+        for name, help_text, labels, value in samples:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            labels = labels or {}
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _render_gauges()
+    return "\n".join(lines) + "\n"
+
+
+def observe_llm_call(api: str, model: str, seconds: float, status: str,
+                     usage: Optional[dict] = None) -> None:
+    """
+    Registra uma chamada à OpenAI.
+
+    Args:
+        api: "chat" ou "whisper"
+        model: Modelo usado
+        seconds: Duração da chamada
+        status: Código HTTP ou "timeout"/"error"
+        usage: Campo `usage` da resposta (tokens), se houver
+    """
+    llm_requests.inc(1, api, model, str(status))
+    llm_duration.observe(seconds, api, model)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            llm_tokens.inc(usage[kind], api, model, kind.split("_")[0])
+
+
+async def post_llm(client, api: str, model: str, url: str, **kwargs):
+    """
+    `client.post(url, **kwargs)` medido com `observe_llm_call`.
+
+    Usado nas chamadas à OpenAI; tokens vêm do `usage` das respostas 200.
+    """
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, **kwargs)
+    except Exception as e:
+        status = "timeout" if "Timeout" in type(e).__name__ else "error"
+        observe_llm_call(api, model, time.perf_counter() - started, status)
+        raise
+    usage = None
+    if response.status_code == 200:
+        try:
+            data = response.json()
+            usage = data.get("usage") if isinstance(data, dict) else None
+        except ValueError:
+            pass
+    observe_llm_call(api, model, time.perf_counter() - started, response.status_code, usage)
+    return response
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Mede a latência de cada comando do pymongo (usado pelo Motor)."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands.inc(1, event.command_name, "ok")
+        mongo_duration.observe(event.duration_micros / 1_000_000, event.command_name)
+
+    def failed(self, event):
+        mongo_commands.inc(1, event.command_name, "error")
+        mongo_duration.observe(event.duration_micros / 1_000_000, event.command_name)
+
+
+async def run_loop_lag_monitor(interval: float = METRICS_LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """Mede quanto o event loop atrasa para acordar um sleep (iniciado no lifespan)."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, time.perf_counter() - started - interval))
@@ -0,0 +1,48 @@
+"""
+Middleware que mede as requisições HTTP para `/metrics`.
+
+ASGI puro (sem `BaseHTTPMiddleware`) para não adicionar uma task por
+requisição. A rota é rotulada pelo template do FastAPI
+(`/messages/{message_id}`), não pelo path com ids, para manter a
+cardinalidade baixa; requisições sem rota ficam como "unmatched".
+"""
+import time
+
+from metrics import http_requests, http_duration
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_requests.inc(1, method, path, str(status["code"]))
+            http_duration.observe(time.perf_counter() - started, method, path)
+
+
+def add_metrics(app):
+    """
+    Helper function para adicionar o middleware de métricas.
+
+    Usage:
+        from middleware.metrics import add_metrics
+        add_metrics(app)
+    """
+    app.add_middleware(MetricsMiddleware)
@@ -3,6 +3,7 @@ Middleware de Rate Limiting para proteção contra abuse.
 
 Protege endpoints críticos limitando número de requisições por IP/usuário.
 """
+import os
 from collections import defaultdict
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Request
@@ -11,6 +12,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Desligável apenas para testes de carga locais (tools/loadgen.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
 
 class RateLimiter:
     """
@@ -107,6 +111,8 @@ def check_rate_limit(request: Request, limiter: RateLimiter, identifier: str = N
     Raises:
         HTTPException: 429 se limite excedido
     """
+    if not RATE_LIMIT_ENABLED:
+        return
     key = identifier or request.client.host
     
     if not limiter.check(key):
@@ -78,6 +78,21 @@ class MessageCreate(MessageBase):
     pass
 
 
+# Maior data representável (9999-12-31T23:59:59.999Z) em ms
+MAX_TIMESTAMP_MS = 253402300799999
+
+
+class BulkMessageIn(MessageCreate):
+    """Item de importação em lote (POST /messages/bulk)"""
+    userId: Optional[str] = None  # Remetente: o usuário autenticado (padrão) ou um id externo
+    timestamp: Optional[int] = Field(None, ge=0, le=MAX_TIMESTAMP_MS)  # Data original em ms; padrão = agora
+
+
+class BulkMessagesIn(BaseModel):
+    """Lote de importação: itens validados individualmente para reportar erros por item"""
+    messages: List[Dict[str, Any]] = Field(..., min_length=1, max_length=5000)
+
+
 class Message(MessageBase):
     id: str = Field(alias="_id")
     createdAt: datetime
@@ -0,0 +1,239 @@
+"""Fila de saída por conexão do Socket.IO.
+
+O client manager do `socket_manager.sio` é um `OutboundManager` (ou
+`OutboundRedisManager` com Redis). Depois que a sala de um emit é resolvida
+nesta instância, cada evento entra na fila do socket de destino em vez de ir
+direto para o buffer do Engine.IO, que não tem limite.
+
+- Prioridades: mensagens do chat (e acks/erros) saem antes dos demais
+  eventos; digitação e presença ficam por último.
+- Eventos coalescíveis (contadores de não-lidas, digitação, presença de um
+  mesmo usuário) substituem o anterior ainda na fila em vez de se acumularem.
+- Um socket só recebe novos pacotes enquanto o buffer do Engine.IO estiver
+  abaixo de `OUTBOUND_ENGINE_HIGH_WATER`. Com a fila cheia, eventos de menor
+  prioridade são descartados; se ainda assim não houver espaço, ou o cliente
+  ficar mais de `OUTBOUND_SLOW_TIMEOUT_SECONDS` sem consumir, ele é
+  desconectado com `connection:closing` e um código de motivo.
+
+`outbound_stats()` expõe a profundidade da fila de cada socket e os totais.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+import socketio
+
+OUTBOUND_QUEUE_MAX = int(os.getenv("OUTBOUND_QUEUE_MAX", "256"))
+OUTBOUND_ENGINE_HIGH_WATER = int(os.getenv("OUTBOUND_ENGINE_HIGH_WATER", "32"))
+OUTBOUND_SLOW_TIMEOUT_SECONDS = float(os.getenv("OUTBOUND_SLOW_TIMEOUT_SECONDS", "15"))
+OUTBOUND_POLL_SECONDS = 0.05
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+EVENT_PRIORITIES = {
+    "chat:new-message": PRIORITY_HIGH,
+    "chat:ack": PRIORITY_HIGH,
+    "chat:delivered": PRIORITY_HIGH,
+    "agent:message": PRIORITY_HIGH,
+    # Deltas na mesma fila do evento final: o final nunca ultrapassa os próprios
+    # deltas e eles não são descartados para abrir espaço para ele
+    "chat:message-delta": PRIORITY_HIGH,
+    "agent:message-delta": PRIORITY_HIGH,
+    "error": PRIORITY_HIGH,
+    "chat:typing": PRIORITY_LOW,
+    "user:online": PRIORITY_LOW,
+    "user:offline": PRIORITY_LOW,
+}
+
+
+def _presence_key(data: Any) -> Any:
+    return ("presence", data.get("userId")) if isinstance(data, dict) else None
+
+
+# Evento -> chave de coalescência (mesma chave: o mais novo substitui o da fila)
+COALESCE_KEYS: dict[str, Callable[[Any], Any]] = {
+    "chat:unread-updated": lambda data: "unread",
+    "chat:typing": lambda data: ("typing", data.get("userId"), data.get("author")) if isinstance(data, dict) else None,
+    "user:online": _presence_key,
+    "user:offline": _presence_key,
+}
+
+REASON_QUEUE_FULL = "slow_consumer_queue_full"
+REASON_TIMEOUT = "slow_consumer_timeout"
+
+_totals = {"enqueued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "slowDisconnects": 0}
+
+
+class ConnectionQueue:
+    """Fila de um socket: uma deque por prioridade e índice de coalescência."""
+
+    def __init__(self, sid: str, eio_sid: str, namespace: str):
+        self.sid = sid
+        self.eio_sid = eio_sid
+        self.namespace = namespace
+        self.levels = [deque(), deque(), deque()]
+        self.coalesce: dict[Any, list] = {}
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.slow_since: Optional[float] = None
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def push(self, event: str, data: Any) -> Optional[str]:
+        """
+        Enfileira o evento.
+
+        Returns:
+            Código de motivo se o consumidor deve ser desconectado
+        """
+        _totals["enqueued"] += 1
+        key_fn = COALESCE_KEYS.get(event)
+        key = key_fn(data) if key_fn else None
+        if key is not None and key in self.coalesce:
+            entry = self.coalesce[key]
+            entry[0], entry[1] = event, data
+            _totals["coalesced"] += 1
+            return None
+
+        priority = EVENT_PRIORITIES.get(event, PRIORITY_NORMAL)
+        if len(self) >= OUTBOUND_QUEUE_MAX and not self._drop_below(priority):
+            return REASON_QUEUE_FULL
+        entry = [event, data, key]
+        self.levels[priority].append(entry)
+        if key is not None:
+            self.coalesce[key] = entry
+        self.wake.set()
+        return None
+
+    def _drop_below(self, priority: int) -> bool:
+        # Abre espaço descartando o evento mais antigo de prioridade menor
+        for level in range(PRIORITY_LOW, priority, -1):
+            if self.levels[level]:
+                entry = self.levels[level].popleft()
+                if entry[2] is not None:
+                    self.coalesce.pop(entry[2], None)
+                _totals["dropped"] += 1
+                return True
+        return False
+
+    def pop(self) -> Optional[list]:
+        for level in self.levels:
+            if level:
+                entry = level.popleft()
+                if entry[2] is not None:
+                    self.coalesce.pop(entry[2], None)
+                return entry
+        return None
+
+
+class OutboundManager(socketio.AsyncManager):
+    """Client manager que entrega os emits locais pelas filas por conexão."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queues: dict[str, ConnectionQueue] = {}
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None,
+                   callback=None, to=None, **kwargs):
+        if callback is not None:
+            # Emits com ack ficam fora da fila (precisam do id do callback)
+            return await super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                      callback=callback, to=to, **kwargs)
+        namespace = namespace or "/"
+        room = to or room
+        if namespace not in self.rooms:
+            return
+        skip = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+        for sid, eio_sid in list(self.get_participants(namespace, room)):
+            if sid in skip:
+                continue
+            queue = self._queue_for(sid, eio_sid, namespace)
+            reason = queue.push(event, data)
+            if reason:
+                asyncio.create_task(self._close_slow(queue, reason))
+
+    async def disconnect(self, sid, namespace, **kwargs):
+        queue = self.queues.pop(sid, None)
+        if queue and queue.task and queue.task is not asyncio.current_task():
+            queue.task.cancel()
+        return await super().disconnect(sid, namespace, **kwargs)
+
+    def _queue_for(self, sid: str, eio_sid: str, namespace: str) -> ConnectionQueue:
+        queue = self.queues.get(sid)
+        if queue is None:
+            queue = self.queues[sid] = ConnectionQueue(sid, eio_sid, namespace)
+            queue.task = asyncio.create_task(self._writer(queue))
+        return queue
+
+    def _engine_depth(self, eio_sid: str) -> int:
+        """Pacotes aguardando no buffer do Engine.IO do socket."""
+        socket = getattr(self.server.eio, "sockets", {}).get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    async def _deliver(self, queue: ConnectionQueue, event: str, data: Any) -> None:
+        # Entrega direta (sem fila) para um único socket
+        await super().emit(event, data, queue.namespace, room=queue.sid)
+
+    async def _writer(self, queue: ConnectionQueue) -> None:
+        while True:
+            await queue.wake.wait()
+            while len(queue):
+                if self._engine_depth(queue.eio_sid) >= OUTBOUND_ENGINE_HIGH_WATER:
+                    now = time.monotonic()
+                    queue.slow_since = queue.slow_since or now
+                    if now - queue.slow_since >= OUTBOUND_SLOW_TIMEOUT_SECONDS:
+                        await self._close_slow(queue, REASON_TIMEOUT)
+                        return
+                    await asyncio.sleep(OUTBOUND_POLL_SECONDS)
+                    continue
+                queue.slow_since = None
+                event, data, _ = queue.pop()
+                try:
+                    await self._deliver(queue, event, data)
+                    queue.sent += 1
+                    _totals["sent"] += 1
+                except Exception as e:
+                    print(f"⚠️  [Outbound] Falha ao enviar {event} para {queue.sid}: {e}")
+            queue.wake.clear()
+
+    async def _close_slow(self, queue: ConnectionQueue, reason: str) -> None:
+        if self.queues.get(queue.sid) is not queue:
+            return
+        self.queues.pop(queue.sid, None)
+        if queue.task and queue.task is not asyncio.current_task():
+            queue.task.cancel()
+        _totals["slowDisconnects"] += 1
+        print(f"🐢 [Outbound] Desconectando consumidor lento {queue.sid}: {reason} ({len(queue)} na fila)")
+        try:
+            await self._deliver(queue, "connection:closing", {"reason": reason})
+            await self.server.disconnect(queue.sid, namespace=queue.namespace)
+        except Exception as e:
+            print(f"⚠️  [Outbound] Erro ao desconectar {queue.sid}: {e}")
+
+    def outbound_stats(self) -> dict:
+        """Profundidade da fila por socket e totais da instância."""
+        depths = {sid: len(q) for sid, q in self.queues.items()}
+        return {
+            **_totals,
+            "sockets": len(depths),
+            "maxDepth": max(depths.values(), default=0),
+            "depths": depths,
+        }
+
+
+class OutboundRedisManager(socketio.AsyncRedisManager, OutboundManager):
+    """Redis manager cujas entregas locais (deste nó) passam pelas filas."""
+
+
+def outbound_stats(manager) -> dict:
+    """Métricas da fila de saída (vazias se o manager não for um `OutboundManager`)."""
+    if isinstance(manager, OutboundManager):
+        return manager.outbound_stats()
+    return {**_totals, "sockets": 0, "maxDepth": 0, "depths": {}}
@@ -0,0 +1,157 @@
+"""Paginação keyset (cursor) para endpoints de histórico.
+
+O cursor é opaco para o cliente: base64 de `(createdAt, _id)` da mensagem na
+borda da página. A ordenação `(createdAt, _id)` é estável mesmo com várias
+mensagens no mesmo milissegundo, e cada página é um range scan no índice, então
+o custo não cresce com a profundidade da rolagem.
+
+Direções:
+- "before": mensagens mais antigas que o cursor (padrão; sem cursor = página mais recente)
+- "after": mensagens mais novas que o cursor
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+EPOCH = datetime(1970, 1, 1)
+
+DIRECTION_BEFORE = "before"
+DIRECTION_AFTER = "after"
+DIRECTIONS = (DIRECTION_BEFORE, DIRECTION_AFTER)
+
+
+@dataclass
+class Page:
+    """Página de documentos em ordem cronológica com cursores das bordas."""
+    docs: list[dict] = field(default_factory=list)
+    has_more: bool = False
+    next_cursor: Optional[str] = None  # continua na mesma direção
+    prev_cursor: Optional[str] = None  # volta na direção oposta
+
+    def meta(self) -> dict:
+        """Campos de paginação para incluir na resposta da API."""
+        return {
+            "hasMore": self.has_more,
+            "nextCursor": self.next_cursor,
+            "prevCursor": self.prev_cursor,
+        }
+
+
+def _to_millis(dt: datetime) -> int:
+    # Datas sem tzinfo vêm do Mongo em UTC
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_cursor(doc: dict, field_name: str = "createdAt") -> Optional[str]:
+    """Gera o cursor opaco de um documento (None se não tiver `field_name`)."""
+    created_at = doc.get(field_name)
+    if not isinstance(created_at, datetime) or "_id" not in doc:
+        return None
+    doc_id = doc["_id"]
+    payload = {
+        "t": _to_millis(created_at),
+        "id": str(doc_id),
+        "oid": isinstance(doc_id, ObjectId),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, Any]:
+    """
+    Decodifica o cursor em `(createdAt, _id)`.
+
+    Raises:
+        HTTPException: 400 se o cursor for inválido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = EPOCH + timedelta(milliseconds=int(payload["t"]))
+        doc_id = ObjectId(payload["id"]) if payload.get("oid") else payload["id"]
+        return created_at, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def keyset_filter(created_at: datetime, doc_id: Any, direction: str, field_name: str = "createdAt") -> dict:
+    """Filtro de range estritamente antes/depois de `(field_name, _id)`."""
+    op = "$lt" if direction == DIRECTION_BEFORE else "$gt"
+    return {
+        "$or": [
+            {field_name: {op: created_at}},
+            {field_name: created_at, "_id": {op: doc_id}},
+        ]
+    }
+
+
+def combine_filters(query: dict, extra: dict) -> dict:
+    """Combina dois filtros com `$and` (preserva `$or` de ambos)."""
+    if not query:
+        return extra
+    return {"$and": [query, extra]}
+
+
+def before_millis_filter(before: int) -> dict:
+    """Filtro legado `before` (timestamp em ms) sobre createdAt, para clientes antigos."""
+    return {"createdAt": {"$lt": EPOCH + timedelta(milliseconds=int(before))}}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    direction: str = DIRECTION_BEFORE,
+    projection: Optional[dict] = None
+) -> Page:
+    """
+    Busca uma página keyset de `collection`.
+
+    Pede `limit + 1` documentos para saber se há mais sem um `count` extra.
+
+    Args:
+        collection: Collection Motor
+        query: Filtro base (ex.: {"conversationKey": ...})
+        limit: Tamanho da página
+        cursor: Cursor opaco da borda da página anterior
+        direction: "before" (mais antigas) ou "after" (mais novas)
+        projection: Projeção opcional
+
+    Returns:
+        Page com documentos em ordem cronológica
+    """
+    if direction not in DIRECTIONS:
+        raise HTTPException(status_code=400, detail="direction deve ser 'before' ou 'after'")
+
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = combine_filters(query, keyset_filter(created_at, doc_id, direction))
+
+    order = -1 if direction == DIRECTION_BEFORE else 1
+    cursor_obj = collection.find(query, projection).sort([("createdAt", order), ("_id", order)]).limit(limit + 1)
+    docs = await cursor_obj.to_list(length=limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == DIRECTION_BEFORE:
+        docs.reverse()  # Ordem cronológica
+
+    page = Page(docs=docs, has_more=has_more)
+    if docs:
+        oldest, newest = encode_cursor(docs[0]), encode_cursor(docs[-1])
+        if direction == DIRECTION_BEFORE:
+            page.next_cursor = oldest if has_more else None
+            page.prev_cursor = newest
+        else:
+            page.next_cursor = newest if has_more else None
+            page.prev_cursor = oldest
+    return page
@@ -0,0 +1,258 @@
+"""Presença dos usuários (online/offline) compartilhada entre instâncias.
+
+Cada socket autenticado fica registrado no store com um prazo de validade
+(`PRESENCE_TTL_SECONDS`). A instância que atende o socket renova esse prazo
+a cada `PRESENCE_HEARTBEAT_SECONDS`; se ela cair sem desconectar os sockets,
+os registros expiram e a varredura de outra instância anuncia a saída. O
+usuário está online enquanto tiver ao menos um socket válido em qualquer nó.
+
+Com `REDIS_URL` o store fica no Redis (o mesmo usado pelo Socket.IO); sem
+ele, em memória (uma instância só).
+
+Mudanças de presença vão apenas para as salas de quem tem o usuário na
+lista de conversas, não para todos os sockets. A saída só é anunciada depois
+de `PRESENCE_OFFLINE_GRACE_MS`: uma reconexão dentro desse prazo (deploy,
+troca de rede, F5) não gera offline/online.
+"""
+
+import asyncio
+import os
+import time
+from typing import Iterable, Optional
+
+from conversations import list_watcher_ids
+from socket_manager import REDIS_URL, sio, user_room
+
+PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+PRESENCE_HEARTBEAT_SECONDS = int(os.getenv("PRESENCE_HEARTBEAT_SECONDS", "20"))
+PRESENCE_OFFLINE_GRACE_SECONDS = int(os.getenv("PRESENCE_OFFLINE_GRACE_MS", "5000")) / 1000
+
+
+class InMemoryPresenceStore:
+    """Store em memória: `{user_id: {sid: expira_em}}`."""
+
+    def __init__(self):
+        self._sockets: dict[str, dict[str, float]] = {}
+
+    def _prune(self, user_id: str, now: float) -> dict[str, float]:
+        sockets = self._sockets.get(user_id, {})
+        for sid in [s for s, exp in sockets.items() if exp <= now]:
+            del sockets[sid]
+        return sockets
+
+    async def add(self, user_id: str, sid: str, now: float) -> bool:
+        """Registra/renova o socket. Retorna True se o usuário estava offline."""
+        sockets = self._prune(user_id, now)
+        was_offline = not sockets
+        sockets[sid] = now + PRESENCE_TTL_SECONDS
+        self._sockets[user_id] = sockets
+        return was_offline
+
+    async def touch(self, entries: Iterable[tuple[str, str]], now: float) -> None:
+        for user_id, sid in entries:
+            self._sockets.setdefault(user_id, {})[sid] = now + PRESENCE_TTL_SECONDS
+
+    async def remove(self, user_id: str, sid: str, now: float) -> bool:
+        """Remove o socket. Retorna True se o usuário ficou sem sockets válidos."""
+        sockets = self._prune(user_id, now)
+        sockets.pop(sid, None)
+        if not sockets:
+            self._sockets.pop(user_id, None)
+            return True
+        return False
+
+    async def online_among(self, user_ids: list[str], now: float) -> set[str]:
+        return {u for u in user_ids if any(exp > now for exp in self._sockets.get(u, {}).values())}
+
+    async def expire(self, now: float) -> list[str]:
+        """Remove sockets vencidos; retorna os usuários que ficaram offline por isso."""
+        expired = []
+        for user_id in list(self._sockets):
+            sockets = self._sockets[user_id]
+            before = len(sockets)
+            self._prune(user_id, now)
+            if not sockets:
+                del self._sockets[user_id]
+                if before:
+                    expired.append(user_id)
+        return expired
+
+
+class RedisPresenceStore:
+    """
+    Store no Redis: um sorted set por usuário (`presence:sockets:{id}`) com
+    os sids e o prazo de validade como score, e o sorted set
+    `presence:deadlines` com o maior prazo de cada usuário. A varredura lê só
+    os usuários com prazo vencido (`ZRANGEBYSCORE -inf agora`), então o custo
+    não cresce com o número de usuários online.
+    """
+
+    DEADLINES_KEY = "presence:deadlines"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"presence:sockets:{user_id}"
+
+    async def add(self, user_id: str, sid: str, now: float) -> bool:
+        key = self._key(user_id)
+        deadline = now + PRESENCE_TTL_SECONDS
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zcard(key)
+        pipe.zadd(key, {sid: deadline})
+        pipe.expire(key, PRESENCE_TTL_SECONDS * 2)
+        pipe.zadd(self.DEADLINES_KEY, {user_id: deadline}, gt=True)
+        _, count, *_ = await pipe.execute()
+        return count == 0
+
+    async def touch(self, entries: Iterable[tuple[str, str]], now: float) -> None:
+        deadline = now + PRESENCE_TTL_SECONDS
+        pipe = self._redis.pipeline(transaction=False)
+        users = set()
+        for user_id, sid in entries:
+            pipe.zadd(self._key(user_id), {sid: deadline})
+            pipe.expire(self._key(user_id), PRESENCE_TTL_SECONDS * 2)
+            users.add(user_id)
+        if users:
+            # GT: outra instância com prazo maior para o mesmo usuário não é rebaixada
+            pipe.zadd(self.DEADLINES_KEY, {u: deadline for u in users}, gt=True)
+        await pipe.execute()
+
+    async def remove(self, user_id: str, sid: str, now: float) -> bool:
+        key = self._key(user_id)
+        pipe = self._redis.pipeline()
+        pipe.zrem(key, sid)
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zcard(key)
+        *_, count = await pipe.execute()
+        if count == 0:
+            await self._redis.zrem(self.DEADLINES_KEY, user_id)
+            return True
+        return False
+
+    async def online_among(self, user_ids: list[str], now: float) -> set[str]:
+        if not user_ids:
+            return set()
+        pipe = self._redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zcount(self._key(user_id), f"({now}", "+inf")
+        counts = await pipe.execute()
+        return {u for u, c in zip(user_ids, counts) if c}
+
+    async def expire(self, now: float) -> list[str]:
+        expired = []
+        for user_id in await self._redis.zrangebyscore(self.DEADLINES_KEY, "-inf", now):
+            key = self._key(user_id)
+            pipe = self._redis.pipeline()
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zrange(key, -1, -1, withscores=True)
+            removed, latest = await pipe.execute()
+            if latest:
+                # Ainda há socket válido (renovado por outra instância): corrige o prazo
+                await self._redis.zadd(self.DEADLINES_KEY, {user_id: latest[0][1]}, gt=True)
+            # zrem devolve 1 só para a instância que removeu: anuncia uma vez
+            elif await self._redis.zrem(self.DEADLINES_KEY, user_id) and removed:
+                expired.append(user_id)
+        return expired
+
+
+def create_presence_store():
+    if REDIS_URL:
+        print("✅ Presença compartilhada via Redis")
+        return RedisPresenceStore(REDIS_URL)
+    return InMemoryPresenceStore()
+
+
+store = create_presence_store()
+
+# Sockets atendidos por esta instância (sid -> user_id), renovados pelo heartbeat
+_local_sockets: dict[str, str] = {}
+# Saídas aguardando o período de carência
+_pending_offline: dict[str, asyncio.Task] = {}
+
+
+async def notify_presence(user_id: str, online: bool) -> None:
+    """Emite user:online/user:offline só para quem tem o usuário como contato."""
+    watchers = await list_watcher_ids(user_id)
+    if not watchers:
+        return
+    event = "user:online" if online else "user:offline"
+    await sio.emit(event, {"userId": user_id}, room=[user_room(w) for w in watchers])
+
+
+async def user_connected(user_id: str, sid: str) -> None:
+    """Registra o socket; anuncia online se o usuário não tinha outro socket."""
+    _local_sockets[sid] = user_id
+    pending = _pending_offline.pop(user_id, None)
+    if pending:
+        pending.cancel()
+    was_offline = await store.add(user_id, sid, time.time())
+    # Reconexão dentro da carência: o offline nunca foi anunciado
+    if was_offline and not pending:
+        await notify_presence(user_id, True)
+
+
+async def user_disconnected(user_id: str, sid: str) -> None:
+    """Remove o socket; a saída é confirmada após o período de carência."""
+    _local_sockets.pop(sid, None)
+    if await store.remove(user_id, sid, time.time()):
+        _schedule_offline(user_id)
+
+
+def _schedule_offline(user_id: str) -> None:
+    pending = _pending_offline.get(user_id)
+    if pending and not pending.done():
+        return
+    _pending_offline[user_id] = asyncio.create_task(_confirm_offline(user_id))
+
+
+async def _confirm_offline(user_id: str) -> None:
+    try:
+        await asyncio.sleep(PRESENCE_OFFLINE_GRACE_SECONDS)
+        # Pode ter reconectado em outra instância durante a carência
+        if not await store.online_among([user_id], time.time()):
+            await notify_presence(user_id, False)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Erro ao anunciar offline de {user_id}: {e}")
+    finally:
+        if _pending_offline.get(user_id) is asyncio.current_task():
+            del _pending_offline[user_id]
+
+
+async def online_among(user_ids: list[str]) -> set[str]:
+    """Ids (entre os informados) que estão online em alguma instância."""
+    return await store.online_among(list(user_ids), time.time())
+
+
+async def heartbeat_once(now: Optional[float] = None) -> None:
+    """Renova os sockets desta instância e anuncia a saída dos que expiraram."""
+    now = time.time() if now is None else now
+    if _local_sockets:
+        await store.touch([(user_id, sid) for sid, user_id in _local_sockets.items()], now)
+    for user_id in await store.expire(now):
+        await notify_presence(user_id, False)
+
+
+async def run_presence_heartbeat() -> None:
+    """Loop de heartbeat/varredura iniciado no lifespan da aplicação."""
+    while True:
+        await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+        try:
+            await heartbeat_once()
+        except Exception as e:
+            print(f"⚠️  Erro no heartbeat de presença: {e}")
+
+
+def presence_stats() -> dict:
+    """Sockets registrados por esta instância e saídas em carência."""
+    return {
+        "localSockets": len(_local_sockets),
+        "localUsers": len(set(_local_sockets.values())),
+        "pendingOffline": len(_pending_offline),
+    }
@@ -0,0 +1,166 @@
+"""Cache de perfis (usuários e contatos externos) por id.
+
+Handshake do Socket.IO, lista de contatos e "marcar como lido" só precisam
+de nome/e-mail/avatar, mas cada um fazia suas próprias buscas em `users` e
+`contacts` (ObjectId e depois string). Aqui a resolução é feita em lote (uma
+query por collection, com ids ObjectId e string no mesmo `$in`) e guardada
+num LRU limitado com TTL. Ids não encontrados também ficam em cache, por
+menos tempo.
+
+Alterações de perfil chamam `invalidate_profile`. O cache é por instância: em
+várias instâncias a mudança aparece nas outras em até
+`PROFILE_CACHE_TTL_SECONDS`.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+PROFILE_CACHE_MISSING_TTL_SECONDS = 60
+PROFILE_CACHE_MAX = int(os.getenv("PROFILE_CACHE_MAX", "10000"))
+
+_MISSING = object()
+
+
+class ProfileCache:
+    """LRU com TTL: `{id: (expira_em, perfil ou None)}`."""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_MAX, ttl: int = PROFILE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Optional[dict]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """Perfil em cache, None (id inexistente em cache) ou `_MISSING`."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, profile: Optional[dict], ttl: Optional[int] = None) -> None:
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), profile)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+profile_cache = ProfileCache()
+
+
+def _lookup_ids(ids: list[str]) -> list:
+    # Documentos antigos podem ter _id string: busca as duas formas no mesmo $in
+    values = []
+    for value in ids:
+        try:
+            values.append(ObjectId(value))
+        except (InvalidId, TypeError):
+            pass
+        values.append(value)
+    return values
+
+
+def _user_profile(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name") or doc.get("email"),
+        "email": doc.get("email"),
+        "avatar": doc.get("avatar"),
+        "external": False,
+    }
+
+
+def _contact_profile(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name") or doc.get("phone") or doc.get("email") or "Contato",
+        "email": doc.get("email"),
+        "avatar": doc.get("avatar"),
+        "external": True,
+    }
+
+
+async def get_profiles(database, ids: Iterable[str]) -> dict[str, dict]:
+    """
+    Resolve perfis por id (usuários primeiro, depois contatos externos).
+
+    Args:
+        database: Banco Motor com as collections `users` e `contacts`
+        ids: Ids a resolver (ObjectId em string ou ids string legados)
+
+    Returns:
+        `{id: perfil}` apenas para os ids encontrados
+    """
+    profiles = {}
+    missing = []
+    for key in dict.fromkeys(i for i in ids if i):
+        cached = profile_cache.get(key)
+        if cached is _MISSING:
+            missing.append(key)
+        elif cached is not None:
+            profiles[key] = cached
+    if not missing:
+        return profiles
+
+    found = {}
+    users = await database.users.find({"_id": {"$in": _lookup_ids(missing)}}, {"password": 0}).to_list(None)
+    for doc in users:
+        found[str(doc["_id"])] = _user_profile(doc)
+    remaining = [key for key in missing if key not in found]
+    contacts = getattr(database, "contacts", None)
+    if remaining and contacts is not None:
+        external = await contacts.find({"_id": {"$in": _lookup_ids(remaining)}}).to_list(None)
+        for doc in external:
+            found.setdefault(str(doc["_id"]), _contact_profile(doc))
+
+    for key in missing:
+        profile = found.get(key)
+        profile_cache.put(key, profile, None if profile else PROFILE_CACHE_MISSING_TTL_SECONDS)
+        if profile:
+            profiles[key] = profile
+    return profiles
+
+
+async def get_profile(database, profile_id: str) -> Optional[dict]:
+    """Perfil de um único id (ou None)."""
+    return (await get_profiles(database, [profile_id])).get(profile_id)
+
+
+def invalidate_profile(profile_id: str) -> None:
+    """Remove o perfil do cache (chamar após criar/alterar usuário ou contato)."""
+    profile_cache.invalidate(str(profile_id))
+
+
+def profile_cache_stats() -> dict:
+    return profile_cache.stats()
@@ -15,6 +15,8 @@ class CustomBotCreate(BaseModel):
     specialties: list[str] = Field(default_factory=list, max_length=5)
     openaiApiKey: str = Field(..., min_length=20, alias="openaiApiKey")
     openaiAccount: Optional[str] = Field(default=None, alias="openaiAccount")
+    cacheResponses: bool = Field(default=True, alias="cacheResponses")
+    contextTokenBudget: Optional[int] = Field(default=None, ge=500, le=16000, alias="contextTokenBudget")
 
 
 @router.post("")
@@ -27,7 +29,9 @@ async def create_custom_bot(body: CustomBotCreate, current_user_id: str = Depend
         system_prompt=body.prompt,
         specialties=body.specialties,
         openai_api_key=body.openaiApiKey,
-        openai_account=body.openaiAccount
+        openai_account=body.openaiAccount,
+        cache_responses=body.cacheResponses,
+        context_token_budget=body.contextTokenBudget
     )
     return {
         "success": True,
@@ -36,6 +40,8 @@ async def create_custom_bot(body: CustomBotCreate, current_user_id: str = Depend
             "emoji": agent.emoji,
             "key": agent.name.lower().replace(' ', ''),
             "specialties": agent.specialties,
+            "cacheResponses": agent.cache_responses,
+            "contextTokenBudget": agent.context_token_budget,
             "createdAt": datetime.now(timezone.utc).isoformat()
         }
     }
@@ -51,7 +57,9 @@ async def list_custom_bots(current_user_id: str = Depends(get_current_user_id)):
                 "name": agent.name,
                 "emoji": agent.emoji,
                 "key": agent.name.lower().replace(' ', ''),
-                "specialties": agent.specialties
+                "specialties": agent.specialties,
+                "cacheResponses": agent.cache_responses,
+                "contextTokenBudget": agent.context_token_budget
             }
             for agent in agents
         ]
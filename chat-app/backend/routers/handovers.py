@@ -13,6 +13,7 @@ from bson import ObjectId
 from models import HandoverRequest, HandoverStatus, HandoverReason
 from database import handovers_collection
 from deps import get_current_user_id
+from serializers import ORJSONResponse, handover_to_dict
 from bots.handover import (
     should_trigger_handover,
     generate_handover_summary,
@@ -21,7 +22,7 @@ from bots.handover import (
     calculate_priority
 )
 
-router = APIRouter(prefix="/handovers", tags=["Handover"])
+router = APIRouter(prefix="/handovers", tags=["Handover"], default_response_class=ORJSONResponse)
 
 
 class CreateHandoverRequest(BaseModel):
@@ -155,10 +156,7 @@ async def list_handovers(
         handovers = await cursor.to_list(length=limit)
         
         # Converte ObjectId para string
-        for handover in handovers:
-            handover["id"] = str(handover.pop("_id"))
-        
-        return handovers
+        return ORJSONResponse([handover_to_dict(h) for h in handovers])
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar handovers: {str(e)}")
@@ -185,8 +183,7 @@ async def get_handover(
         if not handover:
             raise HTTPException(status_code=404, detail="Handover não encontrado")
         
-        handover["id"] = str(handover.pop("_id"))
-        return handover
+        return ORJSONResponse(handover_to_dict(handover))
         
     except Exception as e:
         if "not a valid ObjectId" in str(e):
@@ -1,13 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from fastapi import APIRouter, Query, HTTPException, Depends, Request
 from bson import ObjectId
-
-from database import messages_collection
-from storage import presign_get
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from database import db, messages_collection, message_search_collection
+from models import BulkMessageIn, BulkMessagesIn
+from conversations import conversation_key, record_messages, stamp_conversation_key
+from pagination import DIRECTION_BEFORE, before_millis_filter, combine_filters, fetch_page
+from exports import EXPORT_FORMATS, export_response, iter_export
+from search import search_messages
+from serializers import (
+    AGENT_MESSAGE_PROJECTION,
+    MESSAGE_PROJECTION,
+    ORJSONResponse,
+    agent_message_to_dict,
+    message_to_dict,
+)
 from deps import get_current_user_id
 
-router = APIRouter(prefix="", tags=["messages"])
+router = APIRouter(prefix="", tags=["messages"], default_response_class=ORJSONResponse)
 
 
 @router.get("/messages")
@@ -15,56 +29,178 @@ async def get_messages(
     before: Optional[int] = None,
     limit: int = Query(default=30, le=100),
     contact_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    direction: str = Query(default=DIRECTION_BEFORE, pattern="^(before|after)$"),
     current_user_id: str = Depends(get_current_user_id)
 ):
-    filters = []
+    """
+    Histórico de mensagens do usuário (ou de uma conversa, com contact_id).
+
+    Paginação por cursor: use `nextCursor` da resposta em `cursor` para continuar
+    na mesma direção. `before` (timestamp em ms) é mantido para clientes antigos.
+    """
     if contact_id:
-        filters.append({
-            "$or": [
-                {"userId": current_user_id, "contactId": contact_id},
-                {"userId": contact_id, "contactId": current_user_id}
-            ]
-        })
+        query = {"conversationKey": conversation_key(current_user_id, contact_id)}
     else:
-        filters.append({"$or": [{"userId": current_user_id}, {"contactId": current_user_id}]})
-
-    if before:
-        before_dt = datetime.fromtimestamp(before / 1000)
-        filters.append({"createdAt": {"$lt": before_dt}})
-
-    query = filters[0] if len(filters) == 1 else {"$and": filters}
-
-    cursor = messages_collection.find(query).sort("createdAt", -1).limit(limit)
-    docs = await cursor.to_list(length=limit)
-
-    messages = []
-    for doc in reversed(docs):
-        msg_dict = {
-            "id": str(doc["_id"]),
-            "author": doc["author"],
-            "text": doc["text"],
-            "timestamp": int(doc["createdAt"].timestamp() * 1000),
-            "status": doc.get("status", "sent"),
-            "type": doc.get("type", "text")
-        }
-        if "attachment" in doc:
-            msg_dict["attachment"] = doc["attachment"]
-            msg_dict["url"] = presign_get(doc["attachment"]["key"])
-        messages.append(msg_dict)
+        query = {"$or": [{"userId": current_user_id}, {"contactId": current_user_id}]}
+
+    if before and not cursor:
+        query = combine_filters(query, before_millis_filter(before))
+
+    page = await fetch_page(messages_collection, query, limit, cursor=cursor, direction=direction,
+                            projection=MESSAGE_PROJECTION)
+    return ORJSONResponse({"messages": [message_to_dict(doc) for doc in page.docs], **page.meta()})
+
 
+async def _registered_user_ids(ids: set[str]) -> set[str]:
+    """Quais dos ids são usuários cadastrados (ids externos não são ObjectId)."""
+    object_ids = []
+    for value in ids:
+        try:
+            object_ids.append(ObjectId(value))
+        except (InvalidId, TypeError):
+            continue
+    if not object_ids:
+        return set()
+    users = await db.users.find({"_id": {"$in": object_ids}}, {"_id": 1}).to_list(len(object_ids))
+    return {str(u["_id"]) for u in users}
+
+
+@router.post("/messages/bulk")
+async def bulk_import_messages(
+    body: BulkMessagesIn,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Importa um lote de mensagens (migração de histórico).
+
+    Cada item é validado como `MessageCreate`, precisa de `contactId` e
+    precisa envolver o usuário autenticado (remetente ou destinatário). Com o usuário como destinatário, o
+    remetente só pode ser um id externo (ex.: "WA:55..."): ids de usuários
+    cadastrados são recusados, para ninguém gravar mensagens em nome de outro.
+    Os válidos são gravados com `imported: true` em um único
+    `insert_many(ordered=False)`; não há emits por mensagem e o read model de
+    conversas é atualizado uma vez por lote.
+
+    Returns:
+        {"inserted": n, "failed": m, "errors": [{"index": i, "error": "..."}]}
+    """
+    errors = []
+    items = []
+    for index, raw in enumerate(body.messages):
+        try:
+            item = BulkMessageIn(**raw)
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                for err in e.errors(include_url=False)
+            )
+            errors.append({"index": index, "error": detail})
+            continue
+        if not item.contactId:
+            errors.append({"index": index, "error": "contactId é obrigatório na importação"})
+            continue
+        sender_id = item.userId or current_user_id
+        if current_user_id not in (sender_id, item.contactId):
+            errors.append({"index": index, "error": "Mensagem não pertence a uma conversa do usuário"})
+            continue
+        items.append((index, item, sender_id))
+
+    registered = await _registered_user_ids({s for _, _, s in items if s != current_user_id})
+
+    docs = []
+    doc_index = []  # posição de cada documento no lote original
+    now = datetime.now(timezone.utc)
+    for index, item, sender_id in items:
+        if sender_id in registered:
+            errors.append({"index": index, "error": "Remetente é outro usuário cadastrado"})
+            continue
+        doc = {
+            "author": item.author,
+            "text": item.text,
+            "status": item.status,
+            "type": item.type,
+            "userId": sender_id,
+            "contactId": item.contactId,
+            "createdAt": datetime.fromtimestamp(item.timestamp / 1000, tz=timezone.utc) if item.timestamp is not None else now,
+            "imported": True,
+        }
+        if item.attachment:
+            doc["attachment"] = item.attachment.model_dump()
+        docs.append(stamp_conversation_key(doc))
+        doc_index.append(index)
+
+    inserted_docs = docs
+    if docs:
+        try:
+            await messages_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = set()
+            for err in e.details.get("writeErrors", []):
+                failed.add(err["index"])
+                errors.append({"index": doc_index[err["index"]], "error": err.get("errmsg", "Erro de escrita")})
+            inserted_docs = [d for i, d in enumerate(docs) if i not in failed]
+        await record_messages(inserted_docs)
+
+    errors.sort(key=lambda e: e["index"])
     return {
-        "messages": messages,
-        "hasMore": len(docs) == limit
+        "inserted": len(inserted_docs),
+        "failed": len(errors),
+        "errors": errors
     }
 
 
+@router.get("/messages/search")
+async def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    contact_id: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    order: str = Query(default="relevance", pattern="^(relevance|recent)$"),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Busca textual nas conversas do usuário (índice de texto por usuário, em português).
+
+    Cada resultado traz `highlights` com as posições `[início, fim)` dos termos
+    encontrados no texto. Use `nextCursor` em `cursor` para a próxima página.
+    """
+    return await search_messages(
+        message_search_collection,
+        current_user_id,
+        q,
+        contact_id=contact_id,
+        limit=limit,
+        cursor=cursor,
+        order=order
+    )
+
+
+@router.get("/messages/export")
+async def export_messages(
+    fmt: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """Exporta todo o histórico do usuário (enviadas e recebidas) em NDJSON ou CSV, em streaming."""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido")
+    query = {"$or": [{"userId": current_user_id}, {"contactId": current_user_id}]}
+    return export_response(
+        iter_export(messages_collection, query, fmt),
+        fmt,
+        f"mensagens-{current_user_id}"
+    )
+
+
 @router.get("/agents/{agent_key}/messages")
 async def get_agent_messages(
     agent_key: str,
     request: Request,
     contact_id: Optional[str] = Query(None, alias="contactId"),
     before: Optional[int] = None,
-    limit: int = Query(default=30, le=100)
+    limit: int = Query(default=30, le=100),
+    cursor: Optional[str] = None,
+    direction: str = Query(default=DIRECTION_BEFORE, pattern="^(before|after)$")
 ):
     from database import agent_messages_collection
     from auth import get_user_id_from_token
@@ -83,27 +219,12 @@ async def get_agent_messages(
     }
     if contact_id:
         query["contactId"] = contact_id
-    if before:
-        before_dt = datetime.fromtimestamp(before / 1000)
-        query["createdAt"] = {"$lt": before_dt}
-
-    cursor = agent_messages_collection.find(query).sort("createdAt", -1).limit(limit)
-    docs = await cursor.to_list(length=limit)
-
-    messages = []
-    for doc in reversed(docs):
-        messages.append({
-            "id": str(doc["_id"]),
-            "author": doc["author"],
-            "text": doc["text"],
-            "timestamp": int(doc["createdAt"].timestamp() * 1000),
-            "agentKey": doc["agentKey"]
-        })
+    if before and not cursor:
+        query = combine_filters(query, before_millis_filter(before))
 
-    return {
-        "messages": messages,
-        "hasMore": len(docs) == limit
-    }
+    page = await fetch_page(agent_messages_collection, query, limit, cursor=cursor, direction=direction,
+                            projection=AGENT_MESSAGE_PROJECTION)
+    return ORJSONResponse({"messages": [agent_message_to_dict(doc) for doc in page.docs], **page.meta()})
 
 
 @router.delete("/messages/all")
@@ -114,6 +235,8 @@ async def delete_all_messages(current_user_id: str = Depends(get_current_user_id
     # Deleta mensagens normais
     result_messages = await messages_collection.delete_many({})
     
+    await message_search_collection.delete_many({})
+
     # Deleta mensagens de agentes
     result_agents = await agent_messages_collection.delete_many({})
     
@@ -0,0 +1,61 @@
+"""
+Endpoint `/metrics` (formato texto do Prometheus).
+
+Além dos contadores/histogramas de `metrics.py`, expõe como gauges os
+`stats()` das filas e caches em memória desta instância. Com
+`METRICS_TOKEN` definido, o scrape precisa de `Authorization: Bearer <token>`.
+"""
+
+import os
+import re
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from metrics import register_collector, render_metrics
+from bots.llm_cache import llm_cache_stats
+from bots.memory import agent_memory_stats
+from bots.summaries import summaries_stats
+from bots.reply_worker import reply_pool
+from outbound import outbound_stats
+from presence import presence_stats
+from profile_cache import profile_cache_stats
+from socket_manager import sio
+from state_store import state_store_stats
+from typing_throttle import typing_stats
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(tags=["Metrics"])
+
+
+def _snake(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def _stats_gauges(prefix: str, description: str, stats: dict):
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"chat_{prefix}_{_snake(key)}", f"{description} ({key})", None, value
+
+
+def _collect_runtime_stats():
+    yield from _stats_gauges("reply_pool", "Pool de respostas dos bots", reply_pool.stats())
+    yield from _stats_gauges("outbound", "Filas de saída do Socket.IO", outbound_stats(sio.manager))
+    yield from _stats_gauges("typing", "Throttle de digitação", typing_stats())
+    yield from _stats_gauges("profile_cache", "Cache de perfis", profile_cache_stats())
+    yield from _stats_gauges("presence", "Presença", presence_stats())
+    yield from _stats_gauges("state_store", "State store", state_store_stats())
+    yield from _stats_gauges("llm_cache", "Cache de respostas", llm_cache_stats())
+    yield from _stats_gauges("agent_memory", "Memória dos agentes", agent_memory_stats())
+    yield from _stats_gauges("summaries", "Resumos incrementais", summaries_stats())
+
+
+register_collector(_collect_runtime_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(authorization: str | None = Header(default=None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
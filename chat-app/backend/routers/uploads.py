@@ -1,6 +1,5 @@
 from typing import Optional
 from datetime import datetime, timezone
-import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 
@@ -8,9 +7,9 @@ from deps import get_current_user_id
 from storage import validate_upload, new_object_key, presign_put, presign_get, S3_BUCKET
 from middleware.rate_limit import check_rate_limit, upload_limiter
 from database import messages_collection
-from transcription import transcribe_from_s3
-from bots.ai_bot import is_ai_question, clean_bot_mention, ask_chatgpt
-from socket_manager import sio
+from conversations import stamp_conversation_key, record_message
+from bots.reply_worker import reply_pool, transcribe_and_reply
+from socket_manager import sio, user_room
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
@@ -72,7 +71,9 @@ async def confirm_upload(body: ConfirmUploadIn, current_user_id: str = Depends(g
             "mimetype": body.mimetype
         }
     }
+    stamp_conversation_key(doc)
     result = await messages_collection.insert_one(doc)
+    await record_message(doc)
     msg = {
         "id": str(result.inserted_id),
         "author": doc["author"],
@@ -85,31 +86,21 @@ async def confirm_upload(body: ConfirmUploadIn, current_user_id: str = Depends(g
         "attachment": doc["attachment"],
         "url": presign_get(body.key)
     }
-    await sio.emit("chat:new-message", msg)
+    # Para as abas do remetente e do destinatário (em qualquer instância)
+    rooms = [user_room(current_user_id)]
+    if body.contactId:
+        rooms.append(user_room(body.contactId))
+    await sio.emit("chat:new-message", msg, room=rooms)
 
     # Emite unread counts de push para o destinatário (se houver)
     if body.contactId:
-        try:
-            from socket_handlers import emit_unread_counts_for_user
-            await emit_unread_counts_for_user(body.contactId)
-        except Exception as _e:
-            print('⚠️ Falha ao emitir unread counts (upload):', _e)
+        from socket_handlers import schedule_unread_counts_push
+        schedule_unread_counts_push(body.contactId)
 
-    # Transcrição de áudio (se aplicável)
+    # Transcrição de áudio (e resposta do Guru) no pool de respostas, fora da requisição
     if file_type == "audio":
-        from bots.automations import publish_message
-        transcription = await transcribe_from_s3(body.key, S3_BUCKET)
-        if transcription and not transcription.startswith("["):
-            if is_ai_question(transcription):
-                await sio.emit("chat:typing", {"author": "Guru", "isTyping": True})
-                await asyncio.sleep(0.8)
-                clean_text = clean_bot_mention(transcription)
-                ai_response = await ask_chatgpt(clean_text, body.author, body.author)
-                typing_time = len(ai_response) / 50
-                typing_time = max(1.5, min(typing_time, 5.0))
-                await asyncio.sleep(typing_time)
-                await sio.emit("chat:typing", {"author": "Guru", "isTyping": False})
-                response_text = f'🎤 _Áudio transcrito:_ "{transcription}"\n\n{ai_response}'
-                await publish_message(sio.emit, author="Guru 🧠", text=response_text, user_id=body.author)
+        reply_pool.submit(current_user_id, lambda: transcribe_and_reply(
+            current_user_id, body.author, body.key, S3_BUCKET, body.contactId
+        ), label="transcription")
 
     return {"ok": True, "message": msg}
@@ -7,6 +7,7 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from bson import ObjectId
 
 from database import messages_collection
+from conversations import stamp_conversation_key, record_message
 from socket_handlers import emit_to_user
 from socket_manager import sio
 from storage import presign_get
@@ -26,7 +27,9 @@ async def _persist_and_broadcast(author: str, text: str, target_user_id: Optiona
         "contactId": target_user_id if target_user_id else None,
         "userId": author if target_user_id else None
     }
+    stamp_conversation_key(doc)
     await messages_collection.insert_one(doc)
+    await record_message(doc)
     payload = {
         "id": str(doc["_id"]),
         "author": author,
@@ -44,11 +47,8 @@ async def _persist_and_broadcast(author: str, text: str, target_user_id: Optiona
 
     # Emite unread counts de push para o destinatário (se houver)
     if target_user_id:
-        try:
-            from socket_handlers import emit_unread_counts_for_user
-            await emit_unread_counts_for_user(target_user_id)
-        except Exception as _e:
-            print('⚠️ Falha ao emitir unread counts (webhook):', _e)
+        from socket_handlers import schedule_unread_counts_push
+        schedule_unread_counts_push(target_user_id)
 
 
 @router.get("/meta")
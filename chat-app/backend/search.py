@@ -0,0 +1,260 @@
+"""Busca textual no histórico de mensagens.
+
+A busca roda na coleção `message_search`, com uma entrada por participante de
+cada mensagem (`ownerId`, `peerId`, texto e campos exibidos). O índice de texto
+`search_owner_text` é composto com `ownerId` na frente: a consulta sempre fixa
+o dono, então o Mongo percorre só as entradas do índice daquele usuário para
+os termos buscados (stemming em português, sem acentos), sem materializar os
+resultados de todos os usuários antes de filtrar. As entradas são gravadas junto
+com o read model de conversas (`record_message`/`record_messages`) e as
+mensagens antigas entram pelo backfill `backfill_search_index`.
+
+Os trechos destacados (`highlights`) são calculados aqui, comparando o texto
+normalizado (minúsculo e sem acentos) com os termos da busca, e devolvidos
+como posições `[início, fim)` no texto original.
+"""
+
+import base64
+import json
+import re
+import unicodedata
+from typing import Optional
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from pagination import DIRECTION_BEFORE, fetch_page
+
+SEARCH_ORDERS = ("relevance", "recent")
+
+SEARCH_BACKFILL_MIGRATION_ID = "message_search_backfill"
+
+# Tamanho mínimo de um termo para destacar (evita destacar "a", "e", "o")
+MIN_TERM_CHARS = 2
+
+# Profundidade máxima da paginação por relevância (skip cresce com a página)
+MAX_RELEVANCE_OFFSET = 1000
+
+_WORD_RE = re.compile(r"\w+")
+
+# Sufixos de plural/gênero removidos do termo antes de comparar (já sem acento)
+_SUFFIXES = ("oes", "aes", "ais", "eis", "ao", "ns", "es", "s", "a", "o", "e")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos ("Ação" -> "acao")."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def query_terms(query: str) -> list[str]:
+    """Termos normalizados da busca, sem repetição e na ordem em que aparecem."""
+    terms = []
+    for word in _WORD_RE.findall(normalize(query)):
+        if len(word) >= MIN_TERM_CHARS and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def _stem(term: str) -> str:
+    # Stemming leve, só para destacar as mesmas flexões que o índice encontra
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def highlight_spans(text: str, terms: list[str]) -> list[list[int]]:
+    """
+    Posições `[início, fim)` no texto original das palavras que casam com a busca.
+
+    Uma palavra casa quando sua forma normalizada começa com o radical de um
+    dos termos, o que cobre plurais e flexões encontrados pelo stemming do
+    Mongo ("reunião" destaca "reuniões").
+    """
+    if not text or not terms:
+        return []
+    stems = [_stem(t) for t in terms]
+
+    # Texto normalizado caractere a caractere, com o índice de origem de cada um
+    normalized = []
+    origin = []
+    for i, ch in enumerate(text):
+        for c in normalize(ch):
+            normalized.append(c)
+            origin.append(i)
+    flat = "".join(normalized)
+
+    spans = []
+    for match in _WORD_RE.finditer(flat):
+        word = match.group()
+        if any(word.startswith(stem) for stem in stems):
+            spans.append([origin[match.start()], origin[match.end() - 1] + 1])
+    return spans
+
+
+def _encode_offset(offset: int) -> str:
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_offset(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()))["o"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if offset < 0 or offset > MAX_RELEVANCE_OFFSET:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return offset
+
+
+def search_entries(doc: dict) -> list[dict]:
+    """Entradas de `message_search` de uma mensagem: uma para cada participante."""
+    sender_id = doc.get("userId")
+    recipient_id = doc.get("contactId")
+    if not doc.get("conversationKey") or not sender_id or not recipient_id or not doc.get("text"):
+        return []
+    base = {
+        "messageId": doc["_id"],
+        "text": doc["text"],
+        "author": doc.get("author", ""),
+        "type": doc.get("type", "text"),
+        "userId": sender_id,
+        "contactId": recipient_id,
+        "createdAt": doc.get("createdAt"),
+    }
+    owners = {sender_id: recipient_id, recipient_id: sender_id}
+    return [{**base, "ownerId": owner, "peerId": peer} for owner, peer in owners.items()]
+
+
+async def index_messages(docs: list[dict]) -> None:
+    """Grava as entradas de busca das mensagens (idempotente: upsert por dono/mensagem)."""
+    from database import message_search_collection
+
+    ops = [
+        UpdateOne({"ownerId": entry["ownerId"], "messageId": entry["messageId"]},
+                  {"$setOnInsert": entry}, upsert=True)
+        for doc in docs for entry in search_entries(doc)
+    ]
+    if ops:
+        await message_search_collection.bulk_write(ops, ordered=False)
+
+
+async def backfill_search_index(batch_size: int = 1000) -> int:
+    """
+    Indexa em `message_search` as mensagens gravadas antes da coleção existir.
+
+    Percorre as mensagens em ordem de `_id`, grava o último `_id` em
+    `migrations` (retoma de onde parou) e marca `done` no fim.
+
+    Returns:
+        Número de mensagens lidas nesta execução
+    """
+    from database import db, messages_collection
+
+    migrations = db.migrations
+    state = await migrations.find_one({"_id": SEARCH_BACKFILL_MIGRATION_ID}) or {}
+    if state.get("done"):
+        return 0
+    last_id = state.get("lastId")
+    scanned = 0
+    projection = {"conversationKey": 1, "userId": 1, "contactId": 1, "text": 1, "author": 1,
+                  "type": 1, "createdAt": 1}
+    while True:
+        query = {"conversationKey": {"$ne": None}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await messages_collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        await index_messages(docs)
+        scanned += len(docs)
+        last_id = docs[-1]["_id"]
+        await migrations.update_one({"_id": SEARCH_BACKFILL_MIGRATION_ID}, {"$set": {"lastId": last_id}}, upsert=True)
+
+    await migrations.update_one({"_id": SEARCH_BACKFILL_MIGRATION_ID}, {"$set": {"done": True}}, upsert=True)
+    if scanned:
+        print(f"✅ Índice de busca: {scanned} mensagens indexadas")
+    return scanned
+
+
+def _result(doc: dict, terms: list[str]) -> dict:
+    return {
+        "id": str(doc["messageId"]),
+        "author": doc.get("author", ""),
+        "text": doc.get("text", ""),
+        "timestamp": int(doc["createdAt"].timestamp() * 1000) if doc.get("createdAt") else None,
+        "type": doc.get("type", "text"),
+        "userId": doc.get("userId"),
+        "contactId": doc.get("contactId"),
+        "score": round(doc.get("score", 0.0), 4),
+        "highlights": highlight_spans(doc.get("text", ""), terms),
+    }
+
+
+async def search_messages(
+    collection,
+    user_id: str,
+    query: str,
+    contact_id: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    order: str = "relevance"
+) -> dict:
+    """
+    Busca mensagens do usuário pelo índice de texto.
+
+    Args:
+        collection: Collection Motor `message_search`
+        user_id: Usuário autenticado (só as entradas dele são buscadas)
+        query: Texto da busca
+        contact_id: Restringe a uma conversa
+        limit: Resultados por página
+        cursor: Cursor opaco da página anterior
+        order: "relevance" (score do índice) ou "recent" (mais novas primeiro)
+
+    Returns:
+        {"results": [...], "hasMore": bool, "nextCursor": str|None}
+    """
+    terms = query_terms(query)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Busca vazia")
+    if order not in SEARCH_ORDERS:
+        raise HTTPException(status_code=400, detail="order deve ser 'relevance' ou 'recent'")
+
+    # Igualdade em ownerId: prefixo do índice de texto composto
+    filter_query = {"ownerId": user_id, "$text": {"$search": query, "$language": "portuguese"}}
+    if contact_id:
+        filter_query["peerId"] = contact_id
+    projection = {
+        "messageId": 1, "author": 1, "text": 1, "createdAt": 1, "type": 1, "userId": 1, "contactId": 1,
+        "score": {"$meta": "textScore"},
+    }
+
+    if order == "recent":
+        # Ordem cronológica reversa: paginação keyset como no histórico
+        page = await fetch_page(collection, filter_query, limit, cursor=cursor,
+                                direction=DIRECTION_BEFORE, projection=projection)
+        docs = list(reversed(page.docs))
+        return {
+            "results": [_result(d, terms) for d in docs],
+            "hasMore": page.has_more,
+            "nextCursor": page.next_cursor,
+        }
+
+    offset = _decode_offset(cursor) if cursor else 0
+    find_cursor = (
+        collection.find(filter_query, projection)
+        .sort([("score", {"$meta": "textScore"}), ("createdAt", -1)])
+        .skip(offset)
+        .limit(limit + 1)
+    )
+    docs = await find_cursor.to_list(length=limit + 1)
+    has_more = len(docs) > limit and offset + limit < MAX_RELEVANCE_OFFSET
+    docs = docs[:limit]
+    return {
+        "results": [_result(d, terms) for d in docs],
+        "hasMore": has_more,
+        "nextCursor": _encode_offset(offset + limit) if has_more else None,
+    }
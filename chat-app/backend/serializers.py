@@ -0,0 +1,128 @@
+"""Serialização rápida das respostas de histórico.
+
+As rotas de histórico montam dicts direto dos documentos do Mongo (lidos com
+projeção) e devolvem `ORJSONResponse`. Como a resposta já é um `Response`, o
+FastAPI não passa o conteúdo por `jsonable_encoder` nem revalida contra o
+`response_model` — o modelo fica só na documentação OpenAPI.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from storage import presign_get
+
+# Campos lidos do Mongo para mensagens do chat
+MESSAGE_PROJECTION = {
+    "author": 1,
+    "text": 1,
+    "createdAt": 1,
+    "timestamp": 1,
+    "status": 1,
+    "type": 1,
+    "userId": 1,
+    "contactId": 1,
+    "attachment": 1,
+    "imported": 1,
+}
+
+# Campos lidos do Mongo para mensagens com agentes
+AGENT_MESSAGE_PROJECTION = {
+    "author": 1,
+    "text": 1,
+    "createdAt": 1,
+    "agentKey": 1,
+}
+
+# URLs assinadas valem 1h; reaproveita por 50 min para não assinar a cada página
+PRESIGN_CACHE_SECONDS = 50 * 60
+PRESIGN_CACHE_MAX = 10_000
+_presign_cache: dict[str, tuple[float, str]] = {}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse com orjson (datetime nativo, ObjectId como string)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def cached_presign_get(key: str) -> Optional[str]:
+    """`presign_get` com cache por chave (a assinatura é refeita só perto de expirar)."""
+    now = time.monotonic()
+    hit = _presign_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    url = presign_get(key)
+    if len(_presign_cache) >= PRESIGN_CACHE_MAX:
+        _presign_cache.clear()
+    _presign_cache[key] = (now + PRESIGN_CACHE_SECONDS, url)
+    return url
+
+
+def to_millis(value: Any) -> int:
+    """createdAt (datetime) ou timestamp legado (ms) em milissegundos."""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    return int(value or 0)
+
+
+def _attachment_url(attachment: Any) -> Optional[str]:
+    if not isinstance(attachment, dict):
+        return None
+    if "key" in attachment:
+        try:
+            return cached_presign_get(attachment["key"])
+        except Exception:
+            return attachment.get("url")
+    return attachment.get("url")
+
+
+def message_to_dict(doc: dict) -> dict:
+    """Mensagem do chat no formato da API (mesmos campos de `ConversationMessage`)."""
+    created_at = doc.get("createdAt")
+    data = {
+        "id": str(doc["_id"]),
+        "author": doc.get("author", ""),
+        "text": doc.get("text", ""),
+        "timestamp": to_millis(created_at if created_at is not None else doc.get("timestamp")),
+        "type": doc.get("type", "text"),
+        "status": doc.get("status", "sent"),
+        "userId": doc.get("userId"),
+        "contactId": doc.get("contactId"),
+    }
+    if "attachment" in doc:
+        data["attachment"] = doc["attachment"]
+        data["url"] = _attachment_url(doc["attachment"])
+    if doc.get("imported"):
+        data["imported"] = True
+    return data
+
+
+def agent_message_to_dict(doc: dict) -> dict:
+    """Mensagem do painel de agentes no formato da API."""
+    return {
+        "id": str(doc["_id"]),
+        "author": doc["author"],
+        "text": doc["text"],
+        "timestamp": to_millis(doc.get("createdAt")),
+        "agentKey": doc["agentKey"],
+    }
+
+
+def handover_to_dict(doc: dict) -> dict:
+    """Handover com `_id` renomeado para `id`."""
+    data = dict(doc)
+    data["id"] = str(data.pop("_id"))
+    return data
@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 from datetime import datetime, timezone
 from typing import Optional
@@ -9,45 +10,245 @@ from fastapi import HTTPException
 
 from database import messages_collection, db
 from models import MessageCreate
+from conversations import conversation_key, stamp_conversation_key, record_message, decrement_unread, get_unread_totals
 from storage import presign_get
-from bots.automations import start_scheduler, load_and_schedule_all, handle_keyword_if_matches
-from bots.ai_bot import ask_chatgpt, is_ai_question, clean_bot_mention
+from bots.automations import start_scheduler, load_and_schedule_all
+from bots.ai_bot import is_ai_question
 from bots.agents import (
     get_agent,
     clean_agent_mention,
     generate_agent_suggestions
 )
-from transcription import transcribe_from_s3
-from socket_manager import sio
+from socket_manager import sio, user_room
+import presence
+from typing_throttle import handle_typing_event
+from profile_cache import get_profile
+from bots.reply_worker import reply_pool, guru_reply, transcribe_and_reply
+from streaming import open_stream
+from bots.memory import agent_memory, answered_at
+from state_store import open_agent_session, close_agent_session, is_agent_session_open, set_agent_auto_create
 import traceback
+import logging
+from logging_setup import get_logger, log_event
+from metrics import agent_stage_duration
 
-# Sessões/mapeamentos
-open_agent_sessions = defaultdict(set)
-active_sessions = {}
-user_sessions = {}
-# Prefs por usuário para auto-criação de eventos (user_id, agent_key) -> bool
-agent_auto_create_per_user = {}
+log = get_logger("socket")
 
 # Dono para roteamento de mensagens externas (WhatsApp)
 WA_OWNER_USER_ID = os.getenv("WA_OWNER_USER_ID")
 
+# Janela de debounce do push de não-lidas (uma rajada gera um único evento)
+UNREAD_PUSH_DEBOUNCE_SECONDS = float(os.getenv("UNREAD_PUSH_DEBOUNCE_MS", "250")) / 1000
+_pending_unread_pushes: dict[str, asyncio.Task] = {}
+
+# Janela para agrupar confirmações de leitura de um mesmo usuário
+READ_RECEIPT_WINDOW_SECONDS = float(os.getenv("READ_RECEIPT_WINDOW_MS", "200")) / 1000
+_pending_read_receipts: dict[str, set[str]] = {}
+# Referência às tasks de flush: sem ela a task pode ser coletada no meio do sleep
+_read_receipt_flushes: set[asyncio.Task] = set()
+
 
 def emit_to_user(payload: dict, target_user_id: Optional[str] = None):
-    """Emite mensagem apenas para o usuário especificado, se conectado."""
+    """Emite mensagem para todos os sockets do usuário especificado (ou broadcast sem usuário)."""
     if target_user_id:
-        target_sid = user_sessions.get(target_user_id)
-        if target_sid:
-            return sio.emit("chat:new-message", payload, room=target_sid)
-        return None
+        return sio.emit("chat:new-message", payload, room=user_room(target_user_id))
     return sio.emit("chat:new-message", payload)
 
 
+async def emit_unread_counts_for_user(user_id: str):
+    """Emite para os sockets do usuário a contagem de conversas e mensagens não-lidas."""
+    try:
+        payload = await get_unread_totals(user_id)
+        await sio.emit("chat:unread-updated", payload, room=user_room(user_id))
+        return payload
+    except Exception as e:
+        print(f"❌ Erro ao emitir unread counts para {user_id}: {e}")
+        return None
+
+
+def schedule_unread_counts_push(user_id: Optional[str]) -> None:
+    """
+    Agenda o push de não-lidas para o usuário, agrupando chamadas próximas.
+
+    Enquanto houver um push pendente para o usuário, novas chamadas são
+    ignoradas: 50 mensagens de WhatsApp em sequência geram um único
+    `chat:unread-updated` com os totais já atualizados.
+    """
+    if not user_id or user_id in _pending_unread_pushes:
+        return
+
+    async def _push():
+        try:
+            await asyncio.sleep(UNREAD_PUSH_DEBOUNCE_SECONDS)
+        finally:
+            # Sai da fila antes de ler os totais: incrementos durante o emit agendam outro push
+            _pending_unread_pushes.pop(user_id, None)
+        await emit_unread_counts_for_user(user_id)
+
+    _pending_unread_pushes[user_id] = asyncio.create_task(_push())
+
+
+def queue_read_receipts(user_id: Optional[str], message_ids: list) -> None:
+    """
+    Acumula confirmações de leitura do usuário e agenda um único flush.
+
+    Chamadas dentro da janela (`READ_RECEIPT_WINDOW_MS`) entram no mesmo lote.
+    """
+    ids = {str(i) for i in message_ids or [] if ObjectId.is_valid(str(i))}
+    if not user_id or not ids:
+        return
+    pending = _pending_read_receipts.get(user_id)
+    if pending is not None:
+        pending.update(ids)
+        return
+    _pending_read_receipts[user_id] = ids
+
+    async def _flush_later():
+        await asyncio.sleep(READ_RECEIPT_WINDOW_SECONDS)
+        batch = _pending_read_receipts.pop(user_id, set())
+        try:
+            await flush_read_receipts(user_id, batch)
+        except Exception as e:
+            print(f"❌ Erro ao gravar confirmações de leitura de {user_id}: {e}")
+
+    task = asyncio.create_task(_flush_later())
+    _read_receipt_flushes.add(task)
+    task.add_done_callback(_read_receipt_flushes.discard)
+
+
+async def flush_read_receipts(user_id: str, message_ids) -> int:
+    """
+    Grava um lote de confirmações de leitura e avisa só quem enviou as mensagens.
+
+    Só mensagens recebidas pelo usuário (`contactId == user_id`) são marcadas;
+    o `chat:read` vai para o remetente de cada conversa, não para todos.
+
+    Returns:
+        Quantidade de mensagens marcadas como lidas
+    """
+    scope = {
+        "_id": {"$in": [ObjectId(i) for i in message_ids]},
+        "contactId": user_id,
+        "status": {"$ne": "read"},
+    }
+    unread_docs = await messages_collection.find(scope, {"userId": 1}).to_list(None)
+    if not unread_docs:
+        return 0
+    await messages_collection.update_many(scope, {"$set": {"status": "read"}})
+
+    ids_by_sender = defaultdict(list)
+    for d in unread_docs:
+        if d.get("userId"):
+            ids_by_sender[d["userId"]].append(str(d["_id"]))
+    for sender_id, ids in ids_by_sender.items():
+        await decrement_unread(user_id, sender_id, len(ids))
+        await sio.emit("chat:read", {"ids": ids, "readBy": user_id}, room=user_room(sender_id))
+    schedule_unread_counts_push(user_id)
+    log_event(log, "chat.mark_read", logging.DEBUG, sampled=True, user=user_id, count=len(unread_docs))
+    return len(unread_docs)
+
+
+# Follow-ups do pipeline de agentes (persistência, sugestões) fora do caminho crítico
+_agent_followups: set[asyncio.Task] = set()
+
+
+def _spawn_followup(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _agent_followups.add(task)
+    task.add_done_callback(_agent_followups.discard)
+    return task
+
+
+def _serialize_entities(entities_obj: dict) -> list:
+    result = []
+    if not entities_obj:
+        return result
+    for k, v in entities_obj.items():
+        result.append({
+            "type": v.type,
+            "key": k,
+            "value": v.value,
+            "normalized": getattr(v, "normalized", None),
+            "valid": getattr(v, "valid", True),
+            "metadata": getattr(v, "metadata", {})
+        })
+    return result
+
+
+async def _load_agent_inputs(user_id: str, agent_key: str, contact_id: Optional[str]):
+    """Contexto da conversa (resumo + cauda), histórico do agente e mensagens gerais, em paralelo."""
+    from bots.summaries import summary_context
+    from database import agent_messages_collection, messages_collection
+
+    async def load_context():
+        if not contact_id:
+            return []
+        try:
+            return await summary_context(user_id, contact_id)
+        except Exception as ctx_error:
+            print(f"⚠️ [Agent] Erro ao buscar contexto: {ctx_error}")
+            return []
+
+    async def load_agent_history():
+        return await agent_messages_collection.find({
+            "userId": user_id,
+            "agentKey": agent_key,
+            "contactId": contact_id
+        }).sort("createdAt", -1).limit(50).to_list(50)
+
+    async def load_general_history():
+        if not contact_id:
+            return []
+        return await messages_collection.find({
+            "conversationKey": conversation_key(user_id, contact_id)
+        }).sort([("createdAt", -1), ("_id", -1)]).limit(50).to_list(50)
+
+    return await asyncio.gather(load_context(), load_agent_history(), load_general_history())
+
+
+async def _persist_agent_turn(docs: list[dict]) -> None:
+    from database import agent_messages_collection
+    started = time.perf_counter()
+    try:
+        await agent_messages_collection.insert_many(docs, ordered=True)
+    except Exception as e:
+        print(f"❌ [Agent] Erro ao salvar mensagens do agente: {e}")
+    finally:
+        agent_stage_duration.observe(time.perf_counter() - started, "persist")
+
+
+async def _emit_agent_suggestions(suggestions_task: asyncio.Task, started: float, user_id: str,
+                                  message_id: str, agent_key: str, contact_id: Optional[str]) -> None:
+    try:
+        suggestions = await suggestions_task
+    except Exception as e:
+        print(f"⚠️ Erro ao gerar sugestões: {e}")
+        return
+    # Desde o início do pipeline: quanto depois da resposta as sugestões chegam
+    agent_stage_duration.observe(time.perf_counter() - started, "suggestions")
+    if suggestions:
+        await sio.emit("agent:suggestions", {
+            "messageId": message_id,
+            "agentKey": agent_key,
+            "contactId": contact_id,
+            "suggestions": suggestions
+        }, room=user_room(user_id))
+
+
 async def process_agent_message(sid, data):
     """
     Handler para mensagens enviadas aos agentes IA com contexto da conversa.
     Modularized into a module-level function so it can be tested directly.
+
+    Pipeline: as três leituras do Mongo rodam em paralelo; as sugestões são
+    geradas junto com a resposta (não dependem dela) e chegam depois em
+    `agent:suggestions`; `agent:message` sai assim que a resposta fica pronta
+    e as duas mensagens (usuário e agente) são gravadas com um único
+    `insert_many` em background. Cada etapa vai para
+    `chat_agent_stage_duration_seconds`.
     """
-    print(f"📨 [Agent] Mensagem recebida de {sid}: {data}")
+    log_event(log, "agent.message", sampled=True, sid=sid, agent=data.get("agentKey"),
+              size=len(data.get("message") or ""))
     
     agent_key = data.get("agentKey")
     message = data.get("message", "").strip()
@@ -68,63 +269,64 @@ async def process_agent_message(sid, data):
     if not agent:
         await sio.emit("agent:error", {"error": f"Agente '{agent_key}' não encontrado"}, to=sid)
         return
+    # Chave canônica (a da memória): "Advogado" e "advogado" são a mesma conversa
+    agent_key = agent.key
 
     try:
-        # Build conversation context
-        from bots.context_loader import get_conversation_context
         from bots.entities import extract_entities
-        from database import agent_messages_collection, messages_collection
 
-        conversation_context = []
-        if contact_id:
-            try:
-                conversation_context = await get_conversation_context(user_id=user_id, contact_id=contact_id, limit=20, hours_back=24)
-            except Exception as ctx_error:
-                print(f"⚠️ [Agent] Erro ao buscar contexto: {ctx_error}")
+        asked_at = datetime.utcnow()
+        started = time.perf_counter()
+        conversation_context, history_docs, general_docs = await _load_agent_inputs(user_id, agent_key, contact_id)
+        loaded = time.perf_counter()
+        agent_stage_duration.observe(loaded - started, "load")
 
-        # Merge agent messages history
-        history_docs = await agent_messages_collection.find({
-            "userId": user_id,
-            "agentKey": agent_key,
-            "contactId": contact_id
-        }).sort("createdAt", -1).limit(50).to_list(50)
-        # reverse so earlier messages come first
-        agent_msgs_texts = [d.get("text", "") for d in reversed(history_docs or [])]
+        # Sugestões só dependem do contexto: rodam em paralelo com a resposta
+        suggestions_task = asyncio.create_task(
+            generate_agent_suggestions(agent, conversation_context or [], user_id, user_name, n_suggestions=3)
+        )
 
-        # Compose conversation_text for entity extraction
-        general_history_texts = []
-        if contact_id:
-            general_docs = await messages_collection.find({
-                "$or": [
-                    {"userId": user_id, "contactId": contact_id},
-                    {"userId": contact_id, "contactId": user_id}
-                ]
-            }).sort("createdAt", -1).limit(50).to_list(50)
-            general_history_texts = [d.get("text", "") for d in reversed(general_docs or [])]
-
-        conversation_text = " ".join([*(agent_msgs_texts or []), *(general_history_texts or [])])
+        # Compose conversation_text for entity extraction (ordem cronológica)
+        agent_msgs_texts = [d.get("text", "") for d in reversed(history_docs or [])]
+        general_history_texts = [d.get("text", "") for d in reversed(general_docs or [])]
+        conversation_text = " ".join([*agent_msgs_texts, *general_history_texts])
         if conversation_text.strip():
             conversation_text += " " + message
         else:
             conversation_text = message
-
-        # Extract simple entities
         entities = extract_entities(conversation_text)
 
-        # Build response using agent (with context when available)
-        if conversation_context:
-            base_response = await agent.ask_with_context(
-                message=message,
-                user_id=user_id,
-                user_name=user_name,
-                contact_id=contact_id,
-                conversation_context=conversation_context
-            )
-        else:
-            base_response = await agent.ask(message=message, user_id=user_id, user_name=user_name)
-
-        # Persist simple user + agent messages (agent messages get _id)
-        from datetime import datetime
+        # Build response using agent (with context when available).
+        # Com streaming, o texto vai em agent:message-delta enquanto é gerado;
+        # o agent:message final (mesmo streamId) é o único persistido.
+        stream = open_stream("agent:message-delta", user_room(user_id), agentKey=agent_key,
+                             contactId=contact_id, author=agent.get_display_name())
+        stream_kwargs = {"on_delta": stream.push} if stream else {}
+        try:
+            if conversation_context:
+                base_response = await agent.ask_with_context(
+                    message=message,
+                    user_id=user_id,
+                    user_name=user_name,
+                    contact_id=contact_id,
+                    conversation_context=conversation_context,
+                    save_history=False,
+                    **stream_kwargs
+                )
+            else:
+                base_response = await agent.ask(message=message, user_id=user_id, user_name=user_name,
+                                                contact_id=contact_id, save_history=False, **stream_kwargs)
+        except Exception:
+            suggestions_task.cancel()
+            raise
+        if stream:
+            await stream.flush()
+        answered = time.perf_counter()
+        agent_stage_duration.observe(answered - loaded, "answer")
+
+        # _id gerado aqui: o evento sai antes da gravação
+        now = answered_at(asked_at)
+        agent_msg_id = ObjectId()
         user_msg_doc = {
             "agentKey": agent_key,
             "userId": user_id,
@@ -132,110 +334,146 @@ async def process_agent_message(sid, data):
             "author": user_name,
             "text": message,
             "role": "user",
-            "createdAt": datetime.utcnow()
+            "createdAt": asked_at
         }
-        await agent_messages_collection.insert_one(user_msg_doc)
-
         agent_msg_doc = {
+            "_id": agent_msg_id,
             "agentKey": agent_key,
             "userId": user_id,
             "contactId": contact_id,
             "author": agent.get_display_name(),
             "text": base_response,
             "role": "assistant",
-            "createdAt": datetime.utcnow()
+            "createdAt": now
         }
-        result = await agent_messages_collection.insert_one(agent_msg_doc)
-
-        # Try to generate suggestions but continue on failure
-        suggestions = []
-        try:
-            suggestions = await generate_agent_suggestions(agent, conversation_context or [], user_id, user_name, n_suggestions=3)
-        except Exception as e:
-            print(f"⚠️ Erro ao gerar sugestões: {e}")
-            traceback.print_exc()
-
-        def _serialize_entities(entities_obj: dict) -> list:
-            result = []
-            if not entities_obj:
-                return result
-            for k, v in entities_obj.items():
-                result.append({
-                    "type": v.type,
-                    "key": k,
-                    "value": v.value,
-                    "normalized": getattr(v, "normalized", None),
-                    "valid": getattr(v, "valid", True),
-                    "metadata": getattr(v, "metadata", {})
-                })
-            return result
-
-        serialized_entities = _serialize_entities(entities or {})
 
         # Emit response
+        # Vai para todas as abas do usuário (o painel do agente fica sincronizado)
         await sio.emit("agent:message", {
-            "id": str(result.inserted_id),
+            "id": str(agent_msg_id),
             "agentKey": agent_key,
             "contactId": contact_id,
             "author": agent.get_display_name(),
             "text": base_response,
-            "timestamp": int(datetime.utcnow().timestamp() * 1000),
+            "streamId": stream.id if stream else None,
+            "timestamp": int(now.timestamp() * 1000),
             "nlp": {
                 "intent": None,
                 "confidence": None,
-                "entities": serialized_entities
+                "entities": _serialize_entities(entities or {})
             },
-            "suggestions": suggestions
-        }, to=sid)
+            "suggestions": []
+        }, room=user_room(user_id))
+        emitted = time.perf_counter()
+        agent_stage_duration.observe(emitted - started, "total")
+        log_event(log, "agent.pipeline", sampled=True, agent=agent_key,
+                  load_ms=round((loaded - started) * 1000, 1),
+                  answer_ms=round((answered - loaded) * 1000, 1),
+                  total_ms=round((emitted - started) * 1000, 1))
+
+        # Memória do agente já vê o turno; a gravação (fonte da memória) vai em background
+        agent_memory.remember(user_id, agent.key, contact_id, [user_msg_doc, agent_msg_doc])
+        _spawn_followup(_persist_agent_turn([user_msg_doc, agent_msg_doc]))
+        _spawn_followup(_emit_agent_suggestions(suggestions_task, started, user_id, str(agent_msg_id),
+                                                agent_key, contact_id))
     except Exception as e:
         print(f"❌ [Agent] Error processing message: {e}")
-        import traceback
         traceback.print_exc()
         await sio.emit("agent:error", {"error": f"Erro ao processar: {str(e)}"}, to=sid)
 
 
+async def process_summary_request(sid, data):
+    """
+    Pedido de resumo do painel de agentes.
+
+    Com contato, o resumo incremental gravado (bots/summaries.py) sai na hora;
+    se já há mensagens depois dele, vai com `stale: true` e a versão
+    atualizada chega em seguida em outro `agent:summary`.
+    """
+    try:
+        environ = sio.get_environ(sid) or {}
+        user_id = environ.get("user_id")
+        user_name = environ.get("user_name") or "Usuário"
+        agent_key = data.get("agentKey")
+        contact_id = data.get("contactId")
+
+        if not agent_key or not user_id:
+            await sio.emit("agent:error", {"error": "Dados inválidos"}, to=sid)
+            return
+
+        from bots.agents import get_agent, generate_conversation_summary
+        agent = await get_agent(agent_key, user_id)
+        if not agent:
+            await sio.emit("agent:error", {"error": "Agente não encontrado"}, to=sid)
+            return
+
+        async def emit_summary(summary: str, stale: bool = False):
+            await sio.emit("agent:summary", {
+                "agentKey": agent_key,
+                "contactId": contact_id,
+                "summary": summary,
+                "stale": stale
+            }, to=sid)
+
+        if not contact_id:
+            await emit_summary(await generate_conversation_summary(agent, [], user_id, user_name))
+            return
+
+        from bots.summaries import get_summary, has_new_messages, refresh_summary, track
+        track(user_id, contact_id)
+        stored = await get_summary(user_id, contact_id)
+        if stored and stored.get("summary"):
+            stale = await has_new_messages(user_id, contact_id, stored.get("cursor"))
+            await emit_summary(stored["summary"], stale)
+            if not stale:
+                return
+
+        refreshed = await refresh_summary(user_id, contact_id)
+        if refreshed and refreshed.get("summary"):
+            await emit_summary(refreshed["summary"])
+        else:
+            await emit_summary("📭 Não há mensagens recentes nesta conversa para resumir.")
+    except Exception as e:
+        print(f"❌ agent:request-summary error: {e}")
+        traceback.print_exc()
+        await sio.emit("agent:error", {"error": str(e)}, to=sid)
+
+
 def register_socket_handlers():
     @sio.event
     async def connect(sid, environ, auth):
         from auth import decode_token
 
-        print(f"🔌 Tentativa de conexão: {sid}")
         token = (auth or {}).get("token")
         if not token:
-            print(f"❌ Conexão rejeitada: sem token - {sid}")
+            log_event(log, "socket.rejected", logging.WARNING, sid=sid, reason="no_token")
             return False
         try:
             payload = decode_token(token)
             user_id = payload["sub"]
-            user = await db.users.find_one({"_id": ObjectId(user_id)})
-            if not user:
-                print(f"❌ Usuário não encontrado: {user_id} - {sid}")
+            # Perfil vem do cache (reconexões não consultam o Mongo de novo)
+            user = await get_profile(db, user_id)
+            if not user or user["external"]:
+                log_event(log, "socket.rejected", logging.WARNING, sid=sid, user=user_id, reason="unknown_user")
                 return False
             environ["user_id"] = user_id
-            environ["user_name"] = user.get("name", "Usuário")
-            environ["user_email"] = user.get("email", "")
-            active_sessions[sid] = user_id
-            user_sessions[user_id] = sid
-            await sio.emit('user:online', {'userId': user_id}, skip_sid=sid)
-            print(f"✅ Socket autenticado: {user.get('name')} ({user_id}) - sid: {sid}")
-            print(f"👥 Usuários online: {len(user_sessions)}")
+            environ["user_name"] = user.get("name") or "Usuário"
+            environ["user_email"] = user.get("email") or ""
+            await sio.enter_room(sid, user_room(user_id))
+            await presence.user_connected(user_id, sid)
+            log_event(log, "socket.connected", sampled=True, sid=sid, user=user_id)
             return True
         except Exception as e:
-            print(f"❌ Token inválido: {e} - {sid}")
-            traceback.print_exc()
+            log_event(log, "socket.rejected", logging.WARNING, sid=sid, reason="invalid_token", error=e)
             return False
 
     @sio.event
     async def disconnect(sid):
-        print(f"🔌 Cliente desconectado: {sid}")
-        if sid in active_sessions:
-            user_id = active_sessions[sid]
-            del active_sessions[sid]
-            if user_id in user_sessions:
-                del user_sessions[user_id]
-            await sio.emit('user:offline', {'userId': user_id})
-            print(f"👤 Usuário {user_id} desconectado")
-            print(f"👥 Usuários online: {len(user_sessions)}")
+        log_event(log, "socket.disconnected", sampled=True, sid=sid)
+        user_id = (sio.get_environ(sid) or {}).get("user_id")
+        if not user_id:
+            return
+        await presence.user_disconnected(user_id, sid)
 
     @sio.on("chat:typing")
     async def handle_typing(sid, data):
@@ -244,18 +482,9 @@ def register_socket_handlers():
             user_id = environ.get("user_id", "anonymous")
             contact_id = data.get("contactId")
             if contact_id:
-                contact_sid = user_sessions.get(contact_id)
-                if contact_sid:
-                    await sio.emit("chat:typing", {
-                        "userId": user_id,
-                        "author": data.get("author"),
-                        "isTyping": data.get("isTyping", False)
-                    }, room=contact_sid)
-                    print(f"⌨️  Typing event: {user_id} → {contact_id} - {data.get('isTyping')}")
-                else:
-                    print(f"📪 Contato {contact_id} offline - typing ignorado")
+                await handle_typing_event(user_id, contact_id, data.get("author"), bool(data.get("isTyping", False)))
             else:
-                print(f"⚠️  Typing sem contactId - ignorado")
+                log_event(log, "chat.typing.no_contact", logging.DEBUG, sampled=True, sid=sid)
         except Exception as e:
             print(f"❌ Erro chat:typing: {e}")
             traceback.print_exc()
@@ -263,16 +492,8 @@ def register_socket_handlers():
     @sio.on("chat:mark-read")
     async def handle_mark_read(sid, data):
         try:
-            environ = sio.get_environ(sid)
-            user_id = environ.get("user_id", "anonymous")
-            message_ids = data.get("ids", [])
-            if not message_ids:
-                return
-            await sio.emit("chat:read", {
-                "ids": message_ids,
-                "readBy": user_id
-            }, skip_sid=sid)
-            print(f"👁️ Mensagens marcadas como lidas por {user_id}: {len(message_ids)} msgs")
+            environ = sio.get_environ(sid) or {}
+            queue_read_receipts(environ.get("user_id"), data.get("ids", []))
         except Exception as e:
             print(f"❌ Erro chat:mark-read: {e}")
             traceback.print_exc()
@@ -280,7 +501,8 @@ def register_socket_handlers():
     @sio.on("chat:send")
     async def handle_chat_send(sid, data):
         try:
-            print(f"📨 Mensagem recebida de {sid}: {data}")
+            log_event(log, "chat.send", sampled=True, sid=sid, contact=data.get("contactId"),
+                      size=len(data.get("text") or ""))
             environ = sio.get_environ(sid)
             user_id = environ.get("user_id", "anonymous")
             temp_id = data.get("tempId")
@@ -292,13 +514,13 @@ def register_socket_handlers():
             # Agents should be invoked only via the Agent Panel (agent:send) or via the frontend UI.
 
             text_lower = text.lower().strip()
-            in_guru_session = ('guru' in open_agent_sessions.get(user_id, set()))
+            in_guru_session = await is_agent_session_open(user_id, 'guru')
             is_ai_query = is_ai_question(text)
 
             # Agents should be invoked only via panel (agent:open/agent:close) or when
             # an AI question is detected. Inline @agent controls are deprecated and removed.
             if in_guru_session or is_ai_query:
-                print(f"🧠 Mensagem para Guru detectada - pulando persistência no banco")
+                log_event(log, "chat.send.guru", logging.DEBUG, sampled=True, user=user_id)
             else:
                 message_create = MessageCreate(**data)
                 now = datetime.now(timezone.utc)
@@ -311,7 +533,9 @@ def register_socket_handlers():
                     "contactId": message_create.contactId,
                     "createdAt": now
                 }
+                stamp_conversation_key(doc)
                 result = await messages_collection.insert_one(doc)
+                await record_message(doc)
                 message_id = str(result.inserted_id)
                 response = {
                     "id": message_id,
@@ -333,68 +557,35 @@ def register_socket_handlers():
                     "timestamp": response["timestamp"]
                 }, room=sid)
                 if message_create.contactId:
-                    contact_sid = user_sessions.get(message_create.contactId)
-                    if contact_sid:
-                        await sio.emit("chat:new-message", response, room=contact_sid)
-                    else:
-                        print(f"📪 Contato {message_create.contactId} está offline - mensagem salva")
+                    await sio.emit("chat:new-message", response, room=user_room(message_create.contactId))
+                    # Outras abas do remetente também recebem a mensagem enviada
+                    await sio.emit("chat:new-message", response, room=user_room(user_id), skip_sid=sid)
                     # Atualiza contadores de não-lidas para o destinatário (push)
-                    try:
-                        await emit_unread_counts_for_user(message_create.contactId)
-                    except Exception as _e:
-                        print("⚠️ Falha ao emitir unread counts para destinatário:", _e)
+                    schedule_unread_counts_push(message_create.contactId)
                 else:
                     await sio.emit("chat:new-message", response, skip_sid=sid)
-                await asyncio.sleep(0.2)
                 await sio.emit("chat:delivered", {"id": message_id}, room=sid)
+                # Transcrição (e resposta do Guru) fora do handler
                 if message_create.type == "audio" and ("attachment" in doc):
-                    from bots.automations import publish_message
-                    transcription = await transcribe_from_s3(
-                        doc["attachment"]["key"],
-                        doc["attachment"]["bucket"]
-                    )
-                    if transcription and not transcription.startswith("["):
-                        if is_ai_question(transcription):
-                            await sio.emit("chat:typing", {"author": "Guru", "isTyping": True}, room=sid)
-                            await asyncio.sleep(0.8)
-                            clean_text = clean_bot_mention(transcription)
-                            ai_response = await ask_chatgpt(clean_text, user_id, author)
-                            typing_time = len(ai_response) / 50
-                            typing_time = max(1.5, min(typing_time, 5.0))
-                            await asyncio.sleep(typing_time)
-                            await sio.emit("chat:typing", {"author": "Guru", "isTyping": False}, room=sid)
-                            response_text = f'🎤 _Áudio transcrito:_ "{transcription}"\n\n{ai_response}'
-                            await publish_message(sio.emit, author="Guru 🧠", text=response_text, user_id=user_id, target_sid=sid)
-                            return
+                    attachment = doc["attachment"]
+                    accepted = reply_pool.submit(user_id, lambda: transcribe_and_reply(
+                        user_id, author, attachment["key"], attachment["bucket"], message_create.contactId
+                    ), label="transcription")
+                    if not accepted:
+                        # O áudio foi entregue; só a transcrição (e a resposta do Guru) ficou de fora
+                        await sio.emit("error", {
+                            "message": "Transcrição do áudio indisponível no momento, tente novamente em instantes",
+                            "tempId": temp_id
+                        }, room=sid)
                 return
 
-            await handle_keyword_if_matches(sio.emit, text)
-
-            # Note: Starting and ending Guru sessions via inline commands is deprecated.
-            # Use the agent panel (agent:open/agent:close) instead to open or close agent sessions.
-
-            in_guru_session = ('guru' in open_agent_sessions.get(user_id, set()))
-            if is_ai_question(text) or in_guru_session:
-                from bots.automations import publish_message
-                import random
-                clean_text = clean_bot_mention(text)
-                await sio.emit("chat:typing", {"author": "Guru", "isTyping": True}, room=sid)
-                question_length = len(clean_text)
-                has_code_words = any(word in clean_text.lower() for word in ["código", "code", "python", "javascript", "função", "class"])
-                has_question_mark = "?" in clean_text
-                if question_length > 100 or has_code_words:
-                    thinking_time = random.uniform(1.2, 2.0)
-                elif question_length > 50:
-                    thinking_time = random.uniform(0.8, 1.5)
-                else:
-                    thinking_time = random.uniform(0.5, 1.0)
-                await asyncio.sleep(thinking_time)
-                ai_response = await ask_chatgpt(clean_text, user_id, author)
-                typing_time = len(ai_response) / 50
-                typing_time = max(1.5, min(typing_time, 5.0))
-                await asyncio.sleep(typing_time)
-                await sio.emit("chat:typing", {"author": "Guru", "isTyping": False}, room=sid)
-                await publish_message(sio.emit, author="Guru 🧠", text=ai_response, user_id=user_id, target_sid=sid)
+            # Automações e resposta do Guru rodam no pool; o handler só enfileira
+            accepted = reply_pool.submit(user_id, lambda: guru_reply(user_id, author, text, contact_id), label="guru")
+            if not accepted:
+                await sio.emit("error", {
+                    "message": "Guru está ocupado, tente novamente em instantes",
+                    "tempId": temp_id
+                }, room=sid)
         except Exception as e:
             print(f"❌ Erro ao processar mensagem: {e}")
             traceback.print_exc()
@@ -406,63 +597,14 @@ def register_socket_handlers():
     @sio.on("chat:read")
     async def handle_chat_read(sid, data):
         try:
-            message_ids = data.get("ids", [])
-            if not message_ids:
-                return
-            object_ids = [ObjectId(id) for id in message_ids if ObjectId.is_valid(id)]
-            result = await messages_collection.update_many(
-                {"_id": {"$in": object_ids}},
-                {"$set": {"status": "read"}}
-            )
-            await sio.emit("chat:read", {"ids": message_ids})
-            print(f"👁️ Mensagens marcadas como lidas: {result.modified_count}")
-
-            # Emite atualização de contadores para o usuário que marcou como lido
-            try:
-                environ = sio.get_environ(sid) or {}
-                user_id = environ.get("user_id")
-                if user_id:
-                    await emit_unread_counts_for_user(user_id)
-            except Exception as _e:
-                print("⚠️ Falha ao emitir unread counts após chat:read:", _e)
+            environ = sio.get_environ(sid) or {}
+            queue_read_receipts(environ.get("user_id"), data.get("ids", []))
         except Exception as e:
             print(f"❌ Erro em chat:read: {e}")
 
     async def wrapper_process_agent_message(sid, data):
         await process_agent_message(sid, data)
 
-    async def emit_unread_counts_for_user(user_id: str):
-        """Calcula e emite para o usuário conectado a contagem de conversas e mensagens não-lidas."""
-        try:
-            # Filtra mensagens dirigidas ao usuário que não estão marcadas como 'read'
-            filter_query = {"contactId": user_id, "status": {"$ne": "read"}}
-            unread_messages = await messages_collection.count_documents(filter_query)
-            try:
-                distinct_senders = await messages_collection.distinct("userId", filter_query)
-                distinct_senders = [s for s in distinct_senders if s]
-                unread_conversations = len(distinct_senders)
-            except Exception:
-                # Fallback: carrega e calcula manualmente
-                cursor = messages_collection.find(filter_query, {"userId": 1})
-                rows = await cursor.to_list(None)
-                senders = set(r.get("userId") for r in rows if r.get("userId"))
-                unread_conversations = len(senders)
-
-            target_sid = user_sessions.get(user_id)
-            payload = {
-                "unreadConversations": unread_conversations,
-                "unreadMessages": unread_messages
-            }
-            if target_sid:
-                await sio.emit("chat:unread-updated", payload, room=target_sid)
-            else:
-                # opcional: caso deseje broadcast global, mas aqui apenas logamos
-                print(f"📪 Usuario {user_id} offline - unread counts calculado: {payload}")
-            return payload
-        except Exception as e:
-            print(f"❌ Erro ao emitir unread counts para {user_id}: {e}")
-            return None
-
     @sio.on("agent:send")
     async def handle_agent_message(sid, data):
         """Wrapper that calls process_agent_message; this improves testability."""
@@ -472,39 +614,7 @@ def register_socket_handlers():
 
     @sio.on("agent:request-summary")
     async def handle_agent_request_summary(sid, data):
-        try:
-            environ = sio.get_environ(sid)
-            user_id = environ.get("user_id")
-            user_name = environ.get("user_name") or "Usuário"
-            agent_key = data.get("agentKey")
-            contact_id = data.get("contactId")
-
-            if not agent_key or not user_id:
-                await sio.emit("agent:error", {"error": "Dados inválidos"}, to=sid)
-                return
-
-            from bots.agents import get_agent, generate_conversation_summary
-            agent = await get_agent(agent_key, user_id)
-            if not agent:
-                await sio.emit("agent:error", {"error": "Agente não encontrado"}, to=sid)
-                return
-
-            conversation_context = None
-            if contact_id:
-                from bots.context_loader import get_conversation_context
-                conversation_context = await get_conversation_context(user_id, contact_id, limit=40, hours_back=72)
-
-            summary = await generate_conversation_summary(agent, conversation_context or [], user_id, user_name)
-
-            await sio.emit("agent:summary", {
-                "agentKey": agent_key,
-                "contactId": contact_id,
-                "summary": summary
-            }, to=sid)
-        except Exception as e:
-            print(f"❌ agent:request-summary error: {e}")
-            traceback.print_exc()
-            await sio.emit("agent:error", {"error": str(e)}, to=sid)
+        await process_summary_request(sid, data)
 
     @sio.on("agent:set-auto-create")
     async def handle_agent_set_auto_create(sid, data):
@@ -515,8 +625,8 @@ def register_socket_handlers():
             auto_create = bool(data.get("autoCreate", False))
             if not user_id or not agent_key:
                 return
-            agent_auto_create_per_user[(user_id, agent_key.lower())] = auto_create
-            print(f"🔁 Auto-create set for {user_id}/{agent_key}: {auto_create}")
+            await set_agent_auto_create(user_id, agent_key, auto_create)
+            log_event(log, "agent.auto_create", user=user_id, agent=agent_key, value=auto_create)
             await sio.emit("agent:auto-create-updated", {"agentKey": agent_key, "autoCreate": auto_create}, to=sid)
         except Exception as e:
             print(f"❌ agent:set-auto-create error: {e}")
@@ -610,18 +720,17 @@ def register_socket_handlers():
             user_id = environ.get("user_id")
             agent_key = data.get("agentKey")
             contact_id = data.get("contactId")
-            print(f"🔓 Agent open request: user={user_id}, agentKey={agent_key}, contactId={contact_id}")
             if not user_id or not agent_key:
                 return
             # Ativa sessão para Guru (agora controlada via agent:open/agent:close)
             if agent_key:
-                open_agent_sessions[user_id].add(agent_key.lower())
-                print(f"🧠 Sessão do agente '{agent_key}' ativada para user {user_id}")
+                await open_agent_session(user_id, agent_key)
+                log_event(log, "agent.open", user=user_id, agent=agent_key, contact=contact_id)
                 await sio.emit("agent:opened", {"agentKey": agent_key}, room=sid)
-                # Se o usuário pediu por auto-create em sessão (persistido em agent_auto_create_per_user), atualiza mapa
+                # Se o usuário pediu por auto-create em sessão, guarda a preferência no state store
                 pref = data.get('autoCreate', None)
                 if pref is not None:
-                    agent_auto_create_per_user[(user_id, agent_key.lower())] = bool(pref)
+                    await set_agent_auto_create(user_id, agent_key, bool(pref))
         except Exception as e:
             print(f"❌ Agent open error: {e}")
 
@@ -633,16 +742,14 @@ def register_socket_handlers():
             user_id = environ.get("user_id")
             agent_key = data.get("agentKey")
             contact_id = data.get("contactId")
-            print(f"🔒 Agent close request: user={user_id}, agentKey={agent_key}, contactId={contact_id}")
             if not user_id or not agent_key:
                 return
             if agent_key:
-                open_agent_sessions[user_id].discard(agent_key.lower())
-                print(f"🧠 Sessão do agente '{agent_key}' desativada para user {user_id}")
+                await close_agent_session(user_id, agent_key)
+                log_event(log, "agent.close", user=user_id, agent=agent_key, contact=contact_id)
                 await sio.emit("agent:closed", {"agentKey": agent_key}, room=sid)
                 # Optional: clean up applied preferences
-                if (user_id, agent_key.lower()) in agent_auto_create_per_user:
-                    del agent_auto_create_per_user[(user_id, agent_key.lower())]
+                await set_agent_auto_create(user_id, agent_key, None)
         except Exception as e:
             print(f"❌ Agent close error: {e}")
 
@@ -1,5 +1,10 @@
 import socketio
 import os
+import time
+
+from outbound import OutboundManager, OutboundRedisManager
+from logging_setup import SOCKETIO_LOGGER, ENGINEIO_LOGGER
+from metrics import socket_events, socket_duration
 
 # Configurar Redis adapter para clustering (múltiplas instâncias)
 REDIS_URL = os.getenv("REDIS_URL")
@@ -7,21 +12,50 @@ REDIS_URL = os.getenv("REDIS_URL")
 if REDIS_URL:
     # Com Redis: suporta múltiplas instâncias da API
     print(f"✅ Socket.IO configurado com Redis adapter: {REDIS_URL}")
-    client_manager = socketio.AsyncRedisManager(REDIS_URL)
+    client_manager = OutboundRedisManager(REDIS_URL)
 else:
     # Sem Redis: apenas uma instância (desenvolvimento)
     print("⚠️  Socket.IO sem Redis - apenas 1 instância suportada")
-    client_manager = None
+    client_manager = OutboundManager()
+
+
+class InstrumentedServer(socketio.AsyncServer):
+    """AsyncServer que mede a duração de cada handler de evento (/metrics)."""
+
+    async def _trigger_event(self, event, namespace, *args):
+        # Eventos sem handler ficam agrupados (o nome vem do cliente)
+        name = event if event in self.handlers.get(namespace, {}) else "unhandled"
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await super()._trigger_event(event, namespace, *args)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            socket_events.inc(1, name, status)
+            socket_duration.observe(time.perf_counter() - started, name)
 
-sio = socketio.AsyncServer(
+
+sio = InstrumentedServer(
     async_mode="asgi",
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True,
+    logger=SOCKETIO_LOGGER,
+    engineio_logger=ENGINEIO_LOGGER,
     client_manager=client_manager
 )
 
 
+def user_room(user_id: str) -> str:
+    """
+    Sala com todos os sockets do usuário (todas as abas, em qualquer instância).
+
+    Cada socket entra na sala ao conectar; com o Redis manager um emit para a
+    sala chega ao usuário mesmo que ele esteja conectado em outro nó.
+    """
+    return f"user:{user_id}"
+
+
 def create_socket_app(app):
     """Cria ASGI app do Socket.IO acoplado ao FastAPI app."""
     return socketio.ASGIApp(sio, app)
@@ -0,0 +1,246 @@
+"""Store de estado compartilhado (sessões de agente, preferências).
+
+Estado que antes ficava em dicts do módulo (sessões abertas do painel de
+agentes, auto-create por agente e modo do Guru) passa por aqui. A memória de
+conversa dos agentes e do Guru fica em bots/memory.py. Assim, com várias instâncias
+atrás do Redis adapter, qualquer nó enxerga o que o usuário abriu ou
+configurou em outro.
+
+Com `REDIS_URL` o store fica no Redis (valores em JSON); sem ele, em memória.
+No Redis, leituras passam por um cache local curto
+(`STATE_LOCAL_CACHE_SECONDS`, no máximo `STATE_LOCAL_CACHE_MAX` chaves em
+LRU) para o caminho quente do `chat:send` não fazer
+uma ida ao Redis por mensagem; escritas feitas neste nó atualizam o cache na
+hora, e as de outros nós aparecem depois desse prazo.
+
+Todas as chaves aceitam TTL; listas podem ter tamanho máximo.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Optional
+
+from socket_manager import REDIS_URL
+
+STATE_LOCAL_CACHE_SECONDS = float(os.getenv("STATE_LOCAL_CACHE_SECONDS", "1"))
+STATE_LOCAL_CACHE_MAX = int(os.getenv("STATE_LOCAL_CACHE_MAX", "10000"))
+AGENT_SESSION_TTL_SECONDS = int(os.getenv("AGENT_SESSION_TTL_SECONDS", str(12 * 3600)))
+
+
+class InMemoryStateStore:
+    """Store em memória: `{chave: (expira_em ou None, valor)}`."""
+
+    def __init__(self):
+        self._entries: dict[str, tuple[Optional[float], Any]] = {}
+
+    def _read(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def _write(self, key: str, value: Any, ttl: Optional[int]) -> None:
+        self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    async def get(self, key: str) -> Any:
+        return self._read(key)
+
+    async def put(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._write(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def add_member(self, key: str, member: str, ttl: Optional[int] = None) -> None:
+        members = self._read(key) or set()
+        members.add(member)
+        self._write(key, members, ttl)
+
+    async def remove_member(self, key: str, member: str) -> None:
+        members = self._read(key)
+        if members:
+            members.discard(member)
+
+    async def members(self, key: str) -> set[str]:
+        return set(self._read(key) or ())
+
+    async def push_capped(self, key: str, items: list, maxlen: int, ttl: Optional[int] = None) -> None:
+        values = self._read(key) or deque(maxlen=maxlen)
+        values.extend(items)
+        self._write(key, values, ttl)
+
+    async def get_list(self, key: str) -> list:
+        return list(self._read(key) or ())
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisStateStore:
+    """Store no Redis: strings JSON, sets e listas aparadas com LTRIM."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"state:{key}"
+
+    async def get(self, key: str) -> Any:
+        raw = await self._redis.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        await self._redis.set(self._key(key), json.dumps(value), ex=ttl or None)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._key(key))
+
+    async def add_member(self, key: str, member: str, ttl: Optional[int] = None) -> None:
+        pipe = self._redis.pipeline()
+        pipe.sadd(self._key(key), member)
+        if ttl:
+            pipe.expire(self._key(key), ttl)
+        await pipe.execute()
+
+    async def remove_member(self, key: str, member: str) -> None:
+        await self._redis.srem(self._key(key), member)
+
+    async def members(self, key: str) -> set[str]:
+        return set(await self._redis.smembers(self._key(key)))
+
+    async def push_capped(self, key: str, items: list, maxlen: int, ttl: Optional[int] = None) -> None:
+        if not items:
+            return
+        pipe = self._redis.pipeline()
+        pipe.rpush(self._key(key), *(json.dumps(item) for item in items))
+        pipe.ltrim(self._key(key), -maxlen, -1)
+        if ttl:
+            pipe.expire(self._key(key), ttl)
+        await pipe.execute()
+
+    async def get_list(self, key: str) -> list:
+        return [json.loads(raw) for raw in await self._redis.lrange(self._key(key), 0, -1)]
+
+
+class CachedStateStore:
+    """
+    Cache local de leitura na frente de um store remoto.
+
+    Leituras ficam guardadas por `ttl` segundos, em LRU de até `max_size`
+    chaves; escritas vão direto para o store e invalidam a chave localmente.
+    """
+
+    def __init__(self, backend, ttl: float = STATE_LOCAL_CACHE_SECONDS, max_size: int = STATE_LOCAL_CACHE_MAX):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def _cached(self, kind: str, key: str, load) -> Any:
+        entry = self._cache.get((kind, key))
+        now = time.monotonic()
+        if entry is not None:
+            if entry[0] > now:
+                self._cache.move_to_end((kind, key))
+                self.hits += 1
+                return entry[1]
+            del self._cache[(kind, key)]
+        self.misses += 1
+        value = await load(key)
+        self._cache[(kind, key)] = (now + self.ttl, value)
+        self._cache.move_to_end((kind, key))
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return value
+
+    def _invalidate(self, key: str) -> None:
+        for kind in ("value", "set", "list"):
+            self._cache.pop((kind, key), None)
+
+    async def get(self, key: str) -> Any:
+        return await self._cached("value", key, self.backend.get)
+
+    async def put(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._invalidate(key)
+        await self.backend.put(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._invalidate(key)
+        await self.backend.delete(key)
+
+    async def add_member(self, key: str, member: str, ttl: Optional[int] = None) -> None:
+        self._invalidate(key)
+        await self.backend.add_member(key, member, ttl)
+
+    async def remove_member(self, key: str, member: str) -> None:
+        self._invalidate(key)
+        await self.backend.remove_member(key, member)
+
+    async def members(self, key: str) -> set[str]:
+        return set(await self._cached("set", key, self.backend.members))
+
+    async def push_capped(self, key: str, items: list, maxlen: int, ttl: Optional[int] = None) -> None:
+        self._invalidate(key)
+        await self.backend.push_capped(key, items, maxlen, ttl)
+
+    async def get_list(self, key: str) -> list:
+        return list(await self._cached("list", key, self.backend.get_list))
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+
+def create_state_store():
+    if REDIS_URL:
+        return CachedStateStore(RedisStateStore(REDIS_URL))
+    return InMemoryStateStore()
+
+
+state_store = create_state_store()
+
+
+def state_store_stats() -> dict:
+    """Acertos do cache local (só existe com Redis)."""
+    if isinstance(state_store, CachedStateStore):
+        return {"cacheHits": state_store.hits, "cacheMisses": state_store.misses,
+                "cacheSize": len(state_store._cache)}
+    return {"cacheHits": 0, "cacheMisses": 0, "cacheSize": 0}
+
+
+# --- Sessões do painel de agentes -------------------------------------------
+
+async def open_agent_session(user_id: str, agent_key: str) -> None:
+    await state_store.add_member(f"agent:sessions:{user_id}", agent_key.lower(), AGENT_SESSION_TTL_SECONDS)
+
+
+async def close_agent_session(user_id: str, agent_key: str) -> None:
+    await state_store.remove_member(f"agent:sessions:{user_id}", agent_key.lower())
+
+
+async def is_agent_session_open(user_id: str, agent_key: str) -> bool:
+    return agent_key.lower() in await state_store.members(f"agent:sessions:{user_id}")
+
+
+async def set_agent_auto_create(user_id: str, agent_key: str, auto_create: Optional[bool]) -> None:
+    """Define (ou remove, com None) a preferência de auto-create do usuário para o agente."""
+    key = f"agent:auto-create:{user_id}:{agent_key.lower()}"
+    if auto_create is None:
+        await state_store.delete(key)
+    else:
+        await state_store.put(key, bool(auto_create), AGENT_SESSION_TTL_SECONDS)
+
+
+async def get_agent_auto_create(user_id: str, agent_key: str) -> Optional[bool]:
+    return await state_store.get(f"agent:auto-create:{user_id}:{agent_key.lower()}")
+
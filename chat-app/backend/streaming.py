@@ -0,0 +1,59 @@
+"""Envio das respostas do Guru/agentes em pedaços pelo Socket.IO.
+
+Com `LLM_STREAMING` ligado (padrão), o texto gerado vai para o usuário
+enquanto a OpenAI ainda responde:
+
+- `agent:message-delta` (painel de agentes) e `chat:message-delta` (Guru no
+  chat) trazem `{streamId, seq, delta, ...}`; o cliente concatena os deltas
+  na ordem de `seq`;
+- o evento final de sempre (`agent:message` / `chat:new-message`) leva o
+  mesmo `streamId` e o texto completo, e substitui o que foi montado com os
+  deltas. A mensagem só é persistida nesse momento, uma única vez.
+
+Para não emitir um evento por token, os trechos são agrupados e enviados no
+máximo a cada `LLM_STREAM_FLUSH_MS`.
+"""
+
+import os
+import time
+import uuid
+from typing import Optional
+
+from socket_manager import sio
+
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+LLM_STREAM_FLUSH_SECONDS = int(os.getenv("LLM_STREAM_FLUSH_MS", "50")) / 1000
+
+
+class DeltaStream:
+    """Agrupa os deltas de uma resposta e emite para a sala do usuário."""
+
+    def __init__(self, event: str, room: str, base: dict):
+        self.id = uuid.uuid4().hex
+        self.event = event
+        self.room = room
+        self.base = base
+        self.seq = 0
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+
+    async def push(self, delta: str) -> None:
+        self._buffer.append(delta)
+        if time.monotonic() - self._last_flush >= LLM_STREAM_FLUSH_SECONDS:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Emite o que estiver acumulado (chamar antes do evento final)."""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        delta = "".join(self._buffer)
+        self._buffer.clear()
+        await sio.emit(self.event, {**self.base, "streamId": self.id, "seq": self.seq, "delta": delta},
+                       room=self.room)
+        self.seq += 1
+
+
+def open_stream(event: str, room: str, **base) -> Optional[DeltaStream]:
+    """Novo `DeltaStream`, ou None com o streaming desligado."""
+    return DeltaStream(event, room, base) if LLM_STREAMING else None
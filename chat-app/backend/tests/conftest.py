@@ -47,7 +47,7 @@ class FakeCollection:
     def __init__(self, data=None):
         self.data = data or []
 
-    def find(self, query=None):
+    def find(self, query=None, projection=None):
         query = query or {}
 
         def match(doc):
@@ -67,6 +67,18 @@ class FakeCollection:
         self.data.append(doc)
         return FakeInsertResult(doc["_id"])
 
+    async def insert_many(self, docs, ordered=True):
+        return [await self.insert_one(doc) for doc in docs]
+
+    async def delete_many(self, query):
+        keep = [d for d in self.data if not all(d.get(k) == v for k, v in query.items())]
+        deleted = len(self.data) - len(keep)
+        self.data[:] = keep
+
+        class Result:
+            deleted_count = deleted
+        return Result()
+
     async def update_many(self, query, update):
         ids = query.get("_id", {}).get("$in", [])
         modified = 0
@@ -78,6 +90,27 @@ class FakeCollection:
             modified_count = modified
         return Result()
 
+    async def update_one(self, query, update, upsert=False):
+        class Result:
+            modified_count = 0
+        return Result()
+
+    async def find_one(self, query=None, projection=None):
+        return None
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        return None
+
+    async def bulk_write(self, ops, ordered=True):
+        self.data.extend(ops)
+        class Result:
+            modified_count = 0
+            upserted_count = 0
+        return Result()
+
+    async def distinct(self, field, query=None):
+        return []
+
 
 @pytest.fixture(autouse=True)
 def patch_startup(monkeypatch):
@@ -89,11 +122,29 @@ def patch_startup(monkeypatch):
     # Evita criar índices e carregar bots customizados no Mongo real
     import database
     monkeypatch.setattr(database, "create_indexes", _noop)
+    import conversations
+    monkeypatch.setattr(conversations, "run_conversation_migrations", _noop)
+    monkeypatch.setattr(conversations, "conversations_collection", FakeCollection())
+    monkeypatch.setattr(conversations, "unread_counters_collection", FakeCollection())
     # Usa coleções fake para evitar dependência de Mongo
     monkeypatch.setattr(database, "agent_messages_collection", FakeCollection(), raising=False)
     monkeypatch.setattr(database, "messages_collection", FakeCollection(), raising=False)
+    monkeypatch.setattr(database, "conversation_summaries_collection", FakeCollection(), raising=False)
+    monkeypatch.setattr(database, "message_search_collection", FakeCollection(), raising=False)
     import bots.agents as agents_module
     monkeypatch.setattr(agents_module, "load_custom_agents_from_db", _noop)
+    # Perfis em cache não podem vazar entre testes com bancos fake diferentes
+    from profile_cache import profile_cache
+    profile_cache.clear()
+    # Sessões de agente e históricos também não podem vazar entre testes
+    from state_store import state_store
+    state_store.clear()
+    from bots.llm_cache import response_cache
+    response_cache.clear()
+    from bots.memory import agent_memory
+    agent_memory.reset()
+    from bots import summaries
+    summaries.reset()
     yield
 
 
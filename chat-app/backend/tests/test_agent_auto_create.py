@@ -1,11 +1,11 @@
 import pytest
-from backend import socket_handlers
+import state_store
 
 
-def test_agent_auto_create_map():
-    # Manipula o mapa diretamente
-    key = ('user123', 'sdr')
-    socket_handlers.agent_auto_create_per_user[key] = True
-    assert socket_handlers.agent_auto_create_per_user.get(key) is True
-    del socket_handlers.agent_auto_create_per_user[key]
-    assert key not in socket_handlers.agent_auto_create_per_user
+@pytest.mark.asyncio
+async def test_agent_auto_create_pref():
+    # Preferência guardada no state store por (usuário, agente)
+    await state_store.set_agent_auto_create('user123', 'SDR', True)
+    assert await state_store.get_agent_auto_create('user123', 'sdr') is True
+    await state_store.set_agent_auto_create('user123', 'sdr', None)
+    assert await state_store.get_agent_auto_create('user123', 'sdr') is None
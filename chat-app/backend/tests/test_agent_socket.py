@@ -7,13 +7,16 @@ import socket_handlers as socket_handlers
 
 
 class FakeAgent:
+    key = 'sdr'
+
     def __init__(self):
         pass
     def get_display_name(self):
         return 'Fake Agent'
-    async def ask(self, message, user_id, user_name):
+    async def ask(self, message, user_id, user_name, on_delta=None, contact_id=None, save_history=True):
         return 'Fake answer'
-    async def ask_with_context(self, message, user_id, user_name, contact_id=None, conversation_context=None):
+    async def ask_with_context(self, message, user_id, user_name, contact_id=None, conversation_context=None,
+                               on_delta=None, save_history=True):
         return 'Fake answer with context'
 
 
@@ -72,3 +75,156 @@ async def test_process_agent_message_emits_agent_message(monkeypatch):
     payload = emitted[0]['payload']
     assert payload['agentKey'] == 'sdr'
     assert 'text' in payload
+    # Vai para a sala do usuário (todas as abas), não só para o socket que enviou
+    assert emitted[0]['room'] == 'user:user123'
+
+
+class StreamingAgent(FakeAgent):
+    async def ask(self, message, user_id, user_name, on_delta=None, contact_id=None, save_history=True):
+        for part in ("Fake ", "streamed ", "answer"):
+            await on_delta(part)
+        return 'Fake streamed answer'
+
+
+@pytest.mark.asyncio
+async def test_process_agent_message_streams_deltas_then_commits(monkeypatch):
+    calls = []
+
+    async def fake_emit(event, payload, to=None, room=None, **kwargs):
+        calls.append({'event': event, 'payload': payload, 'room': room})
+
+    import streaming
+    import bots.agents as agents_module
+    from database import agent_messages_collection
+
+    async def fake_get_agent(name, uid=None):
+        return StreamingAgent()
+
+    inserted = []
+
+    async def fake_insert_many(docs, ordered=True):
+        inserted.extend(docs)
+
+    monkeypatch.setattr(socket_handlers.sio, 'emit', fake_emit)
+    monkeypatch.setattr(agents_module, 'get_agent', fake_get_agent)
+    monkeypatch.setattr(agents_module, 'generate_agent_suggestions', lambda *a, **k: [])
+    monkeypatch.setattr(agent_messages_collection, 'insert_many', fake_insert_many)
+    monkeypatch.setattr(socket_handlers.sio, 'get_environ', lambda sid: {'user_id': 'user123', 'user_name': 'User'})
+    monkeypatch.setattr(streaming, 'LLM_STREAMING', True)
+    monkeypatch.setattr(streaming, 'LLM_STREAM_FLUSH_SECONDS', 0)
+
+    await socket_handlers.process_agent_message('TEST_SID', {'agentKey': 'sdr', 'message': 'hello'})
+    await asyncio.gather(*socket_handlers._agent_followups)
+
+    deltas = [c['payload'] for c in calls if c['event'] == 'agent:message-delta']
+    final = [c['payload'] for c in calls if c['event'] == 'agent:message']
+    assert ''.join(d['delta'] for d in deltas) == 'Fake streamed answer'
+    assert [d['seq'] for d in deltas] == list(range(len(deltas)))
+    assert len(final) == 1 and final[0]['streamId'] == deltas[0]['streamId']
+    # Resposta do agente persistida uma única vez, já completa, com o id emitido
+    assert [d['text'] for d in inserted if d['role'] == 'assistant'] == ['Fake streamed answer']
+    assert [d['role'] for d in inserted] == ['user', 'assistant']
+    assert str(inserted[1]['_id']) == final[0]['id']
+
+
+@pytest.mark.asyncio
+async def test_process_agent_message_sends_answer_before_suggestions(monkeypatch):
+    calls = []
+    release_suggestions = asyncio.Event()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_emit(event, payload, to=None, room=None, **kwargs):
+        calls.append({'event': event, 'payload': payload, 'room': room})
+
+    async def fake_get_agent(name, uid=None):
+        return FakeAgent()
+
+    async def fake_suggestions(agent, ctx, uid, uname, n_suggestions=3):
+        await release_suggestions.wait()
+        return ['Oi!', 'Posso ajudar?']
+
+    def slow_find(original):
+        def find(*args, **kwargs):
+            cursor = original(*args, **kwargs)
+            to_list = cursor.to_list
+
+            async def counted(length=None):
+                nonlocal in_flight, max_in_flight
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                return await to_list(length)
+            cursor.to_list = counted
+            return cursor
+        return find
+
+    import bots.agents as agents_module
+    from bots import summaries
+    import database
+
+    async def fake_summary_context(*_args, **_kwargs):
+        return [{'role': 'user', 'content': 'Cliente: oi'}]
+
+    monkeypatch.setattr(socket_handlers.sio, 'emit', fake_emit)
+    monkeypatch.setattr(socket_handlers.sio, 'get_environ', lambda sid: {'user_id': 'user123', 'user_name': 'User'})
+    monkeypatch.setattr(agents_module, 'get_agent', fake_get_agent)
+    monkeypatch.setattr(socket_handlers, 'generate_agent_suggestions', fake_suggestions)
+    monkeypatch.setattr(summaries, 'summary_context', fake_summary_context)
+    for name in ('agent_messages_collection', 'messages_collection'):
+        collection = getattr(database, name)
+        monkeypatch.setattr(collection, 'find', slow_find(collection.find))
+
+    await socket_handlers.process_agent_message('TEST_SID', {'agentKey': 'sdr', 'message': 'hello',
+                                                             'contactId': 'contact123'})
+
+    # As duas leituras do Mongo rodaram juntas
+    assert max_in_flight == 2
+    # A resposta saiu sem esperar as sugestões
+    final = [c['payload'] for c in calls if c['event'] == 'agent:message']
+    assert final[0]['text'] == 'Fake answer with context'
+    assert final[0]['suggestions'] == []
+    assert not [c for c in calls if c['event'] == 'agent:suggestions']
+
+    release_suggestions.set()
+    await asyncio.gather(*socket_handlers._agent_followups)
+
+    suggestions = [c for c in calls if c['event'] == 'agent:suggestions']
+    assert len(suggestions) == 1
+    assert suggestions[0]['room'] == 'user:user123'
+    assert suggestions[0]['payload'] == {'messageId': final[0]['id'], 'agentKey': 'sdr',
+                                         'contactId': 'contact123', 'suggestions': ['Oi!', 'Posso ajudar?']}
+    stored = database.agent_messages_collection.data
+    assert [d['role'] for d in stored] == ['user', 'assistant']
+
+
+@pytest.mark.asyncio
+async def test_process_agent_message_uses_canonical_agent_key(monkeypatch):
+    calls = []
+
+    async def fake_emit(event, payload, to=None, room=None, **kwargs):
+        calls.append({'event': event, 'payload': payload})
+
+    async def fake_get_agent(name, uid=None):
+        return FakeAgent()
+
+    async def no_suggestions(agent, ctx, uid, uname, n_suggestions=3):
+        return []
+
+    import bots.agents as agents_module
+    import database
+
+    monkeypatch.setattr(socket_handlers.sio, 'emit', fake_emit)
+    monkeypatch.setattr(socket_handlers.sio, 'get_environ', lambda sid: {'user_id': 'user123', 'user_name': 'User'})
+    monkeypatch.setattr(agents_module, 'get_agent', fake_get_agent)
+    monkeypatch.setattr(socket_handlers, 'generate_agent_suggestions', no_suggestions)
+
+    # Cliente manda a chave com outra caixa: grava e emite com a chave da memória
+    await socket_handlers.process_agent_message('TEST_SID', {'agentKey': 'SDR', 'message': 'hello'})
+    await asyncio.gather(*socket_handlers._agent_followups)
+
+    final = [c['payload'] for c in calls if c['event'] == 'agent:message']
+    assert final[0]['agentKey'] == 'sdr'
+    stored = database.agent_messages_collection.data
+    assert {d['agentKey'] for d in stored} == {'sdr'}
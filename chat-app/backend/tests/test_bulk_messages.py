@@ -0,0 +1,151 @@
+import pytest
+from pymongo.errors import BulkWriteError
+
+import conversations
+import routers.messages as messages_router
+from models import BulkMessagesIn
+
+
+class FakeBulkMessages:
+    def __init__(self, fail_indexes=()):
+        self.fail_indexes = set(fail_indexes)
+        self.calls = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append((len(docs), ordered))
+        self.docs = docs
+        for i, d in enumerate(docs):
+            d["_id"] = f"id{i}"
+        if self.fail_indexes:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "code": 11000, "errmsg": "duplicate key"} for i in sorted(self.fail_indexes)]
+            })
+
+
+class FakeReadModel:
+    def __init__(self):
+        self.ops = []
+
+    async def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+
+class FakeCounters:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_many(self, query):
+        self.deleted.extend(query["_id"]["$in"])
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    read_model = FakeReadModel()
+    counters = FakeCounters()
+    monkeypatch.setattr(conversations, "conversations_collection", read_model)
+    monkeypatch.setattr(conversations, "unread_counters_collection", counters)
+    return read_model, counters
+
+
+def _item(i, **extra):
+    item = {"author": "Cliente", "text": f"mensagem {i}", "userId": "WA:55", "contactId": "owner", "timestamp": 1700000000000 + i}
+    item.update(extra)
+    return item
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_inserts_once_and_reports_item_errors(monkeypatch, fakes):
+    read_model, counters = fakes
+    fake = FakeBulkMessages()
+    monkeypatch.setattr(messages_router, "messages_collection", fake)
+
+    body = BulkMessagesIn(messages=[
+        _item(0),
+        _item(1, text=""),                        # inválido: texto vazio
+        _item(2, userId="x", contactId="y"),      # não envolve o usuário
+        _item(3, userId=None, contactId="WA:55"),  # enviada pelo próprio usuário
+        _item(4, userId=None, contactId=None),     # sem conversa
+    ])
+    result = await messages_router.bulk_import_messages(body, "owner")
+
+    assert fake.calls == [(2, False)]
+    assert result["inserted"] == 2
+    assert [e["index"] for e in result["errors"]] == [1, 2, 4]
+    assert result["errors"][0]["error"].startswith("text")
+    assert result["errors"][2]["error"] == "contactId é obrigatório na importação"
+
+    # Uma escrita no read model para o lote: 2 lados x (upsert + última mensagem)
+    assert len(read_model.ops) == 4
+    owner_upsert = read_model.ops[0] if read_model.ops[0]._filter["ownerId"] == "owner" else read_model.ops[2]
+    assert owner_upsert._doc["$inc"] == {"unreadCount": 1}
+    assert counters.deleted == ["WA:55", "owner"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_maps_write_errors_to_original_index(monkeypatch, fakes):
+    read_model, _ = fakes
+    fake = FakeBulkMessages(fail_indexes=[1])
+    monkeypatch.setattr(messages_router, "messages_collection", fake)
+
+    body = BulkMessagesIn(messages=[_item(0), _item(1, text=""), _item(2), _item(3)])
+    result = await messages_router.bulk_import_messages(body, "owner")
+
+    # Documento 1 do insert_many é o item 2 do lote (o item 1 falhou na validação)
+    assert result["inserted"] == 2
+    assert result["errors"] == [
+        {"index": 1, "error": result["errors"][0]["error"]},
+        {"index": 2, "error": "duplicate key"},
+    ]
+    last_set = [op for op in read_model.ops if "$set" in op._doc]
+    assert all(op._doc["$set"]["lastMessage"]["text"] == "mensagem 3" for op in last_set)
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_out_of_range_timestamp_per_item(monkeypatch, fakes):
+    fake = FakeBulkMessages()
+    monkeypatch.setattr(messages_router, "messages_collection", fake)
+
+    body = BulkMessagesIn(messages=[_item(0), _item(1, timestamp=10**17), _item(2, timestamp=253402300799999)])
+    result = await messages_router.bulk_import_messages(body, "owner")
+
+    assert result["inserted"] == 2
+    assert [e["index"] for e in result["errors"]] == [1]
+    assert result["errors"][0]["error"].startswith("timestamp")
+    assert fake.docs[1]["createdAt"].year == 9999
+
+
+def test_bulk_import_rejects_empty_batch(client):
+    response = client.post("/messages/bulk", json={"messages": []})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_other_registered_sender(monkeypatch, fakes):
+    other = "507f1f77bcf86cd799439012"
+
+    class FakeUsers:
+        def find(self, query, projection=None):
+            ids = query["_id"]["$in"]
+
+            class Cursor:
+                async def to_list(self, length=None):
+                    return [{"_id": i} for i in ids if str(i) == other]
+            return Cursor()
+
+    class FakeDb:
+        users = FakeUsers()
+
+    fake = FakeBulkMessages()
+    monkeypatch.setattr(messages_router, "messages_collection", fake)
+    monkeypatch.setattr(messages_router, "db", FakeDb())
+
+    body = BulkMessagesIn(messages=[
+        _item(0, userId=other),                   # forjada em nome de outro usuário
+        _item(1),                                 # remetente externo
+        _item(2, userId="507f1f77bcf86cd799439099"),  # ObjectId sem usuário: externo
+    ])
+    result = await messages_router.bulk_import_messages(body, "owner")
+
+    assert result["inserted"] == 2
+    assert result["errors"] == [{"index": 0, "error": "Remetente é outro usuário cadastrado"}]
+    assert all(d["imported"] is True for d in fake.docs)
@@ -2,11 +2,65 @@
 Testes para módulo de contatos (contacts.py)
 Cobertura: list_contacts, get_conversation, mark_conversation_read
 """
+import json
+
 import pytest
 from datetime import datetime
 from bson import ObjectId
 
 
+def json_body(response):
+    """As rotas de histórico devolvem ORJSONResponse já serializada."""
+    return json.loads(response.body)
+
+
+class FakeConversationsCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self._limit = None
+
+    def sort(self, *args):
+        self.rows = sorted(self.rows, key=lambda r: r["lastMessageAt"], reverse=True)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.rows[:self._limit]
+
+
+class FakeConversationsCollection:
+    """Read model `conversations` em memória (ownerId/peerId/lastMessage...)."""
+    def __init__(self, rows=None):
+        self.rows = rows or []
+
+    def find(self, query):
+        return FakeConversationsCursor([r for r in self.rows if r["ownerId"] == query["ownerId"]])
+
+    async def distinct(self, field, query):
+        return [r[field] for r in self.rows if r["ownerId"] == query["ownerId"]]
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        for r in self.rows:
+            if r["ownerId"] == query["ownerId"] and r["peerId"] == query["peerId"]:
+                before = dict(r)
+                r.update(update["$set"])
+                return before
+        return None
+
+
+def conversation_row(owner_id, peer_id, text, at, unread=0):
+    return {
+        "ownerId": owner_id,
+        "peerId": peer_id,
+        "lastMessage": {"text": text},
+        "lastMessageAt": at,
+        "unreadCount": unread,
+    }
+
+
 def test_list_contacts_requires_authentication(client):
     """Testa que listar contatos requer autenticação"""
     response = client.get("/contacts/")
@@ -59,14 +113,15 @@ async def test_list_contacts_returns_users_except_self(monkeypatch):
     
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", FakeConversationsCollection())
     
     from contacts import list_contacts
     
     # Testa endpoint
-    result = await list_contacts("507f1f77bcf86cd799439011")
+    result = json_body(await list_contacts("507f1f77bcf86cd799439011"))
     
     assert len(result) == 2
-    assert all(c.id != "507f1f77bcf86cd799439011" for c in result)
+    assert all(c["id"] != "507f1f77bcf86cd799439011" for c in result)
 
 
 @pytest.mark.asyncio
@@ -81,12 +136,7 @@ async def test_list_contacts_includes_last_message(monkeypatch):
     ]
     
     last_msg_time = datetime(2024, 1, 15, 10, 30, 0)
-    fake_message = {
-        "_id": ObjectId(),
-        "text": "Última mensagem",
-        "createdAt": last_msg_time,
-        "userId": "507f1f77bcf86cd799439012"
-    }
+    rows = [conversation_row("user1_id", "507f1f77bcf86cd799439012", "Última mensagem", last_msg_time, unread=2)]
     
     class FakeCursor:
         async def to_list(self, length):
@@ -96,24 +146,22 @@ async def test_list_contacts_includes_last_message(monkeypatch):
         def find(self, query, projection):
             return FakeCursor()
     
-    class FakeMessagesCollection:
-        async def find_one(self, query, **kwargs):
-            return fake_message
-    
     class FakeDb:
         def __init__(self):
             self.users = FakeUsersCollection()
-            self.messages = FakeMessagesCollection()
     
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", FakeConversationsCollection(rows))
     
     from contacts import list_contacts
-    result = await list_contacts("user1_id")
+    result = json_body(await list_contacts("user1_id"))
     
     assert len(result) == 1
-    assert result[0].lastMessage == "Última mensagem"
-    assert result[0].lastMessageTime == int(last_msg_time.timestamp() * 1000)
+    assert result[0]["name"] == "User Two"
+    assert result[0]["lastMessage"] == "Última mensagem"
+    assert result[0]["lastMessageTime"] == int(last_msg_time.timestamp() * 1000)
+    assert result[0]["unreadCount"] == 2
 
 
 @pytest.mark.asyncio
@@ -138,16 +186,10 @@ async def test_list_contacts_sorts_by_last_message_time(monkeypatch):
         }
     ]
     
-    messages_map = {
-        "507f1f77bcf86cd799439012": {
-            "text": "Mensagem antiga",
-            "createdAt": old_time,
-        },
-        "507f1f77bcf86cd799439013": {
-            "text": "Mensagem recente",
-            "createdAt": recent_time,
-        }
-    }
+    rows = [
+        conversation_row("user1_id", "507f1f77bcf86cd799439012", "Mensagem antiga", old_time),
+        conversation_row("user1_id", "507f1f77bcf86cd799439013", "Mensagem recente", recent_time),
+    ]
     
     class FakeCursor:
         async def to_list(self, length):
@@ -157,32 +199,20 @@ async def test_list_contacts_sorts_by_last_message_time(monkeypatch):
         def find(self, query, projection):
             return FakeCursor()
     
-    class FakeMessagesCollection:
-        async def find_one(self, query, **kwargs):
-            # Identifica qual usuário pela query
-            if "contactId" in query.get("$or", [{}])[0]:
-                user_id = query["$or"][0]["contactId"]
-            elif "userId" in query.get("$or", [{}])[1]:
-                user_id = query["$or"][1]["userId"]
-            else:
-                return None
-            
-            return messages_map.get(user_id)
-    
     class FakeDb:
         def __init__(self):
             self.users = FakeUsersCollection()
-            self.messages = FakeMessagesCollection()
     
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", FakeConversationsCollection(rows))
     
     from contacts import list_contacts
-    result = await list_contacts("user1_id")
+    result = json_body(await list_contacts("user1_id"))
     
     # Primeiro contato deve ser o mais recente
-    assert result[0].name == "Recent Contact"
-    assert result[1].name == "Old Contact"
+    assert result[0]["name"] == "Recent Contact"
+    assert result[1]["name"] == "Old Contact"
 
 
 def test_get_conversation_requires_authentication(client):
@@ -281,77 +311,62 @@ async def test_get_conversation_returns_messages(monkeypatch):
     monkeypatch.setattr("contacts.db", FakeDb())
     
     from contacts import get_conversation
-    result = await get_conversation("507f1f77bcf86cd799439012", 50, None, "user1")
+    result = json_body(await get_conversation("507f1f77bcf86cd799439012", 50, None, "user1"))
     
-    assert len(result.messages) <= 50
-    assert result.hasMore is not None
+    assert len(result["messages"]) <= 50
+    assert result["hasMore"] is not None
 
 
 @pytest.mark.asyncio
 async def test_get_conversation_with_pagination(monkeypatch):
-    """Testa paginação com parâmetro 'before'"""
-    # Cria 60 mensagens para testar paginação
+    """Testa paginação por cursor e pelo parâmetro legado 'before'"""
+    from datetime import datetime, timedelta
+    from test_pagination import FakeKeysetCollection
+
+    base = datetime(2022, 1, 1)
+    # 60 mensagens; as 5 primeiras compartilham o mesmo createdAt (desempate por _id)
     fake_messages = [
         {
             "_id": ObjectId(),
             "author": "User",
             "text": f"Mensagem {i}",
-            "timestamp": 1640000000000 + i * 1000,
-            "type": "text"
+            "createdAt": base + timedelta(seconds=max(i, 4)),
+            "type": "text",
+            "conversationKey": "contact_id|user1"
         }
         for i in range(60)
     ]
-    
-    class FakeCursor:
-        def __init__(self, data):
-            self.data = data
-        
-        def sort(self, *args):
-            return self
-        
-        def limit(self, n):
-            self.data = self.data[:n]
-            return self
-        
-        async def to_list(self, length):
-            return self.data
-    
-    class FakeUsersCollection:
-        async def find_one(self, query):
-            return {"_id": ObjectId(), "email": "test@test.com"}
-    
-    class FakeMessagesCollection:
-        def find(self, query, projection=None):
-            # Filtra mensagens antes do timestamp 'before'
-            if "$lt" in query.get("timestamp", {}):
-                before = query["timestamp"]["$lt"]
-                filtered = [m for m in fake_messages if m["timestamp"] < before]
-                return FakeCursor(filtered)
-            return FakeCursor(fake_messages)
-        
-        async def count_documents(self, query):
-            return 60
-    
+
     class FakeDb:
         def __init__(self):
-            self.users = FakeUsersCollection()
-            self.messages = FakeMessagesCollection()
-    
-    import contacts
+            self.messages = FakeKeysetCollection(fake_messages)
+
     monkeypatch.setattr("contacts.db", FakeDb())
-    
+
     from contacts import get_conversation
-    
-    # Primeira página (sem before)
-    result1 = await get_conversation("contact_id", 50, None, "user1")
-    assert len(result1.messages) <= 50
-    assert result1.hasMore is True  # Tem mais 10 mensagens
-    
-    # Segunda página (com before)
-    oldest_timestamp = result1.messages[-1].timestamp if result1.messages else None
-    if oldest_timestamp:
-        result2 = await get_conversation("contact_id", 50, oldest_timestamp, "user1")
-        assert len(result2.messages) <= 10
+
+    # Primeira página (mais recentes)
+    result1 = json_body(await get_conversation("contact_id", 50, None, "user1"))
+    assert len(result1["messages"]) == 50
+    assert result1["hasMore"] is True
+    assert result1["messages"][-1]["text"] == "Mensagem 59"
+    assert result1["nextCursor"]
+
+    # Segunda página via cursor: as 10 restantes, sem duplicar nem pular
+    result2 = json_body(await get_conversation("contact_id", 50, None, "user1", None, result1["nextCursor"]))
+    assert [m["text"] for m in result2["messages"]] == [f"Mensagem {i}" for i in range(10)]
+    assert result2["hasMore"] is False
+    assert result2["nextCursor"] is None
+
+    # Voltando para as mais novas a partir da segunda página
+    result3 = json_body(await get_conversation("contact_id", 5, None, "user1", None, result2["prevCursor"], "after"))
+    assert [m["text"] for m in result3["messages"]] == [f"Mensagem {i}" for i in range(10, 15)]
+    assert result3["hasMore"] is True
+
+    # 'before' legado (ms) continua funcionando
+    oldest_timestamp = result1["messages"][0]["timestamp"]
+    legacy = json_body(await get_conversation("contact_id", 50, oldest_timestamp, "user1"))
+    assert len(legacy["messages"]) == 10
 
 
 def test_mark_conversation_read_requires_authentication(client):
@@ -380,11 +395,16 @@ async def test_mark_conversation_read_updates_messages(monkeypatch):
     
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    conversations = FakeConversationsCollection([
+        conversation_row("user1", "contact123", "oi", datetime(2024, 1, 1), unread=5)
+    ])
+    monkeypatch.setattr("conversations.conversations_collection", conversations)
     
     from contacts import mark_conversation_read
     result = await mark_conversation_read("contact123", "user1")
     
     assert updated_count["value"] == 5
+    assert conversations.rows[0]["unreadCount"] == 0
 
 
 @pytest.mark.asyncio
@@ -406,24 +426,20 @@ async def test_list_contacts_handles_no_messages(monkeypatch):
         def find(self, query, projection):
             return FakeCursor()
     
-    class FakeMessagesCollection:
-        async def find_one(self, query, **kwargs):
-            return None  # Sem mensagens
-    
     class FakeDb:
         def __init__(self):
             self.users = FakeUsersCollection()
-            self.messages = FakeMessagesCollection()
     
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", FakeConversationsCollection())
     
     from contacts import list_contacts
-    result = await list_contacts("user1")
+    result = json_body(await list_contacts("user1"))
     
     assert len(result) == 1
-    assert result[0].lastMessage == ""
-    assert result[0].lastMessageTime == 0
+    assert result[0]["lastMessage"] == ""
+    assert result[0]["lastMessageTime"] == 0
 
 
 @pytest.mark.asyncio
@@ -470,8 +486,57 @@ async def test_get_conversation_with_attachments(monkeypatch):
     monkeypatch.setattr("contacts.db", FakeDb())
     
     from contacts import get_conversation
-    result = await get_conversation("contact_id", 50, None, "user1")
+    result = json_body(await get_conversation("contact_id", 50, None, "user1"))
     
-    assert len(result.messages) == 1
-    assert result.messages[0].type == "image"
-    assert result.messages[0].attachment is not None
+    assert len(result["messages"]) == 1
+    assert result["messages"][0]["type"] == "image"
+    assert result["messages"][0]["attachment"] is not None
+
+
+@pytest.mark.asyncio
+async def test_list_contacts_cursor_keeps_ties_and_caps_directory(monkeypatch):
+    """Paginação keyset (lastMessageAt, _id): conversas no mesmo horário não somem"""
+    same_time = datetime(2026, 1, 1, 12, 0)
+    rows = [dict(conversation_row("user1", f"peer{i}", f"oi {i}", same_time), _id=ObjectId())
+            for i in range(3)]
+
+    class KeysetCursor(FakeConversationsCursor):
+        def sort(self, *args):
+            self.rows = sorted(self.rows, key=lambda r: (r["lastMessageAt"], r["_id"]), reverse=True)
+            return self
+
+    class KeysetConversations(FakeConversationsCollection):
+        def find(self, query):
+            def after_cursor(r):
+                if "$or" not in query:
+                    return True
+                older, tie = query["$or"]
+                return (r["lastMessageAt"] < older["lastMessageAt"]["$lt"]
+                        or (r["lastMessageAt"] == tie["lastMessageAt"] and r["_id"] < tie["_id"]["$lt"]))
+            return KeysetCursor([r for r in self.rows if r["ownerId"] == query["ownerId"] and after_cursor(r)])
+
+    requested = {}
+
+    class FakeCursor:
+        async def to_list(self, length):
+            requested["length"] = length
+            return []
+
+    class FakeDb:
+        class users:
+            @staticmethod
+            def find(query, projection):
+                return FakeCursor()
+
+    import contacts
+    monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", KeysetConversations(rows))
+
+    from contacts import list_contacts
+    first = await list_contacts("user1", limit=2)
+    second = await list_contacts("user1", limit=2, cursor=first.headers["x-next-cursor"])
+
+    ids = [c["id"] for c in json_body(first) + json_body(second)]
+    assert sorted(ids) == ["peer0", "peer1", "peer2"]
+    # Última página: diretório de usuários limitado
+    assert requested["length"] == contacts.CONTACTS_DIRECTORY_LIMIT
@@ -1,8 +1,14 @@
+import json
+
 import pytest
 from datetime import datetime
 from bson import ObjectId
 
 
+def json_body(response):
+    return json.loads(response.body)
+
+
 @pytest.mark.asyncio
 async def test_create_contact_inserts_document(monkeypatch):
     created = {"id": None}
@@ -43,16 +49,12 @@ async def test_list_contacts_includes_external_contacts(monkeypatch):
             return C()
 
     last_msg_time = datetime(2025, 1, 1, 12, 0, 0)
-    fake_message = {
-        "_id": ObjectId(),
-        "text": "Mensagem externa",
-        "createdAt": last_msg_time
-    }
+    external_id = "507f1f77bcf86cd799439099"
 
     class FakeContactsCursor:
         async def to_list(self, n):
             return [{
-                "_id": ObjectId("507f1f77bcf86cd799439099"),
+                "_id": ObjectId(external_id),
                 "name": "Contato Externo",
                 "phone": "+5511999999999",
                 "createdBy": "user1"
@@ -62,23 +64,43 @@ async def test_list_contacts_includes_external_contacts(monkeypatch):
         def find(self, query):
             return FakeContactsCursor()
 
-    class FakeMessagesCollection:
-        async def find_one(self, query, sort=None):
-            return fake_message
+    class FakeConversationsCursor:
+        def sort(self, *args):
+            return self
+
+        def limit(self, n):
+            return self
+
+        async def to_list(self, length=None):
+            return [{
+                "ownerId": "user1",
+                "peerId": external_id,
+                "lastMessage": {"text": "Mensagem externa"},
+                "lastMessageAt": last_msg_time,
+                "unreadCount": 1
+            }]
+
+    class FakeConversationsCollection:
+        def find(self, query):
+            return FakeConversationsCursor()
+
+        async def distinct(self, field, query):
+            return [external_id]
 
     class FakeDb:
         def __init__(self):
             self.users = FakeUsersCollection()
             self.contacts = FakeContactsCollection()
-            self.messages = FakeMessagesCollection()
 
     import contacts
     monkeypatch.setattr("contacts.db", FakeDb())
+    monkeypatch.setattr("conversations.conversations_collection", FakeConversationsCollection())
 
     from contacts import list_contacts
-    result = await list_contacts("user1")
+    result = json_body(await list_contacts("user1"))
 
     assert len(result) == 1
-    assert result[0].name == "Contato Externo"
-    assert result[0].lastMessage == "Mensagem externa"
-    assert result[0].lastMessageTime == int(last_msg_time.timestamp() * 1000)
+    assert result[0]["name"] == "Contato Externo"
+    assert result[0]["lastMessage"] == "Mensagem externa"
+    assert result[0]["lastMessageTime"] == int(last_msg_time.timestamp() * 1000)
+    assert result[0]["unreadCount"] == 1
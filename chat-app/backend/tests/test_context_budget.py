@@ -0,0 +1,121 @@
+import pytest
+
+import metrics
+from bots import agents, context_budget
+from bots.context_budget import build_prompt, count_tokens, message_tokens, truncate_to_tokens
+
+SYSTEM = [{"role": "system", "content": "Você é um assistente de vendas."}]
+QUESTION = {"role": "user", "content": "[Usuário: Ana] como responder esse cliente?"}
+INTRO = {"role": "system", "content": "HISTÓRICO DA CONVERSA:"}
+OUTRO = {"role": "system", "content": "--- FIM DO CONTEXTO DA CONVERSA ---"}
+
+
+def _context(n):
+    return [{"role": "user", "content": f"[10:{i:02d}] Cliente: mensagem número {i} sobre o pedido"}
+            for i in range(n)]
+
+
+def _history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"pergunta {i}"})
+        history.append({"role": "assistant", "content": f"resposta {i} " + "detalhe " * 20})
+    return history
+
+
+def test_count_tokens_is_cached():
+    count_tokens.cache_clear()
+    text = "Olá, qual o prazo de entrega para São Paulo?"
+    first = count_tokens(text)
+    assert first == count_tokens(text)
+    assert count_tokens.cache_info().hits == 1
+    assert 0 < first <= len(text)
+
+
+def test_truncate_keeps_the_beginning_within_budget():
+    text = "[10:00] Cliente: " + "palavra " * 200
+    cut = truncate_to_tokens(text, 30)
+    assert cut.startswith("[10:00] Cliente:")
+    assert cut.endswith("[…]")
+    assert count_tokens(cut) <= 30
+
+
+def test_everything_fits_under_budget():
+    context, history = _context(3), _history(1)
+    messages, stats = build_prompt(SYSTEM, QUESTION, history=history, context=context,
+                                   context_intro=INTRO, context_outro=OUTRO, budget=5000)
+    assert messages == [*SYSTEM, INTRO, *context, OUTRO, *history, QUESTION]
+    assert (stats.context_dropped, stats.history_dropped, stats.truncated) == (0, 0, False)
+    assert stats.tokens == context_budget.REPLY_PRIMING_TOKENS + sum(message_tokens(m) for m in messages)
+
+
+def test_overflow_keeps_most_recent_and_notes_the_rest():
+    context = _context(40)
+    messages, stats = build_prompt(SYSTEM, QUESTION, history=_history(5), context=context,
+                                   context_intro=INTRO, context_outro=OUTRO, budget=400)
+    assert stats.tokens <= 400
+    assert messages[0] == SYSTEM[0] and messages[-1] == QUESTION
+    # Contexto: as mais recentes, em ordem, precedidas da linha de omitidas
+    assert stats.context_kept > 0 and stats.context_dropped == 40 - stats.context_kept
+    kept = messages[3:3 + stats.context_kept]
+    assert kept == context[-stats.context_kept:]
+    assert messages[2]["content"] == f"[{stats.context_dropped} mensagens anteriores omitidas (10:00–10:{stats.context_dropped - 1:02d})]"
+    # Histórico recortado começa por uma pergunta
+    history = messages[3 + stats.context_kept + 1:-1]
+    assert history and history[0]["role"] == "user"
+    # Determinístico: mesmo input, mesmo prompt
+    assert build_prompt(SYSTEM, QUESTION, history=_history(5), context=context,
+                        context_intro=INTRO, context_outro=OUTRO, budget=400)[0] == messages
+
+
+def test_oversized_latest_message_is_truncated():
+    context = _context(2) + [{"role": "user", "content": "[11:00] Cliente: " + "texto longo " * 300}]
+    messages, stats = build_prompt(SYSTEM, QUESTION, context=context, context_intro=INTRO,
+                                   context_outro=OUTRO, budget=300)
+    assert stats.truncated and stats.tokens <= 300
+    assert stats.context_kept == 1
+    assert messages[3]["content"].startswith("[11:00] Cliente: texto longo") and messages[3]["content"].endswith("[…]")
+
+
+def test_oversized_question_is_truncated():
+    question = {"role": "user", "content": "pergunta " * 2000}
+    messages, stats = build_prompt(SYSTEM, question, budget=1000)
+    assert stats.truncated
+    assert stats.tokens <= 1000
+    assert messages[-1]["content"].endswith("[…]")
+
+
+@pytest.mark.asyncio
+async def test_agent_prompt_respects_agent_budget(monkeypatch):
+    sent = {}
+
+    class FakeResponse:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"choices": [{"message": {"content": "Ofereça frete grátis."}}]}
+
+    async def fake_post_llm(client, api, model, url, **kwargs):
+        sent["messages"] = kwargs["json"]["messages"]
+        return FakeResponse()
+
+    monkeypatch.setattr(agents, "post_llm", fake_post_llm)
+    agent = agents.Agent(name="Vendas", emoji="💼", system_prompt="Ajude o vendedor.",
+                         specialties=[], commands={}, openai_api_key="sk-test")
+    agent.cache_responses = False
+    agent.context_token_budget = 500
+    # Bot fora do registry: rótulo "custom" (um rótulo por bot não teria limite)
+    observed = metrics.llm_prompt_tokens.count("custom")
+
+    answer = await agent.ask_with_context("como responder?", "u1", "Ana", contact_id="c1",
+                                          conversation_context=_context(60))
+
+    assert answer == "Ofereça frete grátis."
+    assert sum(message_tokens(m) for m in sent["messages"]) <= 500
+    # Sem histórico com o agente: ..., mensagem mais recente, fechamento, pergunta
+    assert sent["messages"][-3]["content"] == _context(60)[-1]["content"]
+    assert metrics.llm_prompt_tokens.count("custom") == observed + 1
+    assert metrics.llm_prompt_tokens.count("vendas") == 0
@@ -0,0 +1,215 @@
+import pytest
+
+import conversations
+from conversations import backfill_conversation_keys, conversation_key, stamp_conversation_key
+
+
+def test_conversation_key_is_direction_independent():
+    assert conversation_key("u1", "u2") == conversation_key("u2", "u1")
+    assert conversation_key("u1", "u2") == "u1|u2"
+
+
+def test_conversation_key_requires_both_participants():
+    assert conversation_key("u1", None) is None
+    assert conversation_key(None, "u2") is None
+
+
+def test_stamp_conversation_key_sets_field():
+    doc = stamp_conversation_key({"userId": "WA:5511", "contactId": "owner"})
+    assert doc["conversationKey"] == "WA:5511|owner"
+    broadcast = stamp_conversation_key({"author": "Bot"})
+    assert "conversationKey" in broadcast and broadcast["conversationKey"] is None
+
+
+class _Cursor:
+    def __init__(self, data):
+        self.data = data
+        self._limit = None
+
+    def sort(self, *_args):
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.data[:self._limit]
+
+
+class _Messages:
+    def __init__(self, docs):
+        self.docs = docs
+        self.bulk_calls = 0
+
+    def find(self, query, projection=None):
+        last = query.get("_id", {}).get("$gt")
+        rows = [
+            d for d in sorted(self.docs, key=lambda d: d["_id"])
+            if "conversationKey" not in d and (last is None or d["_id"] > last)
+        ]
+        return _Cursor(rows)
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk_calls += 1
+        by_id = {d["_id"]: d for d in self.docs}
+        for op in ops:
+            by_id[op._filter["_id"]].update(op._doc["$set"])
+
+        class Result:
+            modified_count = len(ops)
+        return Result()
+
+
+class _Migrations:
+    def __init__(self):
+        self.state = {}
+
+    async def find_one(self, query):
+        return self.state.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.state.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+
+class _Db:
+    def __init__(self):
+        self.migrations = _Migrations()
+
+
+@pytest.mark.asyncio
+async def test_backfill_is_batched_and_resumable(monkeypatch):
+    docs = [
+        {"_id": f"m{i:02d}", "userId": "a" if i % 2 else "b", "contactId": "b" if i % 2 else "a"}
+        for i in range(5)
+    ]
+    docs.append({"_id": "m99", "author": "Bot"})
+    messages = _Messages(docs)
+    fake_db = _Db()
+    monkeypatch.setattr(conversations, "messages_collection", messages)
+    monkeypatch.setattr(conversations, "db", fake_db)
+
+    updated = await backfill_conversation_keys(batch_size=2)
+
+    assert updated == 6
+    assert messages.bulk_calls == 3
+    assert all(d["conversationKey"] == "a|b" for d in docs[:5])
+    assert docs[-1]["conversationKey"] is None
+    assert fake_db.migrations.state[conversations.BACKFILL_MIGRATION_ID]["lastId"] == "m99"
+
+    # Segunda execução retoma do checkpoint e não encontra nada novo
+    assert await backfill_conversation_keys(batch_size=2) == 0
+
+
+class _Conversations:
+    """Read model em memória: aplica $set/$inc/$setOnInsert e o pipeline de decremento."""
+    def __init__(self):
+        self.ops = []
+        self.rows = {}
+
+    async def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        key = (query["ownerId"], query["peerId"])
+        before = dict(self.rows[key]) if key in self.rows else None
+        if before is None and not upsert:
+            return None
+        row = self.rows.setdefault(key, {"unreadCount": 0})
+        if isinstance(update, list):
+            amount = update[0]["$set"]["unreadCount"]["$max"][1]["$subtract"][1]
+            row["unreadCount"] = max(0, row["unreadCount"] - amount)
+        else:
+            row.update(update.get("$set", {}))
+            for field, inc in update.get("$inc", {}).items():
+                row[field] = row.get(field, 0) + inc
+        return before
+
+
+class _Counters:
+    def __init__(self, docs=None):
+        self.docs = docs or {}
+
+    async def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            if not upsert:
+                return
+            doc = self.docs[query["_id"]] = dict(update.get("$setOnInsert", {}))
+        for field, inc in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + inc
+
+
+def _message(i, sender="a", recipient="b", status="sent"):
+    from datetime import datetime
+    return stamp_conversation_key({
+        "_id": f"m{i}", "author": "Ana", "text": "oi", "status": status,
+        "userId": sender, "contactId": recipient, "createdAt": datetime(2025, 1, 1)
+    })
+
+
+@pytest.mark.asyncio
+async def test_record_message_updates_both_sides(monkeypatch):
+    fake = _Conversations()
+    monkeypatch.setattr(conversations, "conversations_collection", fake)
+    monkeypatch.setattr(conversations, "unread_counters_collection", _Counters())
+
+    await conversations.record_message(_message(1))
+
+    sender, = fake.ops
+    assert sender._filter == {"ownerId": "a", "peerId": "b"}
+    assert "$inc" not in sender._doc
+    recipient = fake.rows[("b", "a")]
+    assert recipient["unreadCount"] == 1
+    assert recipient["lastMessage"]["text"] == "oi"
+
+
+@pytest.mark.asyncio
+async def test_record_message_ignores_broadcast(monkeypatch):
+    fake = _Conversations()
+    monkeypatch.setattr(conversations, "conversations_collection", fake)
+    await conversations.record_message(stamp_conversation_key({"author": "Bot", "text": "oi"}))
+    assert fake.ops == [] and fake.rows == {}
+
+
+@pytest.mark.asyncio
+async def test_unread_totals_follow_inserts_and_reads(monkeypatch):
+    fake = _Conversations()
+    counters = _Counters({"b": {"_id": "b", "unreadMessages": 0, "unreadConversations": 0}})
+    monkeypatch.setattr(conversations, "conversations_collection", fake)
+    monkeypatch.setattr(conversations, "unread_counters_collection", counters)
+
+    # 3 mensagens de "a" e 1 de "c" para "b": 4 mensagens em 2 conversas
+    for i in range(3):
+        await conversations.record_message(_message(i, sender="a"))
+    await conversations.record_message(_message(9, sender="c"))
+    assert await conversations.get_unread_totals("b") == {"unreadConversations": 2, "unreadMessages": 4}
+
+    # Leitura parcial mantém a conversa como não-lida
+    await conversations.decrement_unread("b", "a", 2)
+    assert await conversations.get_unread_totals("b") == {"unreadConversations": 2, "unreadMessages": 2}
+
+    # Zerar a conversa remove ela do total; zerar de novo não muda nada
+    await conversations.reset_unread("b", "a")
+    await conversations.reset_unread("b", "a")
+    assert await conversations.get_unread_totals("b") == {"unreadConversations": 1, "unreadMessages": 1}
+
+
+@pytest.mark.asyncio
+async def test_unread_totals_rebuilt_from_read_model(monkeypatch):
+    class _Rows:
+        def find(self, query, projection=None):
+            class _C:
+                async def to_list(self, length=None):
+                    return [{"unreadCount": 3}, {"unreadCount": 1}]
+            return _C()
+
+    counters = _Counters()
+    monkeypatch.setattr(conversations, "conversations_collection", _Rows())
+    monkeypatch.setattr(conversations, "unread_counters_collection", counters)
+
+    assert await conversations.get_unread_totals("b") == {"unreadConversations": 2, "unreadMessages": 4}
+    assert counters.docs["b"]["unreadMessages"] == 4
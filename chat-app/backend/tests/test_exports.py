@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import exports
+from exports import iter_export
+
+
+class FakeExportCursor:
+    """Cursor assíncrono que registra quantos documentos já foram lidos."""
+    def __init__(self, data, stats):
+        self.data = data
+        self.stats = stats
+
+    def sort(self, keys):
+        self.stats["sort"] = keys
+        return self
+
+    def batch_size(self, n):
+        self.stats["batch_size"] = n
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.data:
+            self.stats["read"] += 1
+            yield doc
+
+
+class FakeExportCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.stats = {"read": 0}
+
+    def find(self, query, projection=None):
+        self.stats["query"] = query
+        self.stats["projection"] = projection
+        return FakeExportCursor(self.docs, self.stats)
+
+
+def _docs(n):
+    base = datetime(2025, 1, 1)
+    docs = [
+        {
+            "_id": f"m{i}", "author": "Ana", "text": f"linha {i}, com vírgula",
+            "createdAt": base + timedelta(seconds=i), "userId": "u1", "contactId": "u2"
+        }
+        for i in range(n)
+    ]
+    docs[1]["attachment"] = {"key": "uploads/a.png", "filename": "a.png"}
+    return docs
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_streams_in_batches(monkeypatch):
+    presigned = []
+    monkeypatch.setattr(exports, "presign_get", lambda key: presigned.append(key) or f"http://s3/{key}")
+    collection = FakeExportCollection(_docs(5))
+
+    chunks = iter_export(collection, {"conversationKey": "u1|u2"}, "ndjson", batch_size=2)
+
+    # Primeiro lote: só 2 documentos lidos do cursor e a URL do anexo já assinada
+    first = await chunks.__anext__()
+    assert collection.stats["read"] == 2
+    assert presigned == ["uploads/a.png"]
+    rest = await _collect(chunks)
+
+    lines = [json.loads(l) for l in (first + b"".join(rest)).decode().splitlines()]
+    assert [l["id"] for l in lines] == ["m0", "m1", "m2", "m3", "m4"]
+    assert lines[1]["url"] == "http://s3/uploads/a.png"
+    assert len(rest) == 2
+    assert collection.stats["batch_size"] == 2
+
+
+@pytest.mark.asyncio
+async def test_csv_export_has_header_and_quotes_text(monkeypatch):
+    monkeypatch.setattr(exports, "presign_get", lambda key: f"http://s3/{key}")
+    collection = FakeExportCollection(_docs(3))
+
+    body = b"".join(await _collect(iter_export(collection, {}, "csv", batch_size=10))).decode()
+
+    import csv
+    import io
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == exports.CSV_COLUMNS
+    assert rows[1][8] == "linha 0, com vírgula"
+    assert rows[2][9:] == ["a.png", "http://s3/uploads/a.png"]
+    assert len(rows) == 4
+
+
+def test_export_conversation_endpoint(client, monkeypatch):
+    collection = FakeExportCollection(_docs(2))
+    monkeypatch.setattr(exports, "presign_get", lambda key: f"http://s3/{key}")
+
+    class FakeDb:
+        messages = collection
+
+    monkeypatch.setattr("contacts.db", FakeDb())
+
+    response = client.get(
+        "/contacts/u2/messages/export?format=ndjson",
+        headers={"Authorization": "Bearer x"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="conversa-u2.ndjson"' in response.headers["content-disposition"]
+    assert len(response.text.splitlines()) == 2
+    assert collection.stats["query"] == {"conversationKey": "u1|u2"}
+
+
+def test_export_rejects_unknown_format(client):
+    response = client.get("/messages/export?format=xml")
+    assert response.status_code == 422
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+import llm_client
+import metrics
+from bots import agents, llm_cache
+from bots.llm_cache import ResponseCache, cache_key
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "tools"))
+import fake_openai  # noqa: E402
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setattr(fake_openai, "LATENCY_SECONDS", 0)
+    monkeypatch.setattr(fake_openai, "JITTER_SECONDS", 0)
+    monkeypatch.setattr(agents, "OPENAI_API_URL", "http://fake/v1/chat/completions")
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai.app))
+    monkeypatch.setattr(llm_client, "_client", client)
+    fake_openai.stats["completions"] = 0
+    return fake_openai.stats
+
+
+def _agent(cache_responses=True):
+    agent = agents.Agent(name="FaqBot", emoji="❓", system_prompt="Responda dúvidas frequentes.",
+                         specialties=[], commands={}, openai_api_key="sk-test")
+    agent.cache_responses = cache_responses
+    return agent
+
+
+def test_registry_agents_keep_their_key_as_metric_label():
+    assert agents.AGENTS_REGISTRY["sdr"].metric_label == "sdr"
+    assert _agent().metric_label == "custom"
+
+
+def test_cache_key_normalizes_question():
+    a = cache_key("faq", "m", "prompt", "Qual o horário de atendimento?", [])
+    b = cache_key("FAQ", "m", "prompt", "  qual o   horário de ATENDIMENTO ", [])
+    assert a == b
+    assert a != cache_key("faq", "m", "prompt", "Qual o horário de atendimento?", ["outro contexto"])
+    assert a != cache_key("faq", "m", "outro prompt", "Qual o horário de atendimento?", [])
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_oldest():
+    cache = ResponseCache(max_size=2, ttl=60)
+    await cache.put("a", "1")
+    await cache.put("b", "2")
+    await cache.get("a")
+    await cache.put("c", "3")
+    assert (await cache.get("b"))[1] == "miss"
+    assert (await cache.get("a")) == ("1", "memory")
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_is_answered_from_cache(fake_llm):
+    agent = _agent()
+    # Bot fora do registry: rótulo fixo "custom" na métrica
+    hits_before = metrics.llm_cache_lookups.value("custom", "memory")
+    first = await agent.ask("Qual o horário?", "u1", "Ana")
+    # Outro atendente com o mesmo nome e sem histórico: mesmo contexto
+    second = await agent.ask("qual o horário", "u2", "Ana")
+    assert first == second
+    assert fake_llm["completions"] == 1
+    assert metrics.llm_cache_lookups.value("custom", "memory") == hits_before + 1
+    assert metrics.llm_cache_lookups.value("faqbot", "memory") == 0
+    # O histórico do agente continua sendo gravado nas respostas do cache
+    assert await agent.get_history_count("u2") == 2
+
+
+@pytest.mark.asyncio
+async def test_agent_opt_out_skips_cache(fake_llm):
+    agent = _agent(cache_responses=False)
+    await agent.ask("Qual o horário?", "u1", "Ana")
+    await agent.ask("Qual o horário?", "u2", "Ana")
+    assert fake_llm["completions"] == 2
+
+
+def test_disabled_agents_env_matches_registry_key(monkeypatch):
+    # LLM_CACHE_DISABLED_AGENTS=advogado: "Dr. Advocatus" sai do cache pela chave
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DISABLED_AGENTS", {"advogado"})
+    advogado, sdr = agents.AGENTS_REGISTRY["advogado"], agents.AGENTS_REGISTRY["sdr"]
+    assert advogado.name.lower() != "advogado"
+    assert advogado._response_cache_key("oi", "Ana", []) is None
+    assert sdr._response_cache_key("oi", "Ana", []).startswith("sdr:")
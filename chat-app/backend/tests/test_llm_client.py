@@ -0,0 +1,17 @@
+import pytest
+
+import llm_client
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_until_closed():
+    await llm_client.start_llm_client()
+    client = llm_client.get_llm_client()
+    assert llm_client.get_llm_client() is client
+    await llm_client.close_llm_client()
+    assert client.is_closed
+    # Depois de fechado, um novo cliente é criado sob demanda
+    reopened = llm_client.get_llm_client()
+    assert reopened is not client
+    await llm_client.close_llm_client()
+
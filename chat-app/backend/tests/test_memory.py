@@ -0,0 +1,148 @@
+from datetime import datetime
+
+import pytest
+
+import database
+from bots import ai_bot, memory
+from bots.agents import AGENTS_REGISTRY
+from bots.memory import AgentMemory, turn_docs
+
+
+class OrderedCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+
+class AgentMessages:
+    """agent_messages com ordenação e limite de verdade (a memória depende deles)."""
+
+    def __init__(self):
+        self.data = []
+        self.finds = 0
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return OrderedCursor([d for d in self.data if all(d.get(k) == v for k, v in query.items())])
+
+    async def insert_many(self, docs, ordered=True):
+        self.data.extend(docs)
+
+    async def delete_many(self, query):
+        self.data = [d for d in self.data if not all(d.get(k) == v for k, v in query.items())]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    fake = AgentMessages()
+    monkeypatch.setattr(database, "agent_messages_collection", fake)
+    return fake
+
+
+def _turn(i, contact_id="c1", agent_key="sdr"):
+    docs = turn_docs("u1", agent_key, contact_id, "Ana", f"pergunta {i}", "SDR", f"resposta {i}")
+    # Um turno por minuto: pergunta e resposta em horários distintos
+    docs[0]["createdAt"] = datetime(2026, 1, 1, 10, i)
+    docs[1]["createdAt"] = datetime(2026, 1, 1, 10, i, 30)
+    return docs
+
+
+@pytest.mark.asyncio
+async def test_memory_loads_latest_messages_per_thread(collection):
+    store = AgentMemory(max_messages=4)
+    for i in range(5):
+        await store.append("u1", "sdr", "c1", _turn(i))
+    await store.append("u1", "sdr", "c2", _turn(9, contact_id="c2"))
+    await store.append("u1", "vendedor", "c1", _turn(8, agent_key="vendedor"))
+
+    store.reset()
+    history = await store.get("u1", "sdr", "c1")
+    assert [m["content"] for m in history] == ["pergunta 3", "resposta 3", "pergunta 4", "resposta 4"]
+    assert [m["content"] for m in await store.get("u1", "sdr", "c2")] == ["pergunta 9", "resposta 9"]
+    assert await store.get("u2", "sdr", "c1") == []
+
+
+@pytest.mark.asyncio
+async def test_hot_threads_are_served_from_cache(collection):
+    store = AgentMemory(max_messages=4)
+    await store.get("u1", "sdr", "c1")
+    store.remember("u1", "sdr", "c1", _turn(1))
+    assert [m["content"] for m in await store.get("u1", "sdr", "c1")] == ["pergunta 1", "resposta 1"]
+    assert collection.finds == 1
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_stays_bounded_and_drops_expired_entries(collection, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory.time, "monotonic", lambda: now[0])
+    store = AgentMemory(max_entries=3, ttl=60)
+    for user in ("a", "b", "c", "d"):
+        await store.get(user, "sdr", None)
+    assert store.stats()["size"] == 3
+
+    now[0] += 61
+    await store.get("e", "sdr", None)
+    assert store.stats()["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hot_thread_is_reloaded_after_ttl_even_if_used(collection, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory.time, "monotonic", lambda: now[0])
+    store = AgentMemory(ttl=60)
+    await store.get("u1", "sdr", "c1")
+    # Outra instância grava direto no Mongo
+    collection.data.extend(_turn(1))
+
+    # Uso contínuo (leitura e escrita local) não estende a validade
+    for _ in range(3):
+        now[0] += 25
+        store.remember("u1", "sdr", "c1", [])
+        history = await store.get("u1", "sdr", "c1")
+    assert [m["content"] for m in history] == ["pergunta 1", "resposta 1"]
+    assert collection.finds == 2
+
+
+@pytest.mark.asyncio
+async def test_clear_removes_thread(collection):
+    store = AgentMemory()
+    await store.append("u1", "sdr", "c1", _turn(1))
+    await store.append("u1", "sdr", "c2", _turn(2, contact_id="c2"))
+    await store.clear("u1", "sdr", "c1")
+    assert await store.get("u1", "sdr", "c1") == []
+    assert len(await store.get("u1", "sdr", "c2")) == 2
+
+
+@pytest.mark.asyncio
+async def test_guru_remembers_each_conversation_separately(collection):
+    await memory.agent_memory.append("u1", ai_bot.MEMORY_AGENT_KEY, "c1", turn_docs(
+        "u1", ai_bot.MEMORY_AGENT_KEY, "c1", "Ana", "pergunta", ai_bot.GURU_AUTHOR, "resposta"
+    ))
+    memory.agent_memory.reset()
+    assert await ai_bot.get_conversation_count("u1", "c1") == 2
+    assert await ai_bot.get_conversation_count("u1", "c2") == 0
+    await ai_bot.clear_conversation("u1", "c1")
+    assert await ai_bot.get_conversation_count("u1", "c1") == 0
+
+
+def test_answer_is_stamped_after_question():
+    asked_at = datetime.utcnow()
+    question, answer = turn_docs("u1", "sdr", None, "Ana", "oi", "SDR", "olá", asked_at)
+    assert question["createdAt"] == asked_at
+    assert answer["createdAt"] > asked_at
+
+
+def test_registry_agents_use_their_panel_key():
+    assert AGENTS_REGISTRY["advogado"].key == "advogado"
+    assert AGENTS_REGISTRY["sdr"].key == "sdr"
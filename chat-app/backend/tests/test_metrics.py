@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+
+import logging_setup
+import metrics
+from metrics import Histogram, post_llm, render_metrics
+from socket_manager import sio
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeHttpClient:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    async def post(self, url, **kwargs):
+        self.calls.append(url)
+        return self.response
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("t_seconds", "teste", ("op",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "a")
+    hist.observe(0.5, "a")
+    hist.observe(3, "a")
+    lines = hist.render()
+    assert 't_seconds_bucket{op="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{op="a",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{op="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{op="a"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_post_llm_records_latency_and_tokens():
+    before = metrics.llm_tokens.value("chat", "m-test", "prompt")
+    client = FakeHttpClient(FakeResponse(200, {"usage": {"prompt_tokens": 12, "completion_tokens": 5}}))
+    response = await post_llm(client, "chat", "m-test", "http://llm/chat", json={})
+    assert response.status_code == 200
+    assert metrics.llm_tokens.value("chat", "m-test", "prompt") == before + 12
+    assert metrics.llm_duration.count("chat", "m-test") >= 1
+    assert metrics.llm_requests.value("chat", "m-test", "200") >= 1
+
+
+def test_metrics_endpoint_exposes_route_templates_and_stats(client):
+    client.get("/")
+    body = client.get("/metrics").text
+    assert 'chat_http_requests_total{method="GET",route="/",status="200"}' in body
+    assert "chat_reply_pool_queued" in body
+    assert "chat_outbound_max_depth" in body
+    assert "# TYPE chat_event_loop_lag_seconds histogram" in body
+
+
+@pytest.mark.asyncio
+async def test_socket_events_are_timed_by_handler_name():
+    @sio.on("metrics:test")
+    async def handler(sid, data):
+        return "ok"
+
+    try:
+        assert await sio._trigger_event("metrics:test", "/", "sid1", {}) == "ok"
+        await sio._trigger_event("qualquer:coisa", "/", "sid1", {})
+    finally:
+        sio.handlers["/"].pop("metrics:test", None)
+    assert metrics.socket_duration.count("metrics:test") >= 1
+    assert metrics.socket_events.value("unhandled", "ok") >= 1
+    assert "qualquer:coisa" not in render_metrics()
+
+
+def test_log_event_sampling(monkeypatch):
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    logger = logging_setup.get_logger("test")
+    handler = Collect()
+    logger.addHandler(handler)
+    try:
+        monkeypatch.setattr(logging_setup, "LOG_SAMPLE_RATE", 0.0)
+        logging_setup.log_event(logger, "sampled.event", sampled=True, user="u1")
+        logging_setup.log_event(logger, "always.event", user="u1")
+    finally:
+        logger.removeHandler(handler)
+    assert [r.getMessage() for r in records] == ["always.event"]
+    line = logging_setup.KeyValueFormatter().format(records[0])
+    assert line == "level=info logger=chat.test event=always.event user=u1"
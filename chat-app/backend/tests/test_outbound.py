@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+import socketio
+
+import outbound
+from outbound import OutboundManager
+
+
+@pytest_asyncio.fixture
+async def manager(monkeypatch):
+    mgr = OutboundManager()
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=mgr)
+    delivered = []
+    depth = {"value": 0}
+    disconnected = []
+
+    async def fake_deliver(queue, event, data):
+        delivered.append((queue.sid, event, data))
+
+    async def fake_disconnect(sid, namespace=None, **_kwargs):
+        disconnected.append(sid)
+
+    monkeypatch.setattr(mgr, "_deliver", fake_deliver)
+    monkeypatch.setattr(mgr, "_engine_depth", lambda eio_sid: depth["value"])
+    monkeypatch.setattr(server, "disconnect", fake_disconnect)
+    monkeypatch.setattr(outbound, "_totals", {k: 0 for k in outbound._totals})
+    mgr.delivered, mgr.depth, mgr.disconnected = delivered, depth, disconnected
+    yield mgr
+    tasks = [queue.task for queue in mgr.queues.values()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def connect(mgr, eio_sid, room=None):
+    sid = await mgr.connect(eio_sid, "/")
+    if room:
+        mgr.basic_enter_room(sid, "/", room)
+    return sid
+
+
+@pytest.mark.asyncio
+async def test_room_emit_is_delivered_per_connection(manager):
+    a = await connect(manager, "e1", "user:ana")
+    b = await connect(manager, "e2", "user:ana")
+
+    await manager.emit("chat:new-message", {"id": "m1"}, "/", room="user:ana", skip_sid=b)
+    await asyncio.sleep(0.01)
+
+    assert manager.delivered == [(a, "chat:new-message", {"id": "m1"})]
+    assert manager.outbound_stats()["sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_backlog_is_prioritized_and_coalesced(manager):
+    sid = await connect(manager, "e1", "user:ana")
+    manager.depth["value"] = outbound.OUTBOUND_ENGINE_HIGH_WATER  # cliente sem ler
+
+    await manager.emit("chat:typing", {"userId": "bia", "isTyping": True}, "/", room="user:ana")
+    await manager.emit("chat:unread-updated", {"unreadMessages": 1}, "/", room="user:ana")
+    await manager.emit("chat:unread-updated", {"unreadMessages": 2}, "/", room="user:ana")
+    await manager.emit("chat:typing", {"userId": "bia", "isTyping": False}, "/", room="user:ana")
+    await manager.emit("chat:new-message", {"id": "m1"}, "/", room="user:ana")
+    await asyncio.sleep(0.01)
+
+    stats = manager.outbound_stats()
+    assert manager.delivered == []
+    assert stats["depths"] == {sid: 3} and stats["coalesced"] == 2
+
+    manager.depth["value"] = 0
+    await asyncio.sleep(0.1)
+    assert [(e, d) for _, e, d in manager.delivered] == [
+        ("chat:new-message", {"id": "m1"}),
+        ("chat:unread-updated", {"unreadMessages": 2}),
+        ("chat:typing", {"userId": "bia", "isTyping": False}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_deltas_are_not_overtaken_or_dropped_by_final_message(manager, monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_QUEUE_MAX", 3)
+    await connect(manager, "e1", "user:ana")
+    manager.depth["value"] = outbound.OUTBOUND_ENGINE_HIGH_WATER
+
+    await manager.emit("user:online", {"userId": "bia"}, "/", room="user:ana")
+    for seq in range(2):
+        await manager.emit("agent:message-delta", {"streamId": "s1", "seq": seq}, "/", room="user:ana")
+    # Fila cheia: o final descarta a presença, não um delta
+    await manager.emit("agent:message", {"streamId": "s1", "text": "ok"}, "/", room="user:ana")
+
+    manager.depth["value"] = 0
+    await asyncio.sleep(0.1)
+    assert [e for _, e, _ in manager.delivered] == ["agent:message-delta", "agent:message-delta", "agent:message"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_low_priority_then_disconnects(manager, monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_QUEUE_MAX", 2)
+    sid = await connect(manager, "e1", "user:ana")
+    manager.depth["value"] = outbound.OUTBOUND_ENGINE_HIGH_WATER
+
+    await manager.emit("user:online", {"userId": "bia"}, "/", room="user:ana")
+    await manager.emit("chat:new-message", {"id": "m1"}, "/", room="user:ana")
+    await manager.emit("chat:new-message", {"id": "m2"}, "/", room="user:ana")  # descarta presença
+    assert manager.outbound_stats()["dropped"] == 1
+
+    await manager.emit("chat:new-message", {"id": "m3"}, "/", room="user:ana")
+    await asyncio.sleep(0.01)
+
+    assert manager.disconnected == [sid]
+    assert manager.delivered[-1] == (sid, "connection:closing", {"reason": outbound.REASON_QUEUE_FULL})
+    assert manager.outbound_stats()["slowDisconnects"] == 1
+    assert sid not in manager.queues
+
+
+@pytest.mark.asyncio
+async def test_consumer_stuck_past_timeout_is_disconnected(manager, monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_SLOW_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(outbound, "OUTBOUND_POLL_SECONDS", 0.01)
+    sid = await connect(manager, "e1", "user:ana")
+    manager.depth["value"] = outbound.OUTBOUND_ENGINE_HIGH_WATER
+
+    await manager.emit("chat:new-message", {"id": "m1"}, "/", room="user:ana")
+    await asyncio.sleep(0.15)
+
+    assert manager.disconnected == [sid]
+    assert manager.delivered == [(sid, "connection:closing", {"reason": outbound.REASON_TIMEOUT})]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+
+def _matches(doc, query):
+    """Avalia o subconjunto de filtros Mongo usado pela paginação."""
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = doc.get(key)
+            if value is None:
+                return False
+            if "$lt" in cond and not value < cond["$lt"]:
+                return False
+            if "$gt" in cond and not value > cond["$gt"]:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeKeysetCursor:
+    def __init__(self, data):
+        self.data = data
+        self._limit = None
+
+    def sort(self, keys):
+        # Ordena por (createdAt, _id) na direção do primeiro campo
+        reverse = keys[0][1] == -1
+        self.data = sorted(self.data, key=lambda d: (d["createdAt"], d["_id"]), reverse=reverse)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.data[:self._limit]
+
+
+class FakeKeysetCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeKeysetCursor([d for d in self.docs if _matches(d, query)])
+
+
+def _docs(n, same_time=False):
+    base = datetime(2025, 1, 1)
+    return [
+        {"_id": ObjectId(), "text": str(i), "createdAt": base if same_time else base + timedelta(seconds=i)}
+        for i in range(n)
+    ]
+
+
+def test_cursor_round_trip():
+    doc = {"_id": ObjectId(), "createdAt": datetime(2025, 3, 4, 5, 6, 7, 123000)}
+    created_at, doc_id = decode_cursor(encode_cursor(doc))
+    assert created_at == doc["createdAt"]
+    assert doc_id == doc["_id"]
+
+
+def test_cursor_requires_created_at():
+    assert encode_cursor({"_id": "x"}) is None
+
+
+def test_invalid_cursor_returns_400():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("não-é-cursor")
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_walks_backwards_without_gaps():
+    # Mesmo createdAt em todas: a ordem depende só do desempate por _id
+    docs = _docs(7, same_time=True)
+    collection = FakeKeysetCollection(docs)
+
+    seen = []
+    cursor = None
+    while True:
+        page = await fetch_page(collection, {}, 3, cursor=cursor)
+        seen = [d["text"] for d in page.docs] + seen
+        if not page.has_more:
+            assert page.next_cursor is None
+            break
+        cursor = page.next_cursor
+
+    assert seen == [str(i) for i in range(7)]
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_after_returns_newer_in_order():
+    collection = FakeKeysetCollection(_docs(6))
+    oldest = await fetch_page(collection, {}, 2, cursor=encode_cursor(collection.docs[1]), direction="before")
+    assert [d["text"] for d in oldest.docs] == ["0"]
+    assert oldest.has_more is False
+
+    newer = await fetch_page(collection, {}, 2, cursor=oldest.prev_cursor, direction="after")
+    assert [d["text"] for d in newer.docs] == ["1", "2"]
+    assert newer.has_more is True
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_rejects_unknown_direction():
+    with pytest.raises(HTTPException):
+        await fetch_page(FakeKeysetCollection([]), {}, 10, direction="sideways")
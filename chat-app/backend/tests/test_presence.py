@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+import presence
+
+
+@pytest.fixture
+def presence_env(monkeypatch):
+    emits = []
+
+    async def fake_emit(event, payload, room=None, **kwargs):
+        emits.append((event, payload["userId"], room))
+
+    async def fake_watchers(user_id):
+        return {"u1": ["u2", "u3"], "u2": ["u1"]}.get(user_id, [])
+
+    monkeypatch.setattr(presence, "store", presence.InMemoryPresenceStore())
+    monkeypatch.setattr(presence, "_local_sockets", {})
+    monkeypatch.setattr(presence, "_pending_offline", {})
+    monkeypatch.setattr(presence.sio, "emit", fake_emit)
+    monkeypatch.setattr(presence, "list_watcher_ids", fake_watchers)
+    monkeypatch.setattr(presence, "PRESENCE_OFFLINE_GRACE_SECONDS", 0.02)
+    return emits
+
+
+@pytest.mark.asyncio
+async def test_online_goes_only_to_watchers_and_once_per_user(presence_env):
+    emits = presence_env
+
+    await presence.user_connected("u1", "sid-a")
+    await presence.user_connected("u1", "sid-b")  # segunda aba
+
+    assert emits == [("user:online", "u1", ["user:u2", "user:u3"])]
+    assert await presence.online_among(["u1", "u2"]) == {"u1"}
+
+
+@pytest.mark.asyncio
+async def test_offline_waits_for_last_tab_and_grace_period(presence_env):
+    emits = presence_env
+    await presence.user_connected("u1", "sid-a")
+    await presence.user_connected("u1", "sid-b")
+    emits.clear()
+
+    await presence.user_disconnected("u1", "sid-a")
+    await presence.user_disconnected("u1", "sid-b")
+    assert emits == []  # ainda na carência
+
+    await asyncio.sleep(0.05)
+    assert emits == [("user:offline", "u1", ["user:u2", "user:u3"])]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_within_grace_is_silent(presence_env):
+    emits = presence_env
+    await presence.user_connected("u1", "sid-a")
+    emits.clear()
+
+    await presence.user_disconnected("u1", "sid-a")
+    await presence.user_connected("u1", "sid-c")
+    await asyncio.sleep(0.05)
+
+    assert emits == []
+
+
+@pytest.mark.asyncio
+async def test_user_without_watchers_emits_nothing(presence_env):
+    await presence.user_connected("solo", "sid-x")
+    assert presence_env == []
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_renews_local_sockets_and_expires_dead_ones(presence_env, monkeypatch):
+    emits = presence_env
+    store = presence.store
+    now = 1_000_000.0
+    # u2 ficou registrado por uma instância que caiu (sem heartbeat)
+    await store.add("u2", "sid-morto", now)
+    await presence.user_connected("u1", "sid-a")
+    emits.clear()
+
+    later = now + presence.PRESENCE_TTL_SECONDS + 1
+    presence._local_sockets["sid-a"] = "u1"
+    await presence.heartbeat_once(later)
+
+    assert emits == [("user:offline", "u2", ["user:u1"])]
+    assert await store.online_among(["u1", "u2"], later) == {"u1"}
+
+
+class FakeRedis:
+    """Sorted sets do Redis em memória, com pipeline (só o que o store usa)."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.swept = []
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            async def execute(self):
+                return [await getattr(redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+        return Pipeline()
+
+    @staticmethod
+    def _bound(value):
+        return float(value.lstrip("(")) if isinstance(value, str) else float(value)
+
+    async def zadd(self, key, mapping, gt=False):
+        zset = self.zsets.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if member not in zset:
+                added += 1
+            if not gt or member not in zset or score > zset[member]:
+                zset[member] = score
+        return added
+
+    async def zremrangebyscore(self, key, low, high):
+        self.swept.append(key)
+        zset = self.zsets.get(key, {})
+        gone = [m for m, s in zset.items() if s <= self._bound(high)]
+        for m in gone:
+            del zset[m]
+        return len(gone)
+
+    async def zrangebyscore(self, key, low, high):
+        return [m for m, s in self.zsets.get(key, {}).items() if s <= self._bound(high)]
+
+    async def zrange(self, key, start, stop, withscores=False):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda i: i[1])
+        return items[start:][:1] if items else []
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zcount(self, key, low, high):
+        return sum(1 for s in self.zsets.get(key, {}).values() if s > self._bound(low))
+
+    async def zrem(self, key, member):
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+    async def expire(self, key, seconds):
+        return True
+
+
+@pytest.mark.asyncio
+async def test_redis_sweep_only_touches_expired_users():
+    store = object.__new__(presence.RedisPresenceStore)
+    store._redis = redis = FakeRedis()
+    now = 1_000_000.0
+    for i in range(50):
+        await store.add(f"vivo{i}", f"sid{i}", now)
+    await store.add("morto", "sid-morto", now - presence.PRESENCE_TTL_SECONDS)
+    # Renovado por outra instância depois do prazo registrado em deadlines
+    await store.add("renovado", "sid-r", now - presence.PRESENCE_TTL_SECONDS)
+    await redis.zadd(store._key("renovado"), {"sid-r": now + 30})
+    redis.swept.clear()
+
+    assert await store.expire(now + 1) == ["morto"]
+
+    # Só os usuários com prazo vencido foram lidos, não os 50 online
+    assert sorted(redis.swept) == [store._key("morto"), store._key("renovado")]
+    assert redis.zsets[store.DEADLINES_KEY]["renovado"] == now + 30
+    assert "morto" not in redis.zsets[store.DEADLINES_KEY]
+    assert await store.expire(now + 1) == []
@@ -0,0 +1,99 @@
+import pytest
+from bson import ObjectId
+
+import profile_cache
+from profile_cache import ProfileCache, get_profile, get_profiles, invalidate_profile
+
+
+class FakeProfileCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeProfileCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        wanted = query["_id"]["$in"]
+        return FakeProfileCursor([d for d in self.docs if d["_id"] in wanted])
+
+
+class FakeProfileDb:
+    def __init__(self, users, contacts):
+        self.users = FakeProfileCollection(users)
+        self.contacts = FakeProfileCollection(contacts)
+
+
+USER_ID = "507f1f77bcf86cd799439011"
+CONTACT_ID = "507f1f77bcf86cd799439022"
+
+
+@pytest.fixture
+def profile_db():
+    return FakeProfileDb(
+        users=[
+            {"_id": ObjectId(USER_ID), "name": "Ana", "email": "ana@x.com"},
+            {"_id": "legacy-user", "email": "legado@x.com"},
+        ],
+        contacts=[{"_id": ObjectId(CONTACT_ID), "phone": "+5511999999999"}],
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_resolves_users_and_contacts_with_one_query_each(profile_db):
+    profiles = await get_profiles(profile_db, [USER_ID, CONTACT_ID, "legacy-user", "nao-existe"])
+
+    assert profiles[USER_ID]["name"] == "Ana" and profiles[USER_ID]["external"] is False
+    assert profiles[CONTACT_ID]["name"] == "+5511999999999" and profiles[CONTACT_ID]["external"] is True
+    assert profiles["legacy-user"]["name"] == "legado@x.com"
+    assert "nao-existe" not in profiles
+    assert len(profile_db.users.queries) == 1 and len(profile_db.contacts.queries) == 1
+    # ObjectId e string no mesmo $in
+    assert ObjectId(USER_ID) in profile_db.users.queries[0]["_id"]["$in"]
+    assert USER_ID in profile_db.users.queries[0]["_id"]["$in"]
+
+
+@pytest.mark.asyncio
+async def test_cached_profiles_and_misses_skip_the_database(profile_db):
+    await get_profiles(profile_db, [USER_ID, "nao-existe"])
+    assert await get_profile(profile_db, USER_ID) is not None
+    assert await get_profile(profile_db, "nao-existe") is None
+
+    assert len(profile_db.users.queries) == 1
+    stats = profile_cache.profile_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hitRate"] == 0.5
+
+    # Invalidação força nova leitura
+    profile_db.users.docs[0]["name"] = "Ana Maria"
+    invalidate_profile(ObjectId(USER_ID))
+    assert (await get_profile(profile_db, USER_ID))["name"] == "Ana Maria"
+    assert len(profile_db.users.queries) == 2
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ProfileCache(max_size=2, ttl=60)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    cache.put("c", {"id": "c"})
+
+    assert cache.get("b") is profile_cache._MISSING
+    assert cache.get("a") == {"id": "a"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = ProfileCache(max_size=10, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(profile_cache.time, "monotonic", lambda: now[0])
+    cache.put("a", {"id": "a"})
+    now[0] += 61
+    assert cache.get("a") is profile_cache._MISSING
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+import socket_handlers
+
+
+class FakeReceiptCursor:
+    def __init__(self, data):
+        self.data = data
+
+    async def to_list(self, length=None):
+        return self.data
+
+
+class FakeReceiptMessages:
+    def __init__(self, docs):
+        self.docs = docs
+        self.updates = []
+
+    def find(self, query, projection=None):
+        ids = set(query["_id"]["$in"])
+        return FakeReceiptCursor([
+            d for d in self.docs
+            if d["_id"] in ids and d["contactId"] == query["contactId"] and d["status"] != "read"
+        ])
+
+    async def update_many(self, query, update):
+        self.updates.append(query)
+        for d in self.docs:
+            if d["_id"] in query["_id"]["$in"] and d["contactId"] == query["contactId"]:
+                d.update(update["$set"])
+
+
+@pytest.fixture
+def receipts(monkeypatch):
+    ids = [ObjectId() for _ in range(4)]
+    docs = [
+        {"_id": ids[0], "userId": "ana", "contactId": "me", "status": "sent"},
+        {"_id": ids[1], "userId": "ana", "contactId": "me", "status": "sent"},
+        {"_id": ids[2], "userId": "bia", "contactId": "me", "status": "sent"},
+        # Mensagem de outra conversa: não pode ser marcada por "me"
+        {"_id": ids[3], "userId": "ana", "contactId": "bia", "status": "sent"},
+    ]
+    messages = FakeReceiptMessages(docs)
+    emits = []
+    decrements = []
+
+    async def fake_emit(event, payload, room=None, **kwargs):
+        emits.append((event, payload, room, kwargs))
+
+    async def fake_decrement(owner, peer, amount=None):
+        decrements.append((owner, peer, amount))
+
+    monkeypatch.setattr(socket_handlers, "messages_collection", messages)
+    monkeypatch.setattr(socket_handlers.sio, "emit", fake_emit)
+    monkeypatch.setattr(socket_handlers, "decrement_unread", fake_decrement)
+    monkeypatch.setattr(socket_handlers, "schedule_unread_counts_push", lambda user_id: None)
+    monkeypatch.setattr(socket_handlers, "READ_RECEIPT_WINDOW_SECONDS", 0.01)
+    return [str(i) for i in ids], docs, messages, emits, decrements
+
+
+@pytest.mark.asyncio
+async def test_read_receipts_are_coalesced_and_targeted(receipts):
+    ids, docs, messages, emits, decrements = receipts
+
+    socket_handlers.queue_read_receipts("me", [ids[0]])
+    socket_handlers.queue_read_receipts("me", [ids[1], ids[3]])
+    socket_handlers.queue_read_receipts("me", [ids[2], "invalido"])
+    # Um único flush agendado, com referência mantida até terminar
+    assert len(socket_handlers._read_receipt_flushes) == 1
+    await asyncio.gather(*socket_handlers._read_receipt_flushes)
+    assert not socket_handlers._read_receipt_flushes
+
+    # Uma única escrita, restrita às mensagens recebidas por "me"
+    assert len(messages.updates) == 1
+    assert messages.updates[0]["contactId"] == "me"
+    assert [d["status"] for d in docs] == ["read", "read", "read", "sent"]
+
+    # chat:read só para a sala de cada remetente, sem broadcast
+    by_room = {room: (event, payload, kwargs) for event, payload, room, kwargs in emits}
+    assert set(by_room) == {"user:ana", "user:bia"}
+    event, payload, kwargs = by_room["user:ana"]
+    assert event == "chat:read"
+    assert sorted(payload["ids"]) == sorted(ids[:2]) and payload["readBy"] == "me"
+    assert by_room["user:bia"][1]["ids"] == [ids[2]]
+    assert "skip_sid" not in kwargs
+    assert sorted(decrements) == [("me", "ana", 2), ("me", "bia", 1)]
+
+
+@pytest.mark.asyncio
+async def test_flush_ignores_already_read(receipts):
+    ids, docs, messages, emits, _ = receipts
+    for d in docs:
+        d["status"] = "read"
+    assert await socket_handlers.flush_read_receipts("me", ids[:3]) == 0
+    assert messages.updates == [] and emits == []
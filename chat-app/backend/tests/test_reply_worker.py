@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import bots.reply_worker as reply_worker
+import streaming
+from bots.reply_worker import ReplyWorkerPool
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_same_user_run_in_order_and_users_in_parallel():
+    pool = ReplyWorkerPool(workers=2, max_queue=10)
+    log = []
+    release = asyncio.Event()
+
+    def job(name, wait=False):
+        async def run():
+            log.append(f"start {name}")
+            if wait:
+                await release.wait()
+            log.append(f"end {name}")
+        return run
+
+    assert pool.submit("ana", job("ana-1", wait=True))
+    assert pool.submit("ana", job("ana-2"))
+    assert pool.submit("bia", job("bia-1"))
+    await asyncio.sleep(0.01)
+
+    # ana-2 espera ana-1 terminar; bia não fica presa atrás de ana
+    assert log == ["start ana-1", "start bia-1", "end bia-1"]
+    assert pool.stats()["running"] == 1 and pool.stats()["queued"] == 1
+
+    release.set()
+    await pool.join()
+    assert log[3:] == ["end ana-1", "start ana-2", "end ana-2"]
+    assert pool.stats()["processed"] == 3
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_and_failures_are_counted():
+    pool = ReplyWorkerPool(workers=1, max_queue=2)
+    gate = asyncio.Event()
+
+    async def blocked():
+        await gate.wait()
+
+    async def boom():
+        raise RuntimeError("falhou")
+
+    assert pool.submit("ana", blocked)
+    await asyncio.sleep(0)  # worker pega o primeiro job
+    assert pool.submit("ana", boom)
+    assert pool.submit("bia", boom)
+    assert not pool.submit("bia", boom)
+
+    gate.set()
+    await pool.join()
+    stats = pool.stats()
+    assert (stats["processed"], stats["failed"], stats["rejected"]) == (3, 2, 1)
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_humanized_typing_does_not_hold_the_worker(monkeypatch):
+    published = []
+
+    async def fake_emit(*_args, **_kwargs):
+        return None
+
+    async def fake_publish(_emit, author, text, user_id=None, target_sid=None, **_kwargs):
+        published.append((text, target_sid))
+
+    async def fake_ask(message, user_id, user_name, on_delta=None, contact_id=None):
+        return f"resposta: {message}"
+
+    async def no_keyword(_emit, _text):
+        return None
+
+    monkeypatch.setattr(reply_worker.sio, "emit", fake_emit)
+    monkeypatch.setattr(reply_worker, "publish_message", fake_publish)
+    monkeypatch.setattr(reply_worker, "ask_chatgpt", fake_ask)
+    monkeypatch.setattr(reply_worker, "handle_keyword_if_matches", no_keyword)
+    monkeypatch.setattr(reply_worker, "HUMANIZED_TYPING", True)
+    # Digitação humanizada só vale para respostas sem streaming
+    monkeypatch.setattr(streaming, "LLM_STREAMING", False)
+    monkeypatch.setattr(reply_worker, "typing_delay", lambda text: 0.05)
+
+    pool = ReplyWorkerPool(workers=1, max_queue=10)
+    pool.submit("ana", lambda: reply_worker.guru_reply("ana", "Ana", "um"))
+    pool.submit("ana", lambda: reply_worker.guru_reply("ana", "Ana", "dois"))
+    await pool.join()
+
+    # Worker já liberado; as respostas saem depois da "digitação", na ordem
+    assert published == []
+    await asyncio.sleep(0.15)
+    assert [t for t, _ in published] == ["resposta: um", "resposta: dois"]
+    assert published[0][1] == "user:ana"
+    await pool.stop()
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from search import highlight_spans, normalize, query_terms, search_entries, search_messages
+
+
+def test_normalize_strips_accents():
+    assert normalize("Ação Reunião ÇÃO") == "acao reuniao cao"
+
+
+def test_query_terms_dedupes_and_drops_short_words():
+    assert query_terms("Reunião e reuniao AMANHÃ") == ["reuniao", "amanha"]
+
+
+def test_highlight_spans_match_accented_text():
+    text = "Confirmada a reunião; as reuniões de amanhã mudaram"
+    spans = highlight_spans(text, query_terms("reuniao amanha"))
+    assert [text[s:e] for s, e in spans] == ["reunião", "reuniões", "amanhã"]
+
+
+class FakeSearchCursor:
+    def __init__(self, data, calls):
+        self.data = data
+        self.calls = calls
+        self._skip = 0
+        self._limit = None
+
+    def sort(self, keys):
+        self.calls["sort"] = keys
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.data[self._skip:self._skip + self._limit]
+
+
+class FakeSearchCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = {}
+
+    def find(self, query, projection=None):
+        self.calls["query"] = query
+        self.calls["projection"] = projection
+        return FakeSearchCursor(self.docs, self.calls)
+
+
+def _docs(n):
+    base = datetime(2025, 1, 1)
+    return [
+        {"_id": f"s{i}", "messageId": f"m{i}", "ownerId": "u1", "peerId": "u2", "author": "Ana", "text": f"Reunião {i}", "createdAt": base + timedelta(minutes=i),
+         "userId": "u1", "contactId": "u2", "score": 1.5 - i / 10}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_is_scoped_to_caller_and_paginates():
+    collection = FakeSearchCollection(_docs(5))
+
+    page1 = await search_messages(collection, "u1", "reuniao", limit=2)
+
+    query = collection.calls["query"]
+    assert query["$text"]["$search"] == "reuniao"
+    # Igualdade no prefixo do índice de texto: só as entradas do próprio usuário
+    assert query["ownerId"] == "u1" and "$or" not in query
+    assert collection.calls["projection"]["score"] == {"$meta": "textScore"}
+    assert [r["id"] for r in page1["results"]] == ["m0", "m1"]
+    assert page1["results"][0]["highlights"] == [[0, 7]]
+    assert page1["hasMore"] is True
+
+    page2 = await search_messages(collection, "u1", "reuniao", limit=2, cursor=page1["nextCursor"])
+    page3 = await search_messages(collection, "u1", "reuniao", limit=2, cursor=page2["nextCursor"])
+    assert [r["id"] for r in page2["results"]] == ["m2", "m3"]
+    assert [r["id"] for r in page3["results"]] == ["m4"]
+    assert page3["hasMore"] is False and page3["nextCursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_search_in_one_conversation_filters_by_peer():
+    collection = FakeSearchCollection([])
+    await search_messages(collection, "u1", "oi tudo bem", contact_id="u2")
+    assert collection.calls["query"]["ownerId"] == "u1"
+    assert collection.calls["query"]["peerId"] == "u2"
+
+
+def test_search_entries_one_per_participant():
+    doc = {"_id": "m1", "conversationKey": "u1|u2", "userId": "u1", "contactId": "u2",
+           "author": "Ana", "text": "Reunião amanhã", "createdAt": datetime(2025, 1, 1)}
+    entries = search_entries(doc)
+    assert [(e["ownerId"], e["peerId"]) for e in entries] == [("u1", "u2"), ("u2", "u1")]
+    assert all(e["messageId"] == "m1" and e["text"] == "Reunião amanhã" for e in entries)
+    # Broadcast (sem conversa) e mensagens sem texto não entram na busca
+    assert search_entries({**doc, "conversationKey": None}) == []
+    assert search_entries({**doc, "text": ""}) == []
+
+
+@pytest.mark.asyncio
+async def test_search_rejects_empty_query_and_bad_cursor():
+    collection = FakeSearchCollection([])
+    with pytest.raises(HTTPException):
+        await search_messages(collection, "u1", "!")
+    with pytest.raises(HTTPException) as exc:
+        await search_messages(collection, "u1", "reuniao", cursor="???")
+    assert exc.value.status_code == 400
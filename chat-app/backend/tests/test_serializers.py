@@ -0,0 +1,35 @@
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+import serializers
+from serializers import ORJSONResponse, message_to_dict
+
+
+def test_orjson_response_handles_objectid_and_datetime():
+    oid = ObjectId()
+    body = json.loads(ORJSONResponse({"id": oid, "at": datetime(2025, 1, 2, 3, 4, 5)}).body)
+    assert body == {"id": str(oid), "at": "2025-01-02T03:04:05"}
+
+
+def test_message_to_dict_supports_legacy_timestamp_and_attachment(monkeypatch):
+    calls = []
+    monkeypatch.setattr(serializers, "presign_get", lambda key: calls.append(key) or f"http://s3/{key}")
+    monkeypatch.setattr(serializers, "_presign_cache", {})
+
+    legacy = message_to_dict({"_id": "m1", "author": "Ana", "text": "oi", "timestamp": 1700000000000})
+    assert legacy["timestamp"] == 1700000000000
+    assert legacy["status"] == "sent" and "url" not in legacy
+
+    doc = {
+        "_id": ObjectId(), "author": "Ana", "text": "foto", "type": "image",
+        "createdAt": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        "attachment": {"key": "uploads/a.png"},
+    }
+    first = message_to_dict(doc)
+    second = message_to_dict(doc)
+    assert first["url"] == second["url"] == "http://s3/uploads/a.png"
+    assert first["timestamp"] == 1735689600000
+    # URL assinada reaproveitada entre páginas
+    assert calls == ["uploads/a.png"]
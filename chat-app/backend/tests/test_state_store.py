@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import state_store
+from state_store import CachedStateStore, InMemoryStateStore
+from bots import ai_bot
+
+
+class CountingStore(InMemoryStateStore):
+    """Store em memória que conta as leituras (simula o Redis atrás do cache)."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get(self, key):
+        self.reads += 1
+        return await super().get(key)
+
+    async def members(self, key):
+        self.reads += 1
+        return await super().members(key)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_ttl_expires(monkeypatch):
+    store = InMemoryStateStore()
+    await store.put("k", {"a": 1}, ttl=10)
+    assert await store.get("k") == {"a": 1}
+    later = time.monotonic() + 11
+    monkeypatch.setattr(state_store.time, "monotonic", lambda: later)
+    assert await store.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_push_capped_keeps_last_items():
+    store = InMemoryStateStore()
+    await store.push_capped("h", [1, 2, 3], maxlen=4)
+    await store.push_capped("h", [4, 5], maxlen=4)
+    assert await store.get_list("h") == [2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_cached_store_reads_through_and_invalidates_on_write():
+    backend = CountingStore()
+    store = CachedStateStore(backend, ttl=60)
+    await store.add_member("s", "guru")
+    assert await store.members("s") == {"guru"}
+    assert await store.members("s") == {"guru"}
+    assert backend.reads == 1
+    assert store.hits == 1
+
+    # Escrita local invalida a chave: a próxima leitura vai ao backend
+    await store.remove_member("s", "guru")
+    assert await store.members("s") == set()
+    assert backend.reads == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_store_sees_remote_writes_after_ttl(monkeypatch):
+    backend = CountingStore()
+    store = CachedStateStore(backend, ttl=1)
+    assert await store.get("prefs") is None
+    # Outro nó grava direto no backend
+    await backend.put("prefs", {"mode": "tecnico"})
+    assert await store.get("prefs") is None
+    later = time.monotonic() + 2
+    monkeypatch.setattr(state_store.time, "monotonic", lambda: later)
+    assert await store.get("prefs") == {"mode": "tecnico"}
+
+
+@pytest.mark.asyncio
+async def test_cached_store_is_bounded_lru_and_drops_expired(monkeypatch):
+    backend = CountingStore()
+    store = CachedStateStore(backend, ttl=1, max_size=2)
+    await store.get("a")
+    await store.get("b")
+    await store.get("a")
+    # "b" é a menos usada: sai quando "c" entra
+    await store.get("c")
+    assert list(store._cache) == [("value", "a"), ("value", "c")]
+
+    # Entrada vencida sai na leitura, mesmo sem passar do limite
+    later = time.monotonic() + 2
+    monkeypatch.setattr(state_store.time, "monotonic", lambda: later)
+    monkeypatch.setattr(backend, "get", lambda key: _raise())
+    with pytest.raises(RuntimeError):
+        await store.get("a")
+    assert ("value", "a") not in store._cache
+
+
+async def _raise():
+    raise RuntimeError("backend fora")
+
+
+@pytest.mark.asyncio
+async def test_agent_sessions_are_case_insensitive():
+    await state_store.open_agent_session("u1", "Guru")
+    assert await state_store.is_agent_session_open("u1", "guru")
+    assert not await state_store.is_agent_session_open("u2", "guru")
+    await state_store.close_agent_session("u1", "GURU")
+    assert not await state_store.is_agent_session_open("u1", "guru")
+
+
+@pytest.mark.asyncio
+async def test_guru_mode_lives_in_store():
+    assert await ai_bot.get_user_mode("u1") == "casual"
+    assert (await ai_bot.set_user_mode("u1", "tecnico")).startswith("✅")
+    assert await ai_bot.get_user_mode("u1") == "tecnico"
+    assert await ai_bot.get_user_preferences("u1") == {"mode": "tecnico", "language": "pt"}
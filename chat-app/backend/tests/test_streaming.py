@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+import llm_client
+import metrics
+import streaming
+from streaming import DeltaStream
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "tools"))
+import fake_openai  # noqa: E402
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_completion_forwards_deltas(monkeypatch):
+    monkeypatch.setattr(fake_openai, "LATENCY_SECONDS", 0)
+    monkeypatch.setattr(fake_openai, "JITTER_SECONDS", 0)
+    monkeypatch.setattr(fake_openai, "TOKEN_SECONDS", 0)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai.app))
+    monkeypatch.setattr(llm_client, "_client", client)
+    ttft_before = metrics.llm_ttft.count("chat", "stream-test")
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    text = await llm_client.stream_chat_completion(
+        "http://fake/v1/chat/completions", {},
+        {"model": "stream-test", "messages": [{"role": "user", "content": "oi"}]},
+        on_delta,
+    )
+    await client.aclose()
+
+    assert text == "Resposta simulada para: oi"
+    assert len(deltas) > 1 and "".join(deltas) == text
+    assert metrics.llm_ttft.count("chat", "stream-test") == ttft_before + 1
+    assert metrics.llm_tokens.value("chat", "stream-test", "completion") > 0
+
+
+@pytest.mark.asyncio
+async def test_delta_stream_batches_until_flush(monkeypatch):
+    emitted = []
+
+    async def fake_emit(event, payload, room=None, **_kwargs):
+        emitted.append((event, payload, room))
+
+    monkeypatch.setattr(streaming.sio, "emit", fake_emit)
+    monkeypatch.setattr(streaming, "LLM_STREAM_FLUSH_SECONDS", 60)
+    stream = DeltaStream("chat:message-delta", "user:ana", {"author": "Guru"})
+    for part in ("Olá", ", ", "Ana"):
+        await stream.push(part)
+    assert emitted == []
+    await stream.flush()
+    await stream.flush()
+    assert emitted == [("chat:message-delta",
+                        {"author": "Guru", "streamId": stream.id, "seq": 0, "delta": "Olá, Ana"},
+                        "user:ana")]
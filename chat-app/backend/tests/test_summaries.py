@@ -0,0 +1,245 @@
+import asyncio
+import operator
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import socket_handlers
+from bots import summaries
+from conversations import conversation_key
+
+OPS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt}
+BASE = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(_matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(_matches(doc, q) for q in cond)
+        elif isinstance(cond, dict):
+            ok = key in doc and all(OPS[op](doc[key], value) for op, value in cond.items())
+        else:
+            ok = doc.get(key) == cond
+        if not ok:
+            return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+
+class Messages:
+    """messages com filtros de range, ordenação e limite (o cursor do resumo depende deles)."""
+
+    def __init__(self):
+        self.data = []
+
+    def find(self, query, projection=None):
+        return Cursor([d for d in self.data if _matches(d, query)])
+
+    def add(self, n, start=0):
+        for i in range(start, start + n):
+            sender, recipient = ("c1", "u1") if i % 2 == 0 else ("u1", "c1")
+            self.data.append({"_id": f"m{i:03d}", "conversationKey": conversation_key("u1", "c1"),
+                              "userId": sender, "contactId": recipient, "author": sender,
+                              "text": f"mensagem {i}", "createdAt": BASE + timedelta(minutes=i)})
+
+
+class Summaries:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        doc = self.docs.get((query["userId"], query["contactId"]))
+        return dict(doc) if doc else None
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault((query["userId"], query["contactId"]), dict(query))
+        doc.update(update["$set"])
+        for field, amount in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+@pytest.fixture
+def store(monkeypatch):
+    messages, stored = Messages(), Summaries()
+    monkeypatch.setattr(database, "messages_collection", messages)
+    monkeypatch.setattr(database, "conversation_summaries_collection", stored)
+    return messages, stored
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    calls = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"choices": [{"message": {"content": f"resumo {len(calls)}"}}]}
+
+    async def fake_post_llm(client, api, model, url, **kwargs):
+        calls.append(kwargs["json"]["messages"])
+        return FakeResponse()
+
+    monkeypatch.setattr(summaries, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(summaries, "post_llm", fake_post_llm)
+    return calls
+
+
+def _texts(prompt):
+    return [m["content"].split(": ", 1)[1] for m in prompt if m["content"].startswith("[")]
+
+
+@pytest.mark.asyncio
+async def test_refresh_folds_only_messages_after_cursor(store, llm):
+    messages, stored = store
+    messages.add(3)
+
+    doc = await summaries.refresh_summary("u1", "c1")
+    assert doc["summary"] == "resumo 1" and doc["cursor"]["id"] == "m002"
+    assert _texts(llm[0]) == ["mensagem 0", "mensagem 1", "mensagem 2"]
+
+    messages.add(2, start=3)
+    doc = await summaries.refresh_summary("u1", "c1")
+    # Só as novas, com o resumo anterior no system prompt
+    assert _texts(llm[1]) == ["mensagem 3", "mensagem 4"]
+    assert "RESUMO ATÉ AGORA:\nresumo 1" in llm[1][0]["content"]
+    assert stored.docs[("u1", "c1")]["messageCount"] == 5
+    assert stored.docs[("u1", "c1")]["cursor"]["id"] == "m004"
+
+    # Nada novo: nenhuma chamada ao LLM
+    await summaries.refresh_summary("u1", "c1")
+    assert len(llm) == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_folds_backlog_in_batches(store, llm, monkeypatch):
+    messages, stored = store
+    monkeypatch.setattr(summaries, "SUMMARY_BATCH_MAX", 2)
+    messages.add(5)
+
+    doc = await summaries.refresh_summary("u1", "c1")
+
+    assert [_texts(p) for p in llm] == [["mensagem 0", "mensagem 1"], ["mensagem 2", "mensagem 3"], ["mensagem 4"]]
+    assert doc["summary"] == "resumo 3" and doc["messageCount"] == 5
+
+
+@pytest.mark.asyncio
+async def test_refresh_after_n_messages_only_for_tracked(monkeypatch):
+    refreshed = []
+
+    async def fake_refresh(user_id, contact_id):
+        refreshed.append((user_id, contact_id))
+
+    monkeypatch.setattr(summaries, "refresh_summary", fake_refresh)
+    monkeypatch.setattr(summaries, "SUMMARY_EVERY_MESSAGES", 3)
+    message = {"userId": "c1", "contactId": "u1"}
+
+    for _ in range(5):
+        summaries.note_message(message)
+    assert not summaries._threads
+
+    summaries.track("u1", "c1")
+    for _ in range(3):
+        summaries.note_message(message)
+    # O timer de inatividade das duas primeiras é cancelado pelo refresh
+    await asyncio.gather(*summaries._background, return_exceptions=True)
+
+    assert refreshed == [("u1", "c1")]
+    assert summaries.summaries_stats() == {"tracked": 1, "pending": 0}
+
+
+@pytest.mark.asyncio
+async def test_refresh_when_conversation_goes_idle(monkeypatch):
+    refreshed = []
+
+    async def fake_refresh(user_id, contact_id):
+        refreshed.append((user_id, contact_id))
+
+    monkeypatch.setattr(summaries, "refresh_summary", fake_refresh)
+    monkeypatch.setattr(summaries, "SUMMARY_IDLE_SECONDS", 0.05)
+    summaries.track("u1", "c1")
+
+    summaries.note_message({"userId": "u1", "contactId": "c1"})
+    await asyncio.sleep(0.02)
+    summaries.note_message({"userId": "c1", "contactId": "u1"})
+    assert refreshed == []
+
+    await asyncio.gather(*summaries._background)
+    assert refreshed == [("u1", "c1")]
+
+
+@pytest.mark.asyncio
+async def test_summary_context_is_summary_plus_unsummarized_tail(store, llm, monkeypatch):
+    messages, _ = store
+    monkeypatch.setattr(summaries, "SUMMARY_KEEP_RECENT", 2)
+    messages.add(6)
+    await summaries.refresh_summary("u1", "c1")
+    messages.add(3, start=6)
+
+    context = await summaries.summary_context("u1", "c1")
+
+    assert context[0] == {"role": "system", "content": "RESUMO DA CONVERSA ATÉ AQUI:\nresumo 1"}
+    assert _texts(context[1:]) == ["mensagem 6", "mensagem 7", "mensagem 8"]
+    # Mensagem do próprio usuário vira "assistant"
+    assert [m["role"] for m in context[1:]] == ["user", "assistant", "user"]
+
+    # Tudo resumido: ainda leva as últimas SUMMARY_KEEP_RECENT
+    await summaries.refresh_summary("u1", "c1")
+    context = await summaries.summary_context("u1", "c1")
+    assert context[0]["content"].endswith("resumo 2")
+    assert _texts(context[1:]) == ["mensagem 7", "mensagem 8"]
+
+
+@pytest.mark.asyncio
+async def test_summary_request_serves_stored_summary_then_refreshes(store, llm, monkeypatch):
+    messages, _ = store
+    emitted = []
+
+    async def fake_emit(event, payload, to=None):
+        emitted.append((event, payload))
+
+    async def fake_get_agent(agent_key, user_id):
+        return object()
+
+    import bots.agents as agents_module
+    monkeypatch.setattr(agents_module, "get_agent", fake_get_agent)
+    monkeypatch.setattr(socket_handlers.sio, "emit", fake_emit)
+    monkeypatch.setattr(socket_handlers.sio, "get_environ", lambda sid: {"user_id": "u1", "user_name": "Ana"})
+    messages.add(4)
+    await summaries.refresh_summary("u1", "c1")
+    request = {"agentKey": "sdr", "contactId": "c1"}
+
+    # Em dia: sai direto do banco, sem LLM
+    await socket_handlers.process_summary_request("sid", request)
+    assert [p["summary"] for _, p in emitted] == ["resumo 1"]
+    assert emitted[0][1]["stale"] is False
+    assert len(llm) == 1
+
+    # Mensagens novas: o resumo gravado sai primeiro, marcado como desatualizado
+    messages.add(2, start=4)
+    emitted.clear()
+    await socket_handlers.process_summary_request("sid", request)
+    assert [(p["summary"], p["stale"]) for _, p in emitted] == [("resumo 1", True), ("resumo 2", False)]
+    assert _texts(llm[1]) == ["mensagem 4", "mensagem 5"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import typing_throttle
+
+
+@pytest.fixture
+def typing_emits(monkeypatch):
+    emits = []
+
+    async def fake_emit(event, payload, room=None, **kwargs):
+        emits.append((payload["isTyping"], room))
+
+    monkeypatch.setattr(typing_throttle.sio, "emit", fake_emit)
+    monkeypatch.setattr(typing_throttle, "_typing_state", {})
+    monkeypatch.setattr(typing_throttle, "_stats", {"received": 0, "forwarded": 0, "suppressed": 0, "expired": 0})
+    return emits
+
+
+@pytest.mark.asyncio
+async def test_repeated_typing_is_throttled_and_stop_goes_out(typing_emits, monkeypatch):
+    monkeypatch.setattr(typing_throttle, "TYPING_THROTTLE_SECONDS", 10)
+
+    for _ in range(20):
+        await typing_throttle.handle_typing_event("ana", "bia", "Ana", True)
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", False)
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", False)
+
+    assert typing_emits == [(True, "user:bia"), (False, "user:bia")]
+    stats = typing_throttle.typing_stats()
+    assert (stats["received"], stats["forwarded"], stats["suppressed"]) == (22, 2, 20)
+    assert stats["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_typing_is_refreshed_after_window(typing_emits, monkeypatch):
+    monkeypatch.setattr(typing_throttle, "TYPING_THROTTLE_SECONDS", 0.02)
+
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", True)
+    await asyncio.sleep(0.03)
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", True)
+
+    assert typing_emits == [(True, "user:bia"), (True, "user:bia")]
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", False)
+
+
+@pytest.mark.asyncio
+async def test_stale_indicator_expires(typing_emits, monkeypatch):
+    monkeypatch.setattr(typing_throttle, "TYPING_EXPIRE_SECONDS", 0.03)
+
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", True)
+    await asyncio.sleep(0.015)
+    await typing_throttle.handle_typing_event("ana", "bia", "Ana", True)  # adia a expiração
+    await asyncio.sleep(0.02)
+    assert typing_emits == [(True, "user:bia")]
+
+    await asyncio.sleep(0.03)
+    assert typing_emits == [(True, "user:bia"), (False, "user:bia")]
+    assert typing_throttle.typing_stats()["expired"] == 1
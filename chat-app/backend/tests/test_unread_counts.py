@@ -10,23 +10,16 @@ async def test_unread_count_requires_authentication(client):
 @pytest.mark.asyncio
 async def test_unread_count_returns_counts(monkeypatch):
     """Testa que o endpoint retorna o número de conversas não-lidas e mensagens não-lidas"""
-    # Fake messages collection
-    class FakeMessagesCollection:
-        async def count_documents(self, query):
-            # Deve contar mensagens onde contactId == current_user
-            return 5
+    class FakeCounters:
+        async def find_one(self, query):
+            # Documento de totais do usuário (_id = userId)
+            assert query == {"_id": "507f1f77bcf86cd799439001"}
+            return {"_id": query["_id"], "unreadConversations": 2, "unreadMessages": 5}
 
-        async def distinct(self, field, query):
-            # Retorna lista de userIds que enviaram mensagens não-lidas
-            return ["507f1f77bcf86cd799439012", "507f1f77bcf86cd799439013"]
-
-    class FakeDb:
-        def __init__(self):
-            self.messages = FakeMessagesCollection()
+    import conversations
+    monkeypatch.setattr(conversations, "unread_counters_collection", FakeCounters())
 
     import contacts
-    monkeypatch.setattr("contacts.db", FakeDb())
-
     # Chama a função diretamente (sem Request) passando o user id
     result = await contacts.unread_counts("507f1f77bcf86cd799439001")
 
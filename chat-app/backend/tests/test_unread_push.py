@@ -13,37 +13,52 @@ async def test_emit_unread_counts_for_user(monkeypatch):
 
     monkeypatch.setattr(socket_handlers.sio, 'emit', fake_emit)
 
-    # Fake messages_collection methods
-    async def fake_count_documents(query):
-        assert query.get('contactId') == 'target_user'
-        return 5
+    # Totais vêm dos contadores incrementais, sem varrer mensagens
+    async def fake_totals(user_id):
+        assert user_id == 'target_user'
+        return {'unreadConversations': 2, 'unreadMessages': 5}
 
-    async def fake_distinct(field, query):
-        assert field == 'userId'
-        return ['u1', 'u2']
-
-    monkeypatch.setattr(socket_handlers, 'messages_collection', socket_handlers.messages_collection)
-    monkeypatch.setattr(socket_handlers.messages_collection, 'count_documents', fake_count_documents)
-    monkeypatch.setattr(socket_handlers.messages_collection, 'distinct', fake_distinct)
-
-    # Simula usuário conectado
-    socket_handlers.user_sessions['target_user'] = 'sid-123'
+    monkeypatch.setattr(socket_handlers, 'get_unread_totals', fake_totals)
 
     res = await socket_handlers.emit_unread_counts_for_user('target_user')
 
-    assert ('chat:unread-updated', {'unreadConversations': 2, 'unreadMessages': 5}, 'sid-123') in calls
+    assert ('chat:unread-updated', {'unreadConversations': 2, 'unreadMessages': 5}, 'user:target_user') in calls
     assert res['unreadConversations'] == 2
     assert res['unreadMessages'] == 5
 
 
 @pytest.mark.asyncio
-async def test_mark_conversation_read_emits(monkeypatch):
-    # Monkeypatch emit_unread_counts_for_user
+async def test_unread_push_is_debounced(monkeypatch):
     calls = []
+
     async def fake_emit_counts(user_id):
         calls.append(user_id)
 
     monkeypatch.setattr(socket_handlers, 'emit_unread_counts_for_user', fake_emit_counts)
+    monkeypatch.setattr(socket_handlers, 'UNREAD_PUSH_DEBOUNCE_SECONDS', 0.01)
+
+    # Rajada de 50 mensagens para o mesmo usuário
+    for _ in range(50):
+        socket_handlers.schedule_unread_counts_push('target_user')
+    socket_handlers.schedule_unread_counts_push('other_user')
+
+    await asyncio.sleep(0.05)
+    assert sorted(calls) == ['other_user', 'target_user']
+
+    # Depois do push, uma nova mensagem agenda outro
+    socket_handlers.schedule_unread_counts_push('target_user')
+    await asyncio.sleep(0.05)
+    assert calls.count('target_user') == 2
+
+
+@pytest.mark.asyncio
+async def test_mark_conversation_read_emits(monkeypatch):
+    # Monkeypatch emit_unread_counts_for_user
+    calls = []
+    def fake_schedule(user_id):
+        calls.append(user_id)
+
+    monkeypatch.setattr(socket_handlers, 'schedule_unread_counts_push', fake_schedule)
 
     # Monkeypatch db.messages.update_many used in contacts.mark_conversation_read
     class FakeResult:
@@ -59,7 +74,7 @@ async def test_mark_conversation_read_emits(monkeypatch):
     res = await contacts.mark_conversation_read('contact-1', 'current-user')
 
     assert res['updated'] == 3
-    # Verifica que emit_unread_counts_for_user foi chamado para current-user
+    # Verifica que o push de não-lidas foi agendado para current-user
     assert 'current-user' in calls
 
 
@@ -67,10 +82,10 @@ async def test_mark_conversation_read_emits(monkeypatch):
 async def test_publish_message_emits_unread(monkeypatch):
     calls = []
 
-    async def fake_emit_counts(user_id):
+    def fake_schedule(user_id):
         calls.append(user_id)
 
-    monkeypatch.setattr(socket_handlers, 'emit_unread_counts_for_user', fake_emit_counts)
+    monkeypatch.setattr(socket_handlers, 'schedule_unread_counts_push', fake_schedule)
 
     # Simula publicação de mensagem com contact_id
     from bots.automations import publish_message
@@ -80,7 +95,7 @@ async def test_publish_message_emits_unread(monkeypatch):
         # do nothing
         return None
 
-    # Chama publish_message com contact_id => deve chamar emit_unread_counts_for_user(contact_id)
+    # Chama publish_message com contact_id => deve agendar o push de não-lidas para contact_id
     await publish_message(fake_sio_emit, author='BotTest', text='Olá', contact_id='target_user')
 
     assert 'target_user' in calls
@@ -90,10 +105,10 @@ async def test_publish_message_emits_unread(monkeypatch):
 async def test_webhook_persist_and_broadcast_emits_unread(monkeypatch):
     calls = []
 
-    async def fake_emit_counts(user_id):
+    def fake_schedule(user_id):
         calls.append(user_id)
 
-    monkeypatch.setattr(socket_handlers, 'emit_unread_counts_for_user', fake_emit_counts)
+    monkeypatch.setattr(socket_handlers, 'schedule_unread_counts_push', fake_schedule)
 
     # Mock emit_to_user to be a coroutine
     async def fake_emit_to_user(payload, target_user_id=None):
@@ -0,0 +1,38 @@
+import pytest
+
+import main  # noqa: F401 - registra os handlers do Socket.IO
+import socket_handlers
+from socket_manager import sio, user_room
+
+
+def test_user_room_name():
+    assert user_room("abc") == "user:abc"
+
+
+@pytest.mark.asyncio
+async def test_disconnect_delegates_to_presence(monkeypatch):
+    calls = []
+
+    async def fake_disconnected(user_id, sid):
+        calls.append((user_id, sid))
+
+    monkeypatch.setattr(sio, "get_environ", lambda sid: {"user_id": "u1"})
+    monkeypatch.setattr(socket_handlers.presence, "user_disconnected", fake_disconnected)
+
+    await sio.handlers["/"]["disconnect"]("sid-1")
+
+    assert calls == [("u1", "sid-1")]
+
+
+@pytest.mark.asyncio
+async def test_emit_to_user_targets_user_room(monkeypatch):
+    calls = []
+
+    async def fake_emit(event, payload, room=None, **kwargs):
+        calls.append((event, room))
+
+    monkeypatch.setattr(sio, "emit", fake_emit)
+
+    await socket_handlers.emit_to_user({"text": "oi"}, "u2")
+
+    assert calls == [("chat:new-message", "user:u2")]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cliente HTTP por chamada x cliente compartilhado (llm_client).
+
+Sobe o servidor OpenAI simulado (tools/fake_openai.py) e dispara o mesmo
+número de `/v1/chat/completions` de duas formas:
+
+    per-call  um `httpx.AsyncClient` novo por requisição (comportamento antigo)
+    shared    `llm_client.get_llm_client()` com keep-alive
+
+Para cada modo mostra p50/p95/p99, vazão e quantas conexões TCP o servidor
+viu. Com latência simulada 0 a diferença é só o custo de abrir conexão e
+criar o cliente; contra a OpenAI real ainda entra o handshake TLS, que aqui
+(HTTP local) não aparece.
+
+Uso (a partir de chat-app/backend):
+    python tools/bench_llm_client.py --requests 500 --concurrency 20
+    python tools/bench_llm_client.py --url http://127.0.0.1:3901/v1 --latency-ms 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from llm_client import close_llm_client, get_llm_client  # noqa: E402
+
+PAYLOAD = {"model": "bench", "messages": [{"role": "user", "content": "Qual o horário de atendimento?"}]}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _connections(base_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(base_url.rsplit("/v1", 1)[0] + "/stats")).json()["connections"]
+
+
+async def _per_call(url: str) -> None:
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        (await client.post(url, json=PAYLOAD)).raise_for_status()
+
+
+async def _shared(url: str) -> None:
+    (await get_llm_client().post(url, json=PAYLOAD, timeout=30.0)).raise_for_status()
+
+
+async def run_mode(name: str, call, args) -> dict:
+    url = f"{args.url}/chat/completions"
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call(url)
+            latencies.append(time.perf_counter() - started)
+
+    connections_before = await _connections(args.url)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": name,
+        "p50": _percentile(latencies, 50) * 1000,
+        "p95": _percentile(latencies, 95) * 1000,
+        "p99": _percentile(latencies, 99) * 1000,
+        "mean": statistics.mean(latencies) * 1000,
+        "rps": args.requests / elapsed,
+        "connections": await _connections(args.url) - connections_before,
+    }
+
+
+async def _wait_ready(base_url: str, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await _connections(base_url)
+            return
+        except httpx.HTTPError:
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"❌ {base_url} não respondeu em {timeout}s")
+
+
+async def main_async(args) -> None:
+    process = None
+    if not args.url:
+        env = {**os.environ, "FAKE_OPENAI_LATENCY_MS": str(args.latency_ms), "FAKE_OPENAI_JITTER_MS": "0"}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_openai:app", "--app-dir", str(BACKEND_DIR / "tools"),
+             "--port", str(args.port), "--log-level", "warning"],
+            env=env
+        )
+        args.url = f"http://127.0.0.1:{args.port}/v1"
+    try:
+        await _wait_ready(args.url)
+        # Aquecimento (import, primeira conexão) fora da medição
+        await _per_call(f"{args.url}/chat/completions")
+        await _shared(f"{args.url}/chat/completions")
+        results = [await run_mode("per-call", _per_call, args), await run_mode("shared", _shared, args)]
+    finally:
+        await close_llm_client()
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"\n{args.requests} requisições, concorrência {args.concurrency}, latência simulada {args.latency_ms}ms")
+    print(f"{'modo':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'média':>9}{'req/s':>9}{'conexões':>10}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}{r['mean']:>9.2f}"
+              f"{r['rps']:>9.0f}{r['connections']:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base /v1 de um servidor já em execução (senão sobe o fake)")
+    parser.add_argument("--port", type=int, default=3911)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=0, help="latência do servidor simulado")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da serialização de páginas de histórico.
+
+Compara o caminho antigo (dict -> ConversationMessage -> validação contra o
+response_model -> JSONResponse) com o caminho atual (dict direto do documento
+-> ORJSONResponse) em páginas de 100 e 1000 mensagens.
+
+Uso (a partir de chat-app/backend):
+    python tools/bench_serialization.py [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi._compat import ModelField  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from pydantic.fields import FieldInfo  # noqa: E402
+
+from contacts import ConversationMessage, ConversationResponse  # noqa: E402
+from serializers import ORJSONResponse, message_to_dict  # noqa: E402
+
+
+def make_docs(n: int) -> list[dict]:
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for i in range(n):
+        doc = {
+            "_id": ObjectId(),
+            "author": "Cliente WhatsApp",
+            "text": f"Mensagem de teste número {i} com acentuação: reunião amanhã às 10h",
+            "createdAt": base + timedelta(seconds=i),
+            "status": "read" if i % 3 else "sent",
+            "type": "text",
+            "userId": "WA:5511999999999",
+            "contactId": "507f1f77bcf86cd799439011",
+        }
+        if i % 10 == 0:
+            doc["type"] = "image"
+            doc["attachment"] = {"bucket": "chat", "filename": "foto.jpg", "url": "http://cdn/foto.jpg"}
+        docs.append(doc)
+    return docs
+
+
+def legacy_dict(msg: dict) -> dict:
+    # Montagem do dict como era feita em get_conversation
+    ts = int(msg["createdAt"].timestamp() * 1000) if "createdAt" in msg else int(msg.get("timestamp", 0))
+    data = {
+        "id": str(msg["_id"]),
+        "author": msg.get("author", ""),
+        "text": msg.get("text", ""),
+        "timestamp": ts,
+        "type": msg.get("type", "text"),
+        "status": msg.get("status", "sent"),
+        "userId": msg.get("userId"),
+        "contactId": msg.get("contactId"),
+    }
+    if "attachment" in msg:
+        data["attachment"] = msg["attachment"]
+        data["url"] = msg["attachment"].get("url")
+    return data
+
+
+# Campo de resposta equivalente ao que o FastAPI cria para response_model=ConversationResponse
+RESPONSE_FIELD = ModelField(
+    name="Response_get_conversation",
+    field_info=FieldInfo(annotation=ConversationResponse),
+    mode="serialization"
+)
+
+
+async def legacy_path(docs: list[dict]) -> bytes:
+    result = [ConversationMessage(**legacy_dict(d)) for d in docs]
+    content = ConversationResponse(messages=result, hasMore=True)
+    # Mesmo passo que o FastAPI executa para rotas com response_model
+    serialized = await serialize_response(field=RESPONSE_FIELD, response_content=content, is_coroutine=True)
+    return JSONResponse(serialized).body
+
+
+async def fast_path(docs: list[dict]) -> bytes:
+    payload = {"messages": [message_to_dict(d) for d in docs], "hasMore": True, "nextCursor": None, "prevCursor": None}
+    return ORJSONResponse(payload).body
+
+
+def bench(label: str, fn, docs: list[dict], repeat: int) -> float:
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(fn(docs))  # aquecimento
+        seconds = timeit.timeit(lambda: loop.run_until_complete(fn(docs)), number=repeat)
+    finally:
+        loop.close()
+    per_page_ms = seconds / repeat * 1000
+    print(f"  {label:<8} {per_page_ms:8.3f} ms/página")
+    return per_page_ms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="páginas serializadas por medição")
+    args = parser.parse_args()
+
+    for size in (100, 1000):
+        docs = make_docs(size)
+        repeat = max(1, args.repeat // (size // 100))
+        print(f"📊 Página com {size} mensagens ({repeat} repetições)")
+        legacy = bench("antigo", legacy_path, docs, repeat)
+        fast = bench("orjson", fast_path, docs, repeat)
+        print(f"  ⚡ {legacy / fast:.1f}x mais rápido\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatível com a API da OpenAI, para testes de carga.
+
+Responde `/v1/chat/completions` e `/v1/audio/transcriptions` com texto fixo
+depois de uma latência configurável, sem custo nem limite de cota. O backend
+usa este servidor com `OPENAI_BASE_URL=http://127.0.0.1:<porta>/v1`.
+
+Uso (a partir de chat-app/backend):
+    FAKE_OPENAI_LATENCY_MS=400 uvicorn fake_openai:app --app-dir tools --port 3901
+
+Variáveis:
+    FAKE_OPENAI_LATENCY_MS   latência média de cada resposta (padrão 300)
+    FAKE_OPENAI_JITTER_MS    variação uniforme em torno da média (padrão 100)
+    FAKE_OPENAI_ERROR_RATE   fração de respostas 500 (padrão 0)
+    FAKE_OPENAI_TOKEN_MS     intervalo entre trechos com `stream=true` (padrão 20)
+
+Com `stream=true` a resposta sai em SSE, uma palavra por chunk, como a API
+real (a latência configurada vale até o primeiro token).
+
+`/stats` conta as respostas e as conexões TCP distintas (porta de origem)
+usadas nas rotas `/v1`, para conferir o reaproveitamento de conexões.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_SECONDS = int(os.getenv("FAKE_OPENAI_LATENCY_MS", "300")) / 1000
+JITTER_SECONDS = int(os.getenv("FAKE_OPENAI_JITTER_MS", "100")) / 1000
+ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))
+TOKEN_SECONDS = int(os.getenv("FAKE_OPENAI_TOKEN_MS", "20")) / 1000
+
+app = FastAPI(title="Fake OpenAI")
+stats = {"completions": 0, "transcriptions": 0, "errors": 0}
+_connections: set = set()
+
+
+def _track(request: Request) -> None:
+    if request.client:
+        _connections.add((request.client.host, request.client.port))
+
+
+async def _simulate() -> JSONResponse | None:
+    delay = max(0.0, LATENCY_SECONDS + random.uniform(-JITTER_SECONDS, JITTER_SECONDS))
+    await asyncio.sleep(delay)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "erro simulado"}}, status_code=500)
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    _track(request)
+    body = await request.json()
+    error = await _simulate()
+    if error:
+        return error
+    stats["completions"] += 1
+    last = (body.get("messages") or [{}])[-1].get("content", "")
+    content = f"Resposta simulada para: {last[:80]}"
+    usage = {"prompt_tokens": len(last) // 4, "completion_tokens": len(content) // 4}
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, content, usage), media_type="text/event-stream")
+    return {
+        "id": f"chatcmpl-fake-{stats['completions']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
+
+
+async def _stream(body: dict, content: str, usage: dict):
+    chunk_id = f"chatcmpl-fake-{stats['completions']}"
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        delta = word if i == 0 else f" {word}"
+        chunk = {"id": chunk_id, "object": "chat.completion.chunk", "model": body.get("model", "fake"),
+                 "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(TOKEN_SECONDS)
+    final = {"id": chunk_id, "object": "chat.completion.chunk", "model": body.get("model", "fake"),
+             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    if (body.get("stream_options") or {}).get("include_usage"):
+        final["usage"] = usage
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    _track(request)
+    error = await _simulate()
+    if error:
+        return error
+    stats["transcriptions"] += 1
+    return {"text": "transcrição simulada"}
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "connections": len(_connections)}
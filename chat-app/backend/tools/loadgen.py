@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga para o Socket.IO do chat (asyncio + socketio.AsyncClient).
+
+Registra e autentica N usuários sintéticos, abre um socket por usuário e,
+durante `--duration` segundos, cada usuário executa ações sorteadas pelo
+`--mix` (chat:send, chat:typing, chat:read e agent:send) para o seu par
+(usuário 0 <-> 1, 2 <-> 3, ...).
+
+Métricas:
+    ack       chat:send -> chat:ack no remetente
+    delivery  chat:send -> chat:new-message no destinatário
+    agent     agent:send -> agent:message
+    p50/p95/p99, vazão e taxa de erros (erros emitidos pelo servidor, falhas
+    de conexão/login e envios sem ack/entrega até o fim do teste)
+
+Com `--spawn` o script sobe tudo localmente: o servidor OpenAI simulado
+(tools/fake_openai.py) e o backend (uvicorn main:socket_app) sem Redis (Socket.IO,
+presença e filas em memória), com rate limit desligado e o Mongo local
+indicado em `--mongo-url` (ex.: `docker compose up mongo`; o banco é o do
+caminho da URL e `chatdb` é recusado). Sem `--spawn`
+usa o backend já em execução em `--url`.
+
+Uso (a partir de chat-app/backend):
+    python tools/loadgen.py --spawn --users 200 --duration 60 --rate 0.5
+    python tools/loadgen.py --url http://localhost:3000 --mix send=80,typing=15,read=5
+    python tools/loadgen.py --spawn --users 50 --json resultado.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import socketio
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+ACTIONS = ("send", "typing", "read", "agent")
+
+
+class Recorder:
+    """Latências (ms) e contadores do teste."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {"ack": [], "delivery": [], "agent": []}
+        self.counts: dict[str, int] = {f"{a}_sent": 0 for a in ACTIONS}
+        self.errors: dict[str, int] = {}
+
+    def add(self, metric: str, started: float) -> None:
+        self.latencies[metric].append((time.perf_counter() - started) * 1000)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    @staticmethod
+    def percentile(values: list[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self, elapsed: float, users: int) -> dict:
+        metrics = {}
+        for name, values in self.latencies.items():
+            metrics[name] = {
+                "count": len(values),
+                "p50": round(self.percentile(values, 50), 2),
+                "p95": round(self.percentile(values, 95), 2),
+                "p99": round(self.percentile(values, 99), 2),
+                "max": round(max(values), 2) if values else 0.0,
+            }
+        operations = sum(self.counts.values())
+        total_errors = sum(self.errors.values())
+        return {
+            "users": users,
+            "elapsedSeconds": round(elapsed, 2),
+            "operations": operations,
+            "opsPerSecond": round(operations / elapsed, 1) if elapsed else 0.0,
+            "counts": self.counts,
+            "latencyMs": metrics,
+            "errors": self.errors,
+            "errorRate": round(total_errors / operations, 4) if operations else 0.0,
+        }
+
+
+class SyntheticUser:
+    """Usuário sintético: conta, socket e envios pendentes de confirmação."""
+
+    def __init__(self, index: int, args, recorder: Recorder, sent_at: dict):
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.sent_at = sent_at  # compartilhado: tempId -> instante do envio
+        self.email = f"loadgen-{args.run_id}-{index}@loadgen.local"
+        self.name = f"Carga {index}"
+        self.user_id = None
+        self.token = None
+        self.peer = None
+        self.pending_acks: dict[str, float] = {}
+        self.pending_agent: list[float] = []
+        self.received_ids: list[str] = []
+        self.typing = False
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self._register_handlers()
+
+    def _register_handlers(self) -> None:
+        @self.sio.on("chat:ack")
+        async def on_ack(data):
+            started = self.pending_acks.pop(data.get("tempId"), None)
+            if started is not None:
+                self.recorder.add("ack", started)
+
+        @self.sio.on("chat:new-message")
+        async def on_message(data):
+            text = data.get("text") or ""
+            if data.get("userId") == self.user_id or not text.startswith("lg:"):
+                return
+            started = self.sent_at.pop(text[3:].split(" ", 1)[0], None)
+            if started is not None:
+                self.recorder.add("delivery", started)
+            if data.get("id"):
+                self.received_ids.append(data["id"])
+
+        @self.sio.on("agent:message")
+        async def on_agent(data):
+            if self.pending_agent:
+                self.recorder.add("agent", self.pending_agent.pop(0))
+
+        @self.sio.on("agent:error")
+        async def on_agent_error(data):
+            if self.pending_agent:
+                self.pending_agent.pop(0)
+            self.recorder.error("agent_error")
+
+        @self.sio.on("error")
+        async def on_error(data):
+            self.recorder.error("server_error")
+
+        @self.sio.on("connection:closing")
+        async def on_closing(data):
+            self.recorder.error(f"closed_{data.get('reason', 'unknown')}")
+
+    async def login(self, http: httpx.AsyncClient) -> None:
+        password = "loadgen-senha-123"
+        response = await http.post("/auth/register", json={"email": self.email, "name": self.name, "password": password})
+        if response.status_code not in (200, 400):
+            response.raise_for_status()
+        response = await http.post("/auth/login", json={"email": self.email, "password": password})
+        response.raise_for_status()
+        body = response.json()
+        self.token = body["access_token"]
+        self.user_id = body["user"]["id"]
+
+    async def connect(self) -> None:
+        await self.sio.connect(self.args.url, auth={"token": self.token}, transports=["websocket"],
+                               wait_timeout=self.args.connect_timeout)
+
+    async def act(self, action: str) -> None:
+        if action == "send":
+            temp_id = uuid.uuid4().hex
+            now = time.perf_counter()
+            self.pending_acks[temp_id] = now
+            self.sent_at[temp_id] = now
+            await self.sio.emit("chat:send", {
+                "tempId": temp_id,
+                "author": self.name,
+                "text": f"lg:{temp_id} mensagem de carga",
+                "type": "text",
+                "contactId": self.peer.user_id,
+            })
+        elif action == "typing":
+            self.typing = not self.typing
+            await self.sio.emit("chat:typing", {"contactId": self.peer.user_id, "author": self.name, "isTyping": self.typing})
+        elif action == "read":
+            ids, self.received_ids = self.received_ids[-20:], []
+            await self.sio.emit("chat:read", {"ids": ids})
+        elif action == "agent":
+            self.pending_agent.append(time.perf_counter())
+            await self.sio.emit("agent:send", {
+                "agentKey": self.args.agent,
+                "message": "Qual a próxima ação para esse cliente?",
+                "contactId": self.peer.user_id,
+            })
+        self.recorder.counts[f"{action}_sent"] += 1
+
+    async def run(self, deadline: float, weights: list[float]) -> None:
+        while True:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if time.perf_counter() >= deadline or not self.sio.connected:
+                return
+            action = random.choices(ACTIONS, weights=weights)[0]
+            try:
+                await self.act(action)
+            except Exception:
+                self.recorder.error(f"{action}_emit_failed")
+
+
+def parse_mix(mix: str) -> list[float]:
+    weights = dict.fromkeys(ACTIONS, 0.0)
+    for part in mix.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() not in weights:
+            raise SystemExit(f"Ação desconhecida no --mix: {name!r} (use {', '.join(ACTIONS)})")
+        weights[name.strip()] = float(value)
+    return [weights[a] for a in ACTIONS]
+
+
+async def _wait_http(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.3)
+    raise SystemExit(f"❌ {url} não respondeu em {timeout}s")
+
+
+async def spawn_stack(args) -> list[subprocess.Popen]:
+    """Sobe o OpenAI simulado e o backend local (sem Redis) para o teste."""
+    from pymongo.uri_parser import parse_uri
+
+    # Os usuários sintéticos ficam no banco: nunca no chatdb de verdade
+    database = parse_uri(args.mongo_url)["database"] or "chatdb"
+    if database == "chatdb":
+        raise SystemExit(f"❌ --mongo-url aponta para o banco {database}; use um banco só de teste "
+                         "(ex.: mongodb://localhost:27017/chatdb_loadtest)")
+    openai_port, backend_port = args.spawn_port + 1, args.spawn_port
+    fake_env = {**os.environ, "FAKE_OPENAI_LATENCY_MS": str(args.llm_latency_ms)}
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fake_openai:app", "--app-dir", str(BACKEND_DIR / "tools"),
+         "--port", str(openai_port), "--log-level", "warning"],
+        env=fake_env
+    )
+    env = {**os.environ}
+    env.pop("REDIS_URL", None)
+    env.update({
+        "DATABASE_URL": args.mongo_url,
+        "OPENAI_API_KEY": "loadgen",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:socket_app", "--app-dir", str(BACKEND_DIR),
+         "--port", str(backend_port), "--log-level", "warning"],
+        env=env, cwd=str(BACKEND_DIR),
+        stdout=None if args.verbose else subprocess.DEVNULL
+    )
+    args.url = f"http://127.0.0.1:{backend_port}"
+    await _wait_http(f"http://127.0.0.1:{openai_port}/stats", 20)
+    await _wait_http(f"{args.url}/", 60)
+    return [backend, fake]
+
+
+async def run_load(args) -> dict:
+    recorder = Recorder()
+    sent_at: dict[str, float] = {}
+    users = [SyntheticUser(i, args, recorder, sent_at) for i in range(args.users)]
+    for i in range(0, len(users) - 1, 2):
+        users[i].peer, users[i + 1].peer = users[i + 1], users[i]
+    if len(users) % 2:
+        users[-1].peer = users[0]
+
+    limits = asyncio.Semaphore(args.concurrency)
+
+    async def setup(user: SyntheticUser) -> bool:
+        async with limits:
+            try:
+                await user.login(http)
+                await user.connect()
+                return True
+            except Exception as e:
+                recorder.error("setup_failed")
+                if args.verbose:
+                    print(f"⚠️  Usuário {user.index}: {e}")
+                return False
+
+    print(f"👥 Registrando e conectando {len(users)} usuários em {args.url}...")
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as http:
+        started = time.perf_counter()
+        ok = await asyncio.gather(*(setup(u) for u in users))
+    active = [u for u, connected in zip(users, ok) if connected and u.peer.user_id]
+    print(f"✅ {len(active)} conectados em {time.perf_counter() - started:.1f}s")
+
+    weights = parse_mix(args.mix)
+    print(f"🚀 Carga por {args.duration}s ({args.rate}/s por usuário, mix {args.mix})")
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(u.run(deadline, weights) for u in active))
+    # Espera confirmações atrasadas antes de contar o que ficou sem resposta
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+
+    for user in active:
+        for _ in user.pending_acks:
+            recorder.error("ack_timeout")
+        for _ in user.pending_agent:
+            recorder.error("agent_timeout")
+    for _ in sent_at:
+        recorder.error("delivery_timeout")
+    await asyncio.gather(*(u.sio.disconnect() for u in users if u.sio.connected), return_exceptions=True)
+    return recorder.summary(elapsed, len(active))
+
+
+def print_summary(summary: dict) -> None:
+    print(f"\n📊 {summary['users']} usuários, {summary['operations']} operações "
+          f"({summary['opsPerSecond']}/s) em {summary['elapsedSeconds']}s")
+    print(f"  {'métrica':<10}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, m in summary["latencyMs"].items():
+        print(f"  {name:<10}{m['count']:>8}{m['p50']:>10}{m['p95']:>10}{m['p99']:>10}{m['max']:>10}")
+    print(f"  erros: {summary['errors'] or 'nenhum'} (taxa {summary['errorRate']:.2%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:3000", help="backend já em execução")
+    parser.add_argument("--users", type=int, default=20, help="usuários sintéticos (sockets)")
+    parser.add_argument("--duration", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--rate", type=float, default=1.0, help="ações por segundo por usuário (média)")
+    parser.add_argument("--mix", default="send=70,typing=20,read=8,agent=2", help="pesos das ações")
+    parser.add_argument("--agent", default="sdr", help="agente usado em agent:send")
+    parser.add_argument("--concurrency", type=int, default=50, help="logins/conexões simultâneos no setup")
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument("--drain", type=float, default=3, help="espera final por respostas atrasadas")
+    parser.add_argument("--run-id", default=uuid.uuid4().hex[:8], help="prefixo dos e-mails (reaproveita contas)")
+    parser.add_argument("--json", help="grava o resumo neste arquivo")
+    parser.add_argument("--spawn", action="store_true", help="sobe backend + OpenAI simulado localmente")
+    parser.add_argument("--spawn-port", type=int, default=3900)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/chatdb_loadtest")
+    parser.add_argument("--llm-latency-ms", type=int, default=300, help="latência do OpenAI simulado")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    async def _main():
+        processes = await spawn_stack(args) if args.spawn else []
+        try:
+            return await run_load(args)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    summary = asyncio.run(_main())
+    print_summary(summary)
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+        print(f"💾 Resumo gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,15 @@ import os
 import httpx
 from dotenv import load_dotenv
 
+from metrics import post_llm
+from llm_client import get_llm_client
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-WHISPER_API_URL = "https://api.openai.com/v1/audio/transcriptions"
+# Base da API compatível com OpenAI (ex.: servidor local em testes de carga)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+WHISPER_API_URL = f"{OPENAI_BASE_URL}/audio/transcriptions"
 
 
 async def transcribe_audio(audio_file_bytes: bytes, filename: str) -> str:
@@ -25,39 +30,40 @@ async def transcribe_audio(audio_file_bytes: bytes, filename: str) -> str:
         return "[❌ Transcrição não configurada. Configure OPENAI_API_KEY]"
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            # Prepara o arquivo para upload
-            files = {
-                "file": (filename, audio_file_bytes, "audio/webm")
-            }
-            
-            data = {
-                "model": "whisper-1",
-                "language": "pt",  # Português
-                "response_format": "text"
-            }
-            
-            response = await client.post(
-                WHISPER_API_URL,
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}"
-                },
-                files=files,
-                data=data
-            )
-            
-            if response.status_code != 200:
-                error_msg = response.json().get("error", {}).get("message", "Erro desconhecido")
-                return f"[❌ Erro na transcrição: {error_msg}]"
-            
-            # Whisper retorna apenas o texto quando response_format=text
-            transcription = response.text.strip()
-            
-            if not transcription:
-                return "[🎤 Áudio vazio ou não foi possível transcrever]"
-            
-            return transcription
-            
+        client = get_llm_client()
+        # Prepara o arquivo para upload
+        files = {
+            "file": (filename, audio_file_bytes, "audio/webm")
+        }
+        
+        data = {
+            "model": "whisper-1",
+            "language": "pt",  # Português
+            "response_format": "text"
+        }
+        
+        response = await post_llm(
+            client, "whisper", "whisper-1", WHISPER_API_URL,
+            timeout=60.0,
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}"
+            },
+            files=files,
+            data=data
+        )
+        
+        if response.status_code != 200:
+            error_msg = response.json().get("error", {}).get("message", "Erro desconhecido")
+            return f"[❌ Erro na transcrição: {error_msg}]"
+        
+        # Whisper retorna apenas o texto quando response_format=text
+        transcription = response.text.strip()
+        
+        if not transcription:
+            return "[🎤 Áudio vazio ou não foi possível transcrever]"
+        
+        return transcription
+        
     except httpx.TimeoutException:
         return "[⏱️ Timeout ao transcrever áudio. Tente novamente.]"
     except Exception as e:
@@ -0,0 +1,93 @@
+"""Throttle dos indicadores de digitação (`chat:typing`).
+
+O frontend emite `chat:typing` a cada tecla. Aqui o estado é mantido por par
+(remetente, contato):
+
+- mudanças de estado (começou/parou de digitar) vão na hora para o contato;
+- `isTyping=true` repetido só é reenviado depois de `TYPING_THROTTLE_MS`,
+  para o indicador do outro lado não expirar;
+- sem novos eventos por `TYPING_EXPIRE_MS` o indicador é desligado
+  automaticamente (aba fechada, conexão perdida, mensagem enviada sem o
+  evento de parada).
+
+`typing_stats()` mostra quantos eventos chegaram e quantos foram absorvidos.
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+from socket_manager import sio, user_room
+
+TYPING_THROTTLE_SECONDS = int(os.getenv("TYPING_THROTTLE_MS", "3000")) / 1000
+TYPING_EXPIRE_SECONDS = int(os.getenv("TYPING_EXPIRE_MS", "6000")) / 1000
+
+# (remetente, contato) -> {"author", "lastSeen", "lastSent", "timer"}
+_typing_state: dict[tuple[str, str], dict] = {}
+_stats = {"received": 0, "forwarded": 0, "suppressed": 0, "expired": 0}
+
+
+async def _emit(user_id: str, contact_id: str, author: Optional[str], is_typing: bool) -> None:
+    await sio.emit("chat:typing", {
+        "userId": user_id,
+        "author": author,
+        "isTyping": is_typing
+    }, room=user_room(contact_id))
+
+
+async def _expire_when_stale(key: tuple[str, str]) -> None:
+    # Um timer por par: dorme até o prazo do último evento e confere de novo
+    while True:
+        state = _typing_state.get(key)
+        if state is None:
+            return
+        remaining = state["lastSeen"] + TYPING_EXPIRE_SECONDS - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+            continue
+        del _typing_state[key]
+        _stats["expired"] += 1
+        await _emit(key[0], key[1], state["author"], False)
+        return
+
+
+async def handle_typing_event(user_id: str, contact_id: str, author: Optional[str], is_typing: bool) -> bool:
+    """
+    Processa um `chat:typing` recebido.
+
+    Returns:
+        True se o evento foi repassado ao contato, False se foi absorvido
+    """
+    _stats["received"] += 1
+    key = (user_id, contact_id)
+    state = _typing_state.get(key)
+    now = time.monotonic()
+
+    if not is_typing:
+        if state is None:
+            _stats["suppressed"] += 1
+            return False
+        del _typing_state[key]
+        state["timer"].cancel()
+        _stats["forwarded"] += 1
+        await _emit(user_id, contact_id, author, False)
+        return True
+
+    if state is not None:
+        state["lastSeen"] = now
+        if now - state["lastSent"] < TYPING_THROTTLE_SECONDS:
+            _stats["suppressed"] += 1
+            return False
+        state["lastSent"] = now
+    else:
+        state = _typing_state[key] = {"author": author, "lastSeen": now, "lastSent": now}
+        state["timer"] = asyncio.create_task(_expire_when_stale(key))
+    _stats["forwarded"] += 1
+    await _emit(user_id, contact_id, author, True)
+    return True
+
+
+def typing_stats() -> dict:
+    """Contadores de eventos de digitação (recebidos, repassados, absorvidos, expirados)."""
+    return {**_stats, "active": len(_typing_state)}
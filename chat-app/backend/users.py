@@ -4,6 +4,7 @@ from datetime import datetime
 from database import db
 from auth import hash_password, verify_password, create_access_token
 from middleware.rate_limit import check_rate_limit, login_limiter, register_limiter
+from profile_cache import invalidate_profile
 import os
 import secrets
 from google.oauth2 import id_token
@@ -42,7 +43,8 @@ async def register(data: RegisterIn, request: Request):
         "created_at": datetime.utcnow()
     }
     
-    await users.insert_one(doc)
+    result = await users.insert_one(doc)
+    invalidate_profile(result.inserted_id)
     return {"message": "Usuário registrado com sucesso"}
 
 
@@ -108,6 +110,7 @@ async def google_auth(data: GoogleAuthIn, request: Request):
             }
             result = await users.insert_one(user_doc)
             user_id = result.inserted_id
+            invalidate_profile(user_id)
         else:
             # Atualiza último login
             user_id = user["_id"]
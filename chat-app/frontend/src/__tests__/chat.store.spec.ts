@@ -284,6 +284,33 @@ describe('ChatStore', () => {
       expect(chat.messages).not.toContainEqual(agentMessage)
     })
 
+    it('monta deltas em ordem de seq e substitui pelo chat:new-message final', async () => {
+      const chat = useChatStore()
+      await chat.connect('test-token')
+
+      const deltaListener = mockSocket.on.mock.calls.find((call) => call[0] === 'chat:message-delta')?.[1]
+      const newMessageListener = mockSocket.on.mock.calls.find((call) => call[0] === 'chat:new-message')?.[1]
+
+      deltaListener?.({ streamId: 's1', seq: 0, delta: 'Olá', author: 'Maria' })
+      deltaListener?.({ streamId: 's1', seq: 2, delta: '!', author: 'Maria' })
+      expect(chat.messages.map((m) => m.text)).toEqual(['Olá'])
+      deltaListener?.({ streamId: 's1', seq: 1, delta: ', tudo bem', author: 'Maria' })
+      expect(chat.messages.map((m) => m.text)).toEqual(['Olá, tudo bem!'])
+
+      const finalMessage: Message = {
+        id: '789',
+        text: 'Olá, tudo bem?',
+        author: 'Maria',
+        timestamp: Date.now(),
+        status: 'sent',
+        type: 'text',
+        streamId: 's1'
+      }
+      await newMessageListener?.(finalMessage)
+
+      expect(chat.messages).toEqual([finalMessage])
+    })
+
     it('atualiza mensagem com ACK do servidor', async () => {
       const chat = useChatStore()
       await chat.connect('test-token')
@@ -0,0 +1,35 @@
+// src/composables/useDeltaStream.ts
+export type MessageDelta = { streamId: string; seq: number; delta: string }
+
+/**
+ * Monta respostas enviadas em pedaços (`agent:message-delta` / `chat:message-delta`).
+ * `push` devolve o texto que pode ser anexado agora, na ordem de `seq`
+ * (deltas adiantados esperam os anteriores; repetidos são ignorados).
+ * O evento final (mesmo `streamId`) traz o texto completo: chame `finish`.
+ */
+export function useDeltaStream() {
+  const streams = new Map<string, { next: number; early: Map<number, string> }>()
+
+  function push(event: MessageDelta): string {
+    let stream = streams.get(event.streamId)
+    if (!stream) {
+      stream = { next: 0, early: new Map() }
+      streams.set(event.streamId, stream)
+    }
+    if (event.seq < stream.next) return ''
+    stream.early.set(event.seq, event.delta)
+    let text = ''
+    while (stream.early.has(stream.next)) {
+      text += stream.early.get(stream.next)
+      stream.early.delete(stream.next)
+      stream.next++
+    }
+    return text
+  }
+
+  function finish(streamId: string) {
+    streams.delete(streamId)
+  }
+
+  return { push, finish }
+}
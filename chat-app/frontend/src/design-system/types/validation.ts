@@ -38,6 +38,7 @@ export const MessageSchema = z.object({
   contactId: z.string().optional(), // 🆕 ID do destinatário (para quem foi enviado)
   attachment: AttachmentSchema.optional(), // 🆕 Dados do anexo (S3/MinIO)
   url: z.string().url().optional(), // 🆕 URL pré-assinada para download
+  streamId: z.string().optional(), // 🆕 Resposta montada a partir de deltas (chat:message-delta)
 });
 
 /**
@@ -57,6 +58,7 @@ export const IncomingMessageSchema = z.object({
   contactId: z.string().optional(), // 🆕 ID do destinatário
   attachment: AttachmentSchema.optional(), // 🆕 Dados do anexo
   url: z.string().optional(), // 🆕 URL pré-assinada (não precisa validar URL aqui)
+  streamId: z.string().optional(), // 🆕 Id do stream que esta mensagem finaliza
 });
 
 /**
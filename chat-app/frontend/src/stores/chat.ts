@@ -2,6 +2,7 @@ import { defineStore } from 'pinia';
 import { io, Socket } from 'socket.io-client';
 import type { Message, TypingInfo } from '@/design-system/types/validation';
 import { useAuthStore } from './auth';
+import { useDeltaStream, type MessageDelta } from '@/composables/useDeltaStream';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:3000';
 
@@ -9,6 +10,27 @@ const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:3000';
 const MAX_RETRIES = 3;
 const RETRY_DELAYS = [1000, 2000, 4000]; // Backoff: 1s, 2s, 4s
 
+// 🤖 Mensagens de agentes (detectadas pelo autor) não aparecem no chat principal
+function isAgentAuthor(author: unknown): boolean {
+  const msgAuthor = String(author || '').toLowerCase();
+  return (
+    msgAuthor.includes('advocatus') ||
+    msgAuthor.includes('advogado') ||
+    msgAuthor.includes('saúde') ||
+    msgAuthor.includes('saude') ||
+    msgAuthor.includes('health') ||
+    msgAuthor.includes('psicólogo') ||
+    msgAuthor.includes('psicologo') ||
+    msgAuthor.includes('vendedor') ||
+    msgAuthor.includes('guru') ||
+    msgAuthor.startsWith('dr.') ||
+    msgAuthor.startsWith('dr ')
+  );
+}
+
+// 🌊 Respostas em streaming (chat:message-delta) em montagem
+const deltaStreams = useDeltaStream();
+
 export const useChatStore = defineStore('chat', {
   state: () => ({
     socket: null as Socket | null,
@@ -87,28 +109,17 @@ export const useChatStore = defineStore('chat', {
         console.log('🔍 currentContactId:', this.currentContactId, 'msg.userId:', msg.userId, 'msg.contactId:', msg.contactId);
         
         // 🚫 FILTRA mensagens de/para agentes (não aparecem no chat principal)
-        const msgText = String(msg.text || '').toLowerCase();
-        const msgAuthor = String(msg.author || '').toLowerCase();
-        
-        console.log('🔍 Verificando se é mensagem de agente:', { text: msgText, author: msgAuthor });
-        
-        const isAgentMessage = 
-          msgAuthor.includes('advocatus') ||
-          msgAuthor.includes('advogado') ||
-          msgAuthor.includes('saúde') ||
-          msgAuthor.includes('saude') ||
-          msgAuthor.includes('health') ||
-          msgAuthor.includes('psicólogo') ||
-          msgAuthor.includes('psicologo') ||
-          msgAuthor.includes('vendedor') ||
-          msgAuthor.includes('guru') ||
-          msgAuthor.startsWith('dr.') ||
-          msgAuthor.startsWith('dr ');
-        
-        if (isAgentMessage) {
+        if (isAgentAuthor(msg.author)) {
           console.log('🤖 Mensagem de agente detectada, ignorando no chat principal:', msg);
           return; // NÃO adiciona ao chat principal
         }
+
+        // 🌊 Mensagem final de um stream: substitui o texto montado com os deltas
+        let streamed = -1;
+        if (msg.streamId) {
+          deltaStreams.finish(msg.streamId);
+          streamed = this.messages.findIndex((m) => m.streamId === msg.streamId);
+        }
         
         // 🆕 Verifica se mensagem é do contato que está conversando
         // Mensagem pertence à conversa atual se:
@@ -123,7 +134,9 @@ export const useChatStore = defineStore('chat', {
         console.log('✅ isFromCurrentContact:', isFromCurrentContact);
         
         // Adiciona mensagem ao chat se estiver na conversa correta
-        if (isFromCurrentContact || isToCurrentUser || !this.currentContactId) {
+        if (streamed !== -1) {
+          this.messages.splice(streamed, 1, msg);
+        } else if (isFromCurrentContact || isToCurrentUser || !this.currentContactId) {
           this.messages.push(msg);
           
           // Se usuário está acima, mostra badge "Novas mensagens"
@@ -152,6 +165,31 @@ export const useChatStore = defineStore('chat', {
         }
       });
 
+      // 🌊 Evento: trecho de resposta em streaming (concatena na ordem de seq)
+      this.socket.on('chat:message-delta', (data: MessageDelta & { author: string }) => {
+        if (!data?.streamId || isAgentAuthor(data.author)) return;
+        const text = deltaStreams.push(data);
+        if (!text) return;
+
+        const streamed = this.messages.find((m) => m.streamId === data.streamId);
+        if (streamed) {
+          streamed.text += text;
+          return;
+        }
+        this.messages.push({
+          tempId: `stream_${data.streamId}`,
+          streamId: data.streamId,
+          author: data.author,
+          text,
+          timestamp: Date.now(),
+          status: 'sent',
+          type: 'text',
+        });
+        if (!this.isScrolledToBottom) {
+          this.hasUnreadMessages = true;
+        }
+      });
+
       // ✅ Evento: ACK do servidor (troca tempId por id real)
       this.socket.on('chat:ack', (data: { tempId: string; id: string; status: string; timestamp: number }) => {
         console.log('✅ ACK recebido:', data);
@@ -282,23 +320,8 @@ export const useChatStore = defineStore('chat', {
         const data = await res.json();
 
         // 🚫 Filtra mensagens de agentes
-        const filteredMessages = (data.messages || []).filter((msg: Message) => {
-          const msgAuthor = String(msg.author || '').toLowerCase();
-          // Agent messages are detected by author name now. Inline @agent mentions are deprecated.
-          const isAgentMessage = 
-            msgAuthor.includes('advocatus') ||
-            msgAuthor.includes('advogado') ||
-            msgAuthor.includes('saúde') ||
-            msgAuthor.includes('saude') ||
-            msgAuthor.includes('health') ||
-            msgAuthor.includes('psicólogo') ||
-            msgAuthor.includes('psicologo') ||
-            msgAuthor.includes('vendedor') ||
-            msgAuthor.includes('guru') ||
-            msgAuthor.startsWith('dr.') ||
-            msgAuthor.startsWith('dr ');
-          return !isAgentMessage;
-        });
+        // Agent messages are detected by author name now. Inline @agent mentions are deprecated.
+        const filteredMessages = (data.messages || []).filter((msg: Message) => !isAgentAuthor(msg.author));
 
         if (before) {
           // Paginação: adiciona no início